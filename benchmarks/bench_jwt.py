@@ -0,0 +1,66 @@
+"""Throughput of create_access_token and decode_jwt for every supported signature scheme.
+
+Usage: python -m benchmarks.bench_jwt [--seconds 2]
+
+Keys are generated in memory, so the configured certs are left untouched. decode_jwt is measured
+cold (token cache cleared before every call) and warm (the same token verified repeatedly).
+"""
+import argparse
+import time
+import uuid
+
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+from utils import auth_settings
+
+
+class BenchUser:
+    def __init__(self):
+        self.id = uuid.uuid4()
+        self.login = "bench"
+
+
+def generate_private_key(algorithm: str):
+    if algorithm == "RS256":
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    if algorithm == "ES256":
+        return ec.generate_private_key(ec.SECP256R1())
+    return ed25519.Ed25519PrivateKey.generate()
+
+
+def ops_per_second(func, seconds: float) -> float:
+    calls = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        func()
+        calls += 1
+    return calls / (time.perf_counter() - started)
+
+
+def main(seconds: float) -> None:
+    user = BenchUser()
+    print(f"{'algorithm':>10} {'sign, op/s':>11} {'verify cold, op/s':>18} {'verify cached, op/s':>20}")
+    for algorithm in auth_settings.SUPPORTED_ALGORITHMS:
+        private_key = generate_private_key(algorithm)
+        auth_settings.auth_config.algorithm = algorithm
+        auth_settings.jwt_private_key = private_key
+        auth_settings.jwt_public_key = private_key.public_key()
+        auth_settings.token_cache.clear()
+
+        token = auth_settings.create_access_token(user)
+
+        def verify_cold():
+            auth_settings.token_cache.clear()
+            auth_settings.decode_jwt(token)
+
+        sign = ops_per_second(lambda: auth_settings.create_access_token(user), seconds)
+        cold = ops_per_second(verify_cold, seconds)
+        warm = ops_per_second(lambda: auth_settings.decode_jwt(token), seconds)
+        print(f"{algorithm:>10} {sign:>11.0f} {cold:>18.0f} {warm:>20.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=2)
+    main(parser.parse_args().seconds)
@@ -0,0 +1,126 @@
+"""Compare per-payment `new_transaction` calls and the bank statement import on a live database.
+
+Usage: python -m benchmarks.bench_load_payments [--sizes 1000,20000] [--students 2000] [--legacy-limit 1000]
+
+The per-payment path is what recording a statement through /operations/new_transaction costs: one
+request, transaction and commit per payment. Beyond --legacy-limit payments it is extrapolated
+linearly from the measured rate.
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from typing import Dict, List
+
+from sqlalchemy import delete, select
+
+from src.database import async_session
+from src.models import User, Semester, Roles
+from src.repositories.user_repository import UserRepository
+from src.schemas import TransactionCreate, UserCreate
+from src.services.infra_service import InfraService
+from src.services.operation_service import OperationService, import_config
+from utils.audit_log import audit_log
+
+PREFIX = "bench-payments-"
+
+
+async def cleanup() -> None:
+    async with async_session() as session:
+        await session.execute(delete(User).where(User.login.startswith(PREFIX)))
+        await session.execute(delete(Semester).where(Semester.name.startswith(PREFIX)))
+        await session.commit()
+
+
+async def seed(students: int) -> Dict[str, uuid.UUID]:
+    async with async_session() as session:
+        user_repository = UserRepository(session)
+        accountant = await user_repository.create_user(UserCreate(
+            name="Bench", surname="Bench", patronymic="Bench", role=Roles.accountant,
+            phone="0", login=f"{PREFIX}accountant", password="bench"
+        ))
+        await user_repository.create_users([
+            {
+                "id": uuid.uuid4(), "name": f"Name{i}", "surname": f"Surname{i}", "patronymic": "Patronymic",
+                "role": Roles.student, "phone": "0", "login": f"{PREFIX}student-{i}", "password_hash": b"\x00"
+            }
+            for i in range(students)
+        ])
+        await session.commit()
+    async with async_session() as session:
+        semester = await InfraService(session).create_semester(f"{PREFIX}semester", accountant.id)
+    return {"accountant_id": accountant.id, "semester_id": semester.id}
+
+
+def make_rows(size: int, students: int, run: int) -> List[Dict]:
+    return [
+        {
+            "bank_reference": f"{PREFIX}{run}-{i}",
+            "login": f"{PREFIX}student-{i % students}",
+            "semester": f"{PREFIX}semester",
+            "amount": str(1000 + i % 100),
+        }
+        for i in range(size)
+    ]
+
+
+async def run_legacy(rows: List[Dict], accountant_id: uuid.UUID, semester_id: uuid.UUID) -> float:
+    async with async_session() as session:
+        result = await session.execute(select(User.login, User.id).where(User.login.startswith(PREFIX)))
+        user_ids = dict(result.all())
+
+    started = time.perf_counter()
+    for row in rows:
+        async with async_session() as session:
+            await OperationService(session).create_transaction(
+                user_ids[row["login"]], TransactionCreate(semester_id=semester_id, amount=float(row["amount"])),
+                accountant_id
+            )
+    return time.perf_counter() - started
+
+
+async def iter_chunks(rows: List[Dict], chunk_size: int):
+    numbered_rows = list(enumerate(rows, start=2))
+    for start in range(0, len(numbered_rows), chunk_size):
+        yield numbered_rows[start:start + chunk_size]
+
+
+async def run_bulk(rows: List[Dict], accountant_id: uuid.UUID) -> float:
+    started = time.perf_counter()
+    async with async_session() as session:
+        report = await OperationService(session).import_payments(
+            iter_chunks(rows, import_config.batch_size), accountant_id
+        )
+    elapsed = time.perf_counter() - started
+    if report.rejected:
+        raise SystemExit(f"{report.rejected} payments were rejected")
+    return elapsed
+
+
+async def main(args) -> None:
+    sizes = [int(size) for size in args.sizes.split(",")]
+    await cleanup()
+    try:
+        seeded = await seed(args.students)
+        print(f"{'rows':>8} {'per-row, s':>12} {'bulk, s':>10} {'speedup':>8}")
+        for run, size in enumerate(sizes):
+            rows = make_rows(size, args.students, run)
+            measured = rows[:args.legacy_limit]
+            legacy_seconds = await run_legacy(measured, **seeded) * size / len(measured)
+            bulk_seconds = await run_bulk(rows, seeded["accountant_id"])
+
+            mark = "*" if len(measured) < size else " "
+            print(f"{size:>8} {legacy_seconds:>11.1f}{mark} {bulk_seconds:>10.1f} {legacy_seconds / bulk_seconds:>7.1f}x")
+    finally:
+        await audit_log.stop()
+        await cleanup()
+    print("* extrapolated from the first rows, see --legacy-limit")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,20000")
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--legacy-limit", type=int, default=1000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,113 @@
+"""Compare per-row and bulk student import on a live database.
+
+Usage: python -m benchmarks.bench_load_students [--sizes 1000,10000,50000] [--legacy-limit 1000]
+
+The per-row path hashes and commits one user at a time, so beyond --legacy-limit rows it is
+extrapolated linearly from the measured rate instead of running for hours.
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import delete
+
+from src.database import async_session
+from src.models import User, Roles
+from src.schemas import UserCreate
+from src.repositories.user_repository import UserRepository
+from src.services.user_service import UserService
+from utils import password_hashing
+from utils.audit_log import audit_log
+
+LOGIN_PREFIX = "bench-import-"
+INITIATOR_LOGIN = "bench-import-admin"
+
+
+def make_rows(size: int):
+    return [
+        {
+            "surname": f"Surname{i}",
+            "name": f"Name{i}",
+            "patronymic": f"Patronymic{i}",
+            "role": Roles.student,
+            "phone": f"+7{i:010d}",
+            "login": f"{LOGIN_PREFIX}{size}-{i}",
+            "password": f"password-{i}",
+        }
+        for i in range(size)
+    ]
+
+
+async def cleanup(keep_initiator: bool = True) -> None:
+    async with async_session() as session:
+        stmt = delete(User).where(User.login.startswith(LOGIN_PREFIX))
+        if keep_initiator:
+            stmt = stmt.where(User.login != INITIATOR_LOGIN)
+        await session.execute(stmt)
+        await session.commit()
+
+
+async def create_initiator() -> uuid.UUID:
+    async with async_session() as session:
+        initiator = await UserRepository(session).create_user(UserCreate(
+            name="Bench", surname="Bench", patronymic="Bench", role=Roles.admin,
+            phone="0", login=INITIATOR_LOGIN, password="bench"
+        ))
+        await session.commit()
+    return initiator.id
+
+
+async def run_legacy(rows) -> float:
+    started = time.perf_counter()
+    for row in rows:
+        async with async_session() as session:
+            await UserRepository(session).create_user(UserCreate(**row))
+            await session.commit()
+    return time.perf_counter() - started
+
+
+async def iter_chunks(rows, chunk_size: int):
+    numbered_rows = list(enumerate(rows, start=2))
+    for start in range(0, len(numbered_rows), chunk_size):
+        yield numbered_rows[start:start + chunk_size]
+
+
+async def run_bulk(rows, initiator_id: uuid.UUID) -> float:
+    started = time.perf_counter()
+    async with async_session() as session:
+        await UserService(session).import_users(
+            iter_chunks(rows, password_hashing.import_config.batch_size), initiator_id
+        )
+    return time.perf_counter() - started
+
+
+async def main(sizes, legacy_limit: int) -> None:
+    await cleanup(keep_initiator=False)
+    initiator_id = await create_initiator()
+    print(f"{'rows':>8} {'per-row, s':>12} {'bulk, s':>10} {'speedup':>8}")
+    try:
+        for size in sizes:
+            rows = make_rows(size)
+            measured = rows[:legacy_limit]
+            legacy_seconds = await run_legacy(measured) * size / len(measured)
+            await cleanup()
+
+            bulk_seconds = await run_bulk(rows, initiator_id)
+            await cleanup()
+
+            mark = "*" if len(measured) < size else " "
+            print(f"{size:>8} {legacy_seconds:>11.1f}{mark} {bulk_seconds:>10.1f} {legacy_seconds / bulk_seconds:>7.1f}x")
+    finally:
+        await audit_log.stop()
+        await cleanup(keep_initiator=False)
+        password_hashing.shutdown_process_pool()
+    print("* extrapolated from the first rows, see --legacy-limit")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000,50000")
+    parser.add_argument("--legacy-limit", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(main([int(size) for size in args.sizes.split(",")], args.legacy_limit))
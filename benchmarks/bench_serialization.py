@@ -0,0 +1,86 @@
+"""Serialization cost of /users/all: the old to_dict path against utils.serialization.
+
+Usage: python -m benchmarks.bench_serialization [--users 10000] [--transactions 20] [--repeat 3]
+
+Builds detached User rows with their transactions in memory (no database) and serves them from two
+routes of a throwaway app through an in-process ASGI transport, so FastAPI's own response handling
+is measured too. Both routes must return the same JSON.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import time
+import uuid
+
+from typing import List
+
+import httpx
+
+from fastapi import FastAPI
+
+from src.models import User, Transaction, Roles
+from src.schemas import UserResponse
+from utils.serialization import serialize
+
+
+def build_users(count: int, transactions: int) -> List[User]:
+    semester_id = uuid.uuid4()
+    created_at = datetime.datetime(2024, 9, 1, 12, 30, 15, 123456)
+    users = []
+    for i in range(count):
+        user_id = uuid.uuid4()
+        users.append(User(
+            id=user_id, name=f"Name{i}", surname=f"Surname{i}", patronymic="Patronymic", phone="0",
+            role=Roles.student, login=f"student-{i}", group_id=None, created_at=created_at,
+            transactions=[
+                Transaction(
+                    id=uuid.uuid4(), user_id=user_id, semester_id=semester_id, amount=1000.5,
+                    comment="payment", created_at=created_at
+                )
+                for _ in range(transactions)
+            ],
+        ))
+    return users
+
+
+def build_app(users: List[User]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/old", response_model=List[UserResponse])
+    async def old() -> List[UserResponse]:
+        return list(map(lambda x: UserResponse(**x.to_dict()), users))
+
+    @app.get("/new", response_model=List[UserResponse])
+    async def new():
+        return serialize(List[UserResponse], users)
+
+    return app
+
+
+async def main(args) -> None:
+    users = build_users(args.users, args.transactions)
+    transport = httpx.ASGITransport(app=build_app(users))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        bodies = {}
+        print(f"{args.users} users x {args.transactions} transactions")
+        print(f"{'path':>6} {'best, s':>8} {'MB':>6}")
+        for path in ("/old", "/new"):
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                response = await client.get(path)
+                timings.append(time.perf_counter() - started)
+            bodies[path] = response.content
+            print(f"{path:>6} {min(timings):>8.2f} {len(response.content) / 2 ** 20:>6.1f}")
+
+    if json.loads(bodies["/old"]) != json.loads(bodies["/new"]):
+        raise SystemExit("responses differ")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--transactions", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
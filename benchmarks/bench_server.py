@@ -0,0 +1,134 @@
+"""Throughput of the old single-process uvicorn command against `manage.py serve`.
+
+Usage: python -m benchmarks.bench_server [--login admin --password secret] [--seconds 10]
+       [--concurrency 64] [--clients 4] [--workers 0]
+
+Each server is started on a free local port, loaded for --seconds per endpoint by --clients client
+processes (one Python client cannot saturate several workers) and stopped with SIGTERM. /ping
+measures the server stack alone; with --login/--password the authenticated /users/self and
+/infra/semesters are loaded too. Both servers use the configured database.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+SETUPS = {
+    # the Dockerfile command before `manage.py serve`
+    "uvicorn --reload": lambda port: [
+        sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--reload"
+    ],
+    "manage.py serve": lambda port: [sys.executable, "manage.py", "serve"],
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(name: str, port: int, workers: int) -> subprocess.Popen:
+    env = dict(os.environ, SERVER_HOST="127.0.0.1", SERVER_PORT=str(port))
+    if workers:
+        env["WEB_CONCURRENCY"] = str(workers)
+    process = subprocess.Popen(SETUPS[name](port), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/ping").status_code == 200:
+                # give the remaining workers time to finish their startup as well
+                time.sleep(2)
+                return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{name} did not start")
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def load(url: str, headers: Dict[str, str], seconds: float, concurrency: int) -> Tuple[int, int, List[float]]:
+    done, errors, latencies = 0, 0, []
+    deadline = time.perf_counter() + seconds
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal done, errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await client.get(url, headers=headers)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code == 200:
+                done += 1
+            else:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return done, errors, latencies
+
+
+def client_process(args: Tuple[str, Dict[str, str], float, int]) -> Tuple[int, int, List[float]]:
+    return asyncio.run(load(*args))
+
+
+def get_token(base_url: str, login: Optional[str], password: Optional[str]) -> Optional[str]:
+    if login is None:
+        return None
+    response = httpx.post(f"{base_url}/users/login", json={"login": login, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def main(args) -> None:
+    print(f"{'server':<18} {'endpoint':<18} {'req/s':>8} {'errors':>7} {'p50, ms':>8} {'p99, ms':>8}")
+    for name in SETUPS:
+        port = free_port()
+        process = start_server(name, port, args.workers)
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            token = get_token(base_url, args.login, args.password)
+            paths = ("/ping",) if token is None else ("/ping", "/users/self", "/infra/semesters")
+            headers = {} if token is None else {"Authorization": f"Bearer {token}"}
+
+            for path in paths:
+                jobs = [(base_url + path, headers, args.seconds, args.concurrency)] * args.clients
+                with multiprocessing.Pool(args.clients) as pool:
+                    results = pool.map(client_process, jobs)
+                done = sum(result[0] for result in results)
+                errors = sum(result[1] for result in results)
+                latencies = sorted(latency for result in results for latency in result[2])
+                p50 = statistics.median(latencies) * 1000
+                p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+                print(f"{name:<18} {path:<18} {done / args.seconds:>8.0f} {errors:>7} {p50:>8.1f} {p99:>8.1f}")
+        finally:
+            stop_server(process)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--login")
+    parser.add_argument("--password")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=0, help="WEB_CONCURRENCY for manage.py serve, 0 = per CPU")
+    main(parser.parse_args())
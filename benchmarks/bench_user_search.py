@@ -0,0 +1,143 @@
+"""Latency of the users search on 100k seeded users, against downloading every student.
+
+Usage: python -m benchmarks.bench_user_search [--users 100000] [--repeat 50] [--limit 50]
+
+Seeds a disposable Postgres with users under the "search-" login prefix built from common
+surnames, names and patronymics, then runs UserRepository.search_users for prefix, whole-word,
+misspelled, login and phone queries and prints p50/p99 per query, the plan's top node and whether
+ix_users_search_trgm was used. The last line is the old path: UserRepository.get_all_students,
+which the admin UI filtered on the client. Exits with status 1 if a query plans a Seq Scan on users.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+from typing import Any, Dict, Iterator
+
+from sqlalchemy import event, text
+
+from src.database import engine, async_session
+from src.repositories.user_repository import UserRepository
+
+PREFIX = "search-"
+SURNAMES = ["Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов", "Новиков",
+            "Фёдоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семёнов", "Егоров", "Павлов", "Козлов"]
+NAMES = ["Александр", "Дмитрий", "Максим", "Сергей", "Андрей", "Алексей", "Артём", "Илья", "Кирилл", "Михаил"]
+PATRONYMICS = ["Александрович", "Дмитриевич", "Сергеевич", "Андреевич", "Алексеевич", "Иванович", "Петрович"]
+
+QUERIES = {
+    "surname prefix": "смир",
+    "whole surname": "кузнецов",
+    "misspelled surname": "кузнецав",
+    "name and patronymic": "илья сергеевич",
+    "login": f"{PREFIX}73",
+    "phone digits": "5550123",
+}
+
+SEED_STATEMENTS = (
+    "INSERT INTO users (id, name, surname, role, patronymic, phone, login, group_id, password_hash, created_at) "
+    "SELECT gen_random_uuid(), n.names[1 + i % cardinality(n.names)], "
+    "n.surnames[1 + (i / 7) % cardinality(n.surnames)] || CASE WHEN i % 3 = 0 THEN 'а' ELSE '' END, "
+    "'student', n.patronymics[1 + (i / 3) % cardinality(n.patronymics)], "
+    "'+7' || (5550000000 + i * 7919 % 10000000)::text, :prefix || i, NULL, '\\x00', now() "
+    "FROM generate_series(1, :users) i CROSS JOIN (SELECT CAST(:names AS text[]) AS names, "
+    "CAST(:surnames AS text[]) AS surnames, CAST(:patronymics AS text[]) AS patronymics) n",
+)
+
+
+async def run_statements(statements, params: Dict[str, Any]) -> None:
+    async with engine.begin() as conn:
+        for statement in statements:
+            await conn.execute(text(statement), params)
+
+
+async def vacuum_analyze() -> None:
+    # flushes the GIN pending list filled by the seed, as autovacuum would on a live table
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("VACUUM ANALYZE users"))
+
+
+async def cleanup() -> None:
+    await run_statements(("DELETE FROM users WHERE login LIKE :prefix || '%'",), {"prefix": PREFIX})
+
+
+def plan_nodes(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from plan_nodes(child)
+
+
+async def explain(query: str, limit: int) -> Dict[str, Any]:
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        async with async_session() as session:
+            await UserRepository(session).search_users(query, limit)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+    statement, parameters = statements[-1]
+    async with engine.connect() as conn:
+        result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+        plan = result.scalar_one()
+    return (json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]
+
+
+async def measure(call, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        async with async_session() as session:
+            started = time.perf_counter()
+            rows = await call(session)
+            timings.append(time.perf_counter() - started)
+    timings.sort()
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    return statistics.median(timings) * 1000, p99 * 1000, len(rows)
+
+
+async def main(args) -> int:
+    await cleanup()
+    failures = 0
+    try:
+        await run_statements(SEED_STATEMENTS, {
+            "prefix": PREFIX, "users": args.users, "surnames": SURNAMES, "names": NAMES, "patronymics": PATRONYMICS
+        })
+        await vacuum_analyze()
+        print(f"{args.users} users, limit {args.limit}")
+        print(f"{'query':<22} {'p50, ms':>8} {'p99, ms':>8} {'rows':>6}  plan")
+        for name, query in QUERIES.items():
+            plan = await explain(query, args.limit)
+            nodes = list(plan_nodes(plan))
+            seq_scan = any(node["Node Type"] == "Seq Scan" and node.get("Relation Name") == "users" for node in nodes)
+            uses_index = any(node.get("Index Name") == "ix_users_search_trgm" for node in nodes)
+            failures += seq_scan
+
+            p50, p99, rows = await measure(
+                lambda session: UserRepository(session).search_users(query, args.limit), args.repeat
+            )
+            note = "Seq Scan on users" if seq_scan else ("ix_users_search_trgm" if uses_index else plan["Node Type"])
+            print(f"{name:<22} {p50:>8.1f} {p99:>8.1f} {rows:>6}  {note}")
+
+        p50, p99, rows = await measure(lambda session: UserRepository(session).get_all_students(), 3)
+        print(f"{'all students (old)':<22} {p50:>8.1f} {p99:>8.1f} {rows:>6}")
+    finally:
+        await cleanup()
+        await engine.dispose()
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=50)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,102 @@
+"""Memory and latency of the students XLSX parser on synthetic workbooks.
+
+Usage: python -m benchmarks.bench_xlsx_parser [--sizes 10000,100000] [--chunk-size 1000]
+
+For every size the legacy in-memory parser and the streaming parser are run while a ticker
+coroutine measures how long the event loop stays blocked (what other requests would wait).
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+
+from io import BytesIO
+
+import openpyxl
+
+from fastapi import UploadFile
+
+from src.models import Roles
+from utils.excel_parser import Parser
+
+
+def make_workbook(path: str, size: int) -> None:
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(["surname", "name", "patronymic", "phone", "login", "password"])
+    for i in range(size):
+        sheet.append([f"Surname{i}", f"Name{i}", f"Patronymic{i}", f"+7{i:010d}", f"student{i}", f"password-{i}"])
+    workbook.save(path)
+
+
+def legacy_parse(file: UploadFile) -> list:
+    workbook = openpyxl.load_workbook(BytesIO(file.file.read()))
+    users = []
+    for row in workbook.active.iter_rows(min_row=2, values_only=True):
+        if row[0] is None:
+            break
+        users.append({
+            "surname": str(row[0]), "name": str(row[1]), "patronymic": str(row[2]), "role": Roles.student,
+            "phone": str(row[3]), "login": str(row[4]), "password": str(row[5])
+        })
+    return users
+
+
+async def streaming_parse(file: UploadFile, chunk_size: int) -> int:
+    rows = 0
+    async for chunk in Parser(file, chunk_size=chunk_size).parse_users():
+        rows += len(chunk)
+    return rows
+
+
+async def measure(parse, path: str):
+    max_stall = 0.0
+    running = True
+
+    async def ticker():
+        nonlocal max_stall
+        while running:
+            started = time.perf_counter()
+            await asyncio.sleep(0.005)
+            max_stall = max(max_stall, time.perf_counter() - started - 0.005)
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    with open(path, "rb") as file:
+        upload = UploadFile(file=file, filename="students.xlsx", size=os.path.getsize(path))
+        tracemalloc.start()
+        started = time.perf_counter()
+        await parse(upload)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    running = False
+    await ticker_task
+    return elapsed, peak / 2 ** 20, max_stall * 1000
+
+
+async def main(sizes, chunk_size: int) -> None:
+    async def run_legacy(upload):
+        legacy_parse(upload)
+
+    async def run_streaming(upload):
+        await streaming_parse(upload, chunk_size)
+
+    print(f"{'rows':>8} {'parser':>10} {'time, s':>8} {'peak, MiB':>10} {'max loop stall, ms':>19}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            path = os.path.join(directory, f"students-{size}.xlsx")
+            make_workbook(path, size)
+            for name, parse in (("legacy", run_legacy), ("streaming", run_streaming)):
+                elapsed, peak, stall = await measure(parse, path)
+                print(f"{size:>8} {name:>10} {elapsed:>8.2f} {peak:>10.1f} {stall:>19.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(main([int(size) for size in args.sizes.split(",")], args.chunk_size))
@@ -0,0 +1,182 @@
+"""SQL statements and transactions issued by every write endpoint, in process against the configured database.
+
+Usage: python -m benchmarks.count_statements
+
+The app is driven through an in-memory ASGI transport, so no server is needed. An admin, a student
+and the group/semester they touch are created under a unique prefix and deleted afterwards.
+Exits with status 1 if an endpoint issues more statements or commits than its budget in BUDGETS; the
+"before" column is the statement count of the path RETURNING / ON CONFLICT replaced (BASELINES), which
+is compared with the statements besides the entity_versions increment that old path did not make.
+tests/test_statement_budgets.py runs the same calls on SQLite.
+"""
+import asyncio
+import re
+import sys
+import uuid
+
+from typing import Dict, List, Tuple
+
+import httpx
+
+from sqlalchemy import delete, event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from main import app
+from src.database import async_session, engine
+from src.models import User, Group, Semester, Roles
+from src.schemas import UserCreate
+from src.repositories.user_repository import UserRepository
+from utils import auth_settings, password_hashing
+from utils.audit_log import audit_log
+
+PREFIX = f"bench-stmt-{uuid.uuid4().hex[:8]}-"
+
+# (endpoint, status): (statements, commits) at most, with the audit row written in the request (AUDIT_MODE=sync),
+# the principal cached and one entity_versions increment per commit
+BUDGETS: Dict[Tuple[str, int], Tuple[int, int]] = {
+    ("GET /users/self", 200): (3, 0),
+    ("POST /infra/new_group", 200): (3, 1),
+    ("POST /infra/new_group", 400): (1, 0),
+    ("POST /infra/new_semester", 200): (3, 1),
+    ("PUT /infra/edit_group/{id}", 200): (5, 1),
+    ("PUT /infra/edit_semester/{id}", 200): (4, 1),
+    ("POST /users/new", 200): (3, 1),
+    ("PUT /users/edit/{id}", 200): (5, 1),
+    ("PUT /operations/add_to_group", 200): (8, 1),
+    ("POST /operations/new_transaction", 200): (7, 1),
+}
+
+# statements of the same calls on the check-then-insert and re-select path that RETURNING / ON CONFLICT
+# replaced, measured the same way; a name conflict was answered by the name check in one statement already
+BASELINES: Dict[Tuple[str, int], int] = {
+    ("POST /infra/new_group", 200): 6,
+    ("POST /infra/new_semester", 200): 5,
+    ("PUT /infra/edit_group/{id}", 200): 7,
+    ("PUT /infra/edit_semester/{id}", 200): 6,
+    ("POST /users/new", 200): 6,
+    ("PUT /users/edit/{id}", 200): 6,
+    ("PUT /operations/add_to_group", 200): 8,
+    ("POST /operations/new_transaction", 200): 7,
+}
+
+
+class StatementCounter:
+    def __init__(self, counted_engine: AsyncEngine):
+        self.statements = 0
+        self.commits = 0
+        self.version_increments = 0
+        event.listen(counted_engine.sync_engine, "before_cursor_execute", self._on_statement)
+        event.listen(counted_engine.sync_engine, "commit", self._on_commit)
+
+    def _on_statement(self, conn, cursor, statement: str, *args) -> None:
+        self.statements += 1
+        if statement.startswith("INSERT INTO entity_versions"):
+            self.version_increments += 1
+
+    def _on_commit(self, *args) -> None:
+        self.commits += 1
+
+    def reset(self) -> None:
+        self.statements = 0
+        self.commits = 0
+        self.version_increments = 0
+
+
+async def create_user(role: Roles, login: str) -> User:
+    async with async_session() as session:
+        user = await UserRepository(session).create_user(UserCreate(
+            name="Bench", surname="Bench", patronymic="Bench", role=role, phone="0", login=login, password="bench"
+        ))
+        await session.commit()
+    return user
+
+
+async def cleanup() -> None:
+    async with async_session() as session:
+        await session.execute(delete(User).where(User.login.startswith(PREFIX)))
+        await session.execute(delete(Group).where(Group.name.startswith(PREFIX)))
+        await session.execute(delete(Semester).where(Semester.name.startswith(PREFIX)))
+        await session.commit()
+
+
+async def call_endpoints(
+        client: httpx.AsyncClient, counter: StatementCounter, admin: User, student: User
+) -> List[Tuple[str, int, int, int, int]]:
+    """Calls every write endpoint once; a row per call: endpoint, status, statements, commits, version increments."""
+    admin_headers = {"Authorization": f"Bearer {auth_settings.create_access_token(admin)}"}
+    student_headers = {"Authorization": f"Bearer {auth_settings.create_access_token(student)}"}
+    rows = []
+
+    async def call(method: str, path: str, headers=admin_headers, **kwargs) -> dict:
+        counter.reset()
+        response = await client.request(method, path, headers=headers, **kwargs)
+        endpoint = f"{method} {re.sub(r'[0-9a-f-]{36}', '{id}', path)}"
+        rows.append((endpoint, response.status_code, counter.statements, counter.commits, counter.version_increments))
+        # deferred audit rows are written outside the request, keep them out of the next row
+        await audit_log.flush()
+        return response.json()
+
+    # warm the principal cache so every row counts only the endpoint itself
+    await call("GET", "/users/self")
+    await call("GET", "/users/self", headers=student_headers)
+
+    group = await call("POST", "/infra/new_group", params={"group_name": f"{PREFIX}group"})
+    await call("POST", "/infra/new_group", params={"group_name": f"{PREFIX}group"})
+    semester = await call("POST", "/infra/new_semester", params={"semester_name": f"{PREFIX}semester"})
+    await call("PUT", f"/infra/edit_group/{group['id']}", params={"new_group_name": f"{PREFIX}group-2"})
+    await call("PUT", f"/infra/edit_semester/{semester['id']}", params={"new_semester_name": f"{PREFIX}semester-2"})
+    new_user = await call("POST", "/users/new", json={
+        "name": "Bench", "surname": "Bench", "patronymic": "Bench", "role": "observer",
+        "phone": "0", "login": f"{PREFIX}observer", "password": "bench"
+    })
+    await call("PUT", f"/users/edit/{new_user['id']}", json={
+        "name": "Bench2", "surname": "Bench", "patronymic": "Bench", "phone": "0"
+    })
+    await call("PUT", "/operations/add_to_group", params={"group_id": group["id"], "user_id": str(student.id)})
+    await call(
+        "POST", "/operations/new_transaction", headers=student_headers,
+        json={"semester_id": semester["id"], "amount": 1}
+    )
+
+    return rows
+
+
+def over_budget(row: Tuple[str, int, int, int, int]) -> bool:
+    endpoint, status, statements, commits, _ = row
+    max_statements, max_commits = BUDGETS[endpoint, status]
+    return statements > max_statements or commits > max_commits
+
+
+def not_below_baseline(row: Tuple[str, int, int, int, int]) -> bool:
+    endpoint, status, statements, _, version_increments = row
+    return (endpoint, status) in BASELINES and statements - version_increments >= BASELINES[endpoint, status]
+
+
+async def main() -> int:
+    admin = await create_user(Roles.admin, f"{PREFIX}admin")
+    student = await create_user(Roles.student, f"{PREFIX}student")
+    counter = StatementCounter(engine)
+    transport = httpx.ASGITransport(app=app)
+
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            rows = await call_endpoints(client, counter, admin, student)
+    finally:
+        await audit_log.stop()
+        await cleanup()
+        password_hashing.password_hasher.shutdown()
+        await engine.dispose()
+
+    print(f"{'endpoint':<36} {'status':>6} {'statements':>10} {'commits':>7} {'budget':>7} {'before':>6}")
+    for row in rows:
+        endpoint, status, statements, commits, _ = row
+        budget = "{}/{}".format(*BUDGETS[endpoint, status])
+        baseline = BASELINES.get((endpoint, status), "")
+        note = "  over budget" if over_budget(row) else ""
+        print(f"{endpoint:<36} {status:>6} {statements:>10} {commits:>7} {budget:>7} {baseline:>6}{note}")
+
+    return 1 if any(over_budget(row) for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,126 @@
+"""Peak RSS of the transactions export over a million seeded transactions.
+
+Usage: python -m benchmarks.export_memory [--transactions 1000000] [--students 20000]
+       [--formats csv,xlsx] [--max-growth-mb 64]
+
+Seeds a disposable Postgres with rows under the "export-" prefix, exports the seeded semester
+through ExportService (what GET /operations/export_transactions sends) and drains the chunks
+while a thread samples the process RSS. Exits with status 1 if the RSS grows by more than
+--max-growth-mb during any export: the export has to stay flat however many rows it reads.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+from typing import Any, Dict
+
+from sqlalchemy import text
+
+from src.database import engine, async_session
+from src.services.export_service import ExportService
+from utils.export_writer import ExportFormats
+
+PREFIX = "export-"
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+SEED_STATEMENTS = (
+    "INSERT INTO groups (id, name, created_at) SELECT gen_random_uuid(), :prefix || 'group', now()",
+    "INSERT INTO semesters (id, name, created_at) SELECT gen_random_uuid(), :prefix || 'semester', now()",
+    "INSERT INTO users (id, name, surname, role, patronymic, phone, login, group_id, password_hash, created_at) "
+    "SELECT gen_random_uuid(), 'Имя', 'Фамилия-' || i, 'student', 'Отчество', '0', :prefix || 'student-' || i, "
+    "CASE WHEN i % 2 = 0 THEN g.id END, '\\x00', now() "
+    "FROM generate_series(1, :students) i CROSS JOIN groups g WHERE g.name = :prefix || 'group'",
+    "INSERT INTO transactions (id, user_id, semester_id, amount, comment, created_at) "
+    "SELECT gen_random_uuid(), u.id, s.id, 1000.5, 'Оплата обучения за семестр ' || s.name, "
+    "now() - i * interval '1 second' "
+    "FROM generate_series(1, :transactions) i "
+    "JOIN users u ON u.login = :prefix || 'student-' || (i % :students + 1) "
+    "CROSS JOIN semesters s WHERE s.name = :prefix || 'semester'",
+)
+
+CLEANUP_STATEMENTS = (
+    "DELETE FROM users WHERE login LIKE :prefix || '%'",
+    "DELETE FROM groups WHERE name LIKE :prefix || '%'",
+    "DELETE FROM semesters WHERE name LIKE :prefix || '%'",
+)
+
+
+def current_rss() -> int:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * PAGE_SIZE
+
+
+class RSSSampler(threading.Thread):
+    def __init__(self, interval: float = 0.01):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = current_rss()
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.is_set():
+            self.peak = max(self.peak, current_rss())
+            time.sleep(self.interval)
+
+    def stop(self) -> int:
+        self._stopped.set()
+        self.join()
+        return max(self.peak, current_rss())
+
+
+async def run_statements(statements, params: Dict[str, Any]) -> None:
+    async with engine.begin() as conn:
+        for statement in statements:
+            await conn.execute(text(statement), params)
+
+
+async def export(export_format: ExportFormats, semester_id) -> Dict[str, float]:
+    baseline = current_rss()
+    sampler = RSSSampler()
+    sampler.start()
+    started = time.perf_counter()
+    size = 0
+    async with async_session() as session:
+        chunks = await ExportService(session).export_transactions(export_format, semester_id)
+    async for chunk in chunks:
+        size += len(chunk)
+    elapsed = time.perf_counter() - started
+    peak = sampler.stop()
+
+    return {"seconds": elapsed, "size_mb": size / 2 ** 20, "growth_mb": (peak - baseline) / 2 ** 20}
+
+
+async def main(args) -> int:
+    params = {"prefix": PREFIX, "students": args.students, "transactions": args.transactions}
+    await run_statements(CLEANUP_STATEMENTS, params)
+    failures = 0
+    try:
+        await run_statements(SEED_STATEMENTS, params)
+        async with engine.connect() as conn:
+            semester_id = await conn.scalar(text("SELECT id FROM semesters WHERE name = :prefix || 'semester'"), params)
+
+        print(f"{args.transactions} transactions, RSS ceiling +{args.max_growth_mb} MB")
+        print(f"{'format':<7} {'time, s':>8} {'file, MB':>9} {'RSS +MB':>8}")
+        for name in args.formats.split(","):
+            result = await export(ExportFormats(name), semester_id)
+            failed = result["growth_mb"] > args.max_growth_mb
+            failures += failed
+            print(f"{name:<7} {result['seconds']:>8.1f} {result['size_mb']:>9.1f} {result['growth_mb']:>8.1f}"
+                  f"{'  FAIL' if failed else ''}")
+    finally:
+        await run_statements(CLEANUP_STATEMENTS, params)
+        await engine.dispose()
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transactions", type=int, default=1000000)
+    parser.add_argument("--students", type=int, default=20000)
+    parser.add_argument("--formats", default="csv,xlsx")
+    parser.add_argument("--max-growth-mb", type=float, default=64)
+    sys.exit(asyncio.run(main(parser.parse_args())))
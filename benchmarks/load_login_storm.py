@@ -0,0 +1,86 @@
+"""Latency of cheap endpoints while a storm of logins hits a running API.
+
+Usage: python -m benchmarks.load_login_storm --url http://localhost:8000 --login student --password secret
+       [--logins 500] [--concurrency 100] [--probe-interval 0.05]
+
+/ping and /infra/semesters are probed at a fixed rate before and during the storm; with bcrypt
+off the event loop their p99 should stay flat while logins are in flight.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+PROBE_PATHS = ("/ping", "/infra/semesters")
+
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+
+async def probe(client: httpx.AsyncClient, path: str, interval: float, stop: asyncio.Event, latencies: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get(path)
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+
+
+async def probe_phase(client: httpx.AsyncClient, interval: float, work) -> dict:
+    stop = asyncio.Event()
+    latencies = {path: [] for path in PROBE_PATHS}
+    probes = [asyncio.create_task(probe(client, path, interval, stop, latencies[path])) for path in PROBE_PATHS]
+    result = await work()
+    stop.set()
+    await asyncio.gather(*probes)
+    return {"latencies": latencies, "result": result}
+
+
+async def login_storm(client: httpx.AsyncClient, login: str, password: str, total: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses = {}
+
+    async def one_login():
+        async with semaphore:
+            response = await client.post("/users/login", json={"login": login, "password": password})
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one_login() for _ in range(total)))
+    return time.perf_counter() - started, statuses
+
+
+async def main(args) -> None:
+    limits = httpx.Limits(max_connections=args.concurrency + len(PROBE_PATHS))
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+        baseline = await probe_phase(client, args.probe_interval, lambda: asyncio.sleep(args.baseline_seconds))
+        storm = await probe_phase(
+            client, args.probe_interval,
+            lambda: login_storm(client, args.login, args.password, args.logins, args.concurrency)
+        )
+
+    elapsed, statuses = storm["result"]
+    print(f"logins: {args.logins} in {elapsed:.1f}s, statuses {statuses}")
+    print(f"{'endpoint':>18} {'phase':>9} {'n':>5} {'p50, ms':>8} {'p99, ms':>8}")
+    for path in PROBE_PATHS:
+        for phase, data in (("baseline", baseline), ("storm", storm)):
+            values = data["latencies"][path]
+            p50 = statistics.median(values) * 1000 if values else float("nan")
+            print(f"{path:>18} {phase:>9} {len(values):>5} {p50:>8.1f} {percentile(values, 0.99):>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--login", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--logins", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--probe-interval", type=float, default=0.05)
+    parser.add_argument("--baseline-seconds", type=float, default=5)
+    asyncio.run(main(parser.parse_args()))
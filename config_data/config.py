@@ -1,3 +1,5 @@
+import os
+
 from dataclasses import dataclass
 from pathlib import Path
 from environs import Env
@@ -18,6 +20,19 @@ class DataBase:
         return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
 
 
+@dataclass
+class DatabasePool:
+    pool_size: int = 10
+    max_overflow: int = 10
+    pool_timeout: float = 30
+    pool_recycle: int = 1800
+    pool_pre_ping: bool = True
+    statement_cache_size: int = 100
+    statement_timeout: int = 0
+    pgbouncer: bool = False
+    max_connections: int = 0
+
+
 @dataclass
 class AuthJWT:
     private_key_path: Path = BASE_DIR / "certs" / "jwt-private.pem"
@@ -27,10 +42,82 @@ class AuthJWT:
     refresh_token_expire_days: int = 30
 
 
+@dataclass
+class UsersImport:
+    hash_workers: int = os.cpu_count() or 1
+    batch_size: int = 1000
+    max_file_size: int = 20 * 1024 * 1024
+
+
+@dataclass
+class PasswordHashing:
+    max_workers: int = os.cpu_count() or 1
+    max_queue: int = 64
+
+
+@dataclass
+class Cache:
+    principal_size: int = 10000
+    principal_ttl: int = 60
+    token_size: int = 10000
+    token_ttl: int = 300
+    invalidation_bus: bool = True
+    reference_ttl: int = 300
+
+
+@dataclass
+class Audit:
+    mode: str = "sync"
+    batch_size: int = 500
+    flush_interval: float = 0.5
+    max_queue: int = 10000
+
+
+@dataclass
+class Idempotency:
+    cache_size: int = 10000
+    cache_ttl: int = 600
+    key_retention: int = 86400
+
+
+@dataclass
+class Partitions:
+    months_ahead: int = 3
+    retention_months: int = 0
+    archive_dir: Path = BASE_DIR / "archive"
+
+
+@dataclass
+class Migrations:
+    check_on_startup: bool = True
+    lock_timeout: int = 60000
+
+
+@dataclass
+class Server:
+    host: str = "0.0.0.0"
+    port: int = 8000
+    workers: int = 0
+    graceful_timeout: int = 30
+
+    @property
+    def worker_count(self) -> int:
+        return self.workers or os.cpu_count() or 1
+
+
 @dataclass
 class Config:
     database: DataBase
+    databasePool: DatabasePool
     authJWT: AuthJWT
+    usersImport: UsersImport
+    passwordHashing: PasswordHashing
+    cache: Cache
+    audit: Audit
+    idempotency: Idempotency
+    partitions: Partitions
+    migrations: Migrations
+    server: Server
 
 
 def load_config(path: str | None = None) -> Config:
@@ -45,9 +132,63 @@ def load_config(path: str | None = None) -> Config:
             DB_PASS=env("DB_PASS"),
             DB_NAME=env("DB_NAME")
         ),
+        databasePool=DatabasePool(
+            pool_size=env.int("DB_POOL_SIZE", DatabasePool.pool_size),
+            max_overflow=env.int("DB_MAX_OVERFLOW", DatabasePool.max_overflow),
+            pool_timeout=env.float("DB_POOL_TIMEOUT", DatabasePool.pool_timeout),
+            pool_recycle=env.int("DB_POOL_RECYCLE", DatabasePool.pool_recycle),
+            pool_pre_ping=env.bool("DB_POOL_PRE_PING", DatabasePool.pool_pre_ping),
+            statement_cache_size=env.int("DB_STATEMENT_CACHE_SIZE", DatabasePool.statement_cache_size),
+            statement_timeout=env.int("DB_STATEMENT_TIMEOUT", DatabasePool.statement_timeout),
+            pgbouncer=env.bool("DB_PGBOUNCER", DatabasePool.pgbouncer),
+            max_connections=env.int("DB_MAX_CONNECTIONS", DatabasePool.max_connections)
+        ),
         authJWT=AuthJWT(
-            private_key_path=AuthJWT.private_key_path,
-            public_key_path=AuthJWT.public_key_path,
-            algorithm=AuthJWT.algorithm
+            private_key_path=BASE_DIR / env.path("JWT_PRIVATE_KEY_PATH", AuthJWT.private_key_path),
+            public_key_path=BASE_DIR / env.path("JWT_PUBLIC_KEY_PATH", AuthJWT.public_key_path),
+            algorithm=env.str("JWT_ALGORITHM", AuthJWT.algorithm)
+        ),
+        usersImport=UsersImport(
+            hash_workers=env.int("IMPORT_HASH_WORKERS", UsersImport.hash_workers),
+            batch_size=env.int("IMPORT_BATCH_SIZE", UsersImport.batch_size),
+            max_file_size=env.int("IMPORT_MAX_FILE_SIZE", UsersImport.max_file_size)
+        ),
+        passwordHashing=PasswordHashing(
+            max_workers=env.int("HASH_MAX_WORKERS", PasswordHashing.max_workers),
+            max_queue=env.int("HASH_MAX_QUEUE", PasswordHashing.max_queue)
+        ),
+        cache=Cache(
+            principal_size=env.int("PRINCIPAL_CACHE_SIZE", Cache.principal_size),
+            principal_ttl=env.int("PRINCIPAL_CACHE_TTL", Cache.principal_ttl),
+            token_size=env.int("TOKEN_CACHE_SIZE", Cache.token_size),
+            token_ttl=env.int("TOKEN_CACHE_TTL", Cache.token_ttl),
+            invalidation_bus=env.bool("CACHE_INVALIDATION_BUS", Cache.invalidation_bus),
+            reference_ttl=env.int("REFERENCE_CACHE_TTL", Cache.reference_ttl)
+        ),
+        audit=Audit(
+            mode=env.str("AUDIT_MODE", Audit.mode),
+            batch_size=env.int("AUDIT_BATCH_SIZE", Audit.batch_size),
+            flush_interval=env.float("AUDIT_FLUSH_INTERVAL", Audit.flush_interval),
+            max_queue=env.int("AUDIT_MAX_QUEUE", Audit.max_queue)
+        ),
+        idempotency=Idempotency(
+            cache_size=env.int("IDEMPOTENCY_CACHE_SIZE", Idempotency.cache_size),
+            cache_ttl=env.int("IDEMPOTENCY_CACHE_TTL", Idempotency.cache_ttl),
+            key_retention=env.int("IDEMPOTENCY_KEY_RETENTION", Idempotency.key_retention)
+        ),
+        partitions=Partitions(
+            months_ahead=env.int("OPERATIONS_PARTITIONS_AHEAD", Partitions.months_ahead),
+            retention_months=env.int("OPERATIONS_RETENTION_MONTHS", Partitions.retention_months),
+            archive_dir=BASE_DIR / env.path("OPERATIONS_ARCHIVE_DIR", Partitions.archive_dir)
+        ),
+        migrations=Migrations(
+            check_on_startup=env.bool("SCHEMA_CHECK_ON_STARTUP", Migrations.check_on_startup),
+            lock_timeout=env.int("SCHEMA_LOCK_TIMEOUT", Migrations.lock_timeout)
+        ),
+        server=Server(
+            host=env.str("SERVER_HOST", Server.host),
+            port=env.int("SERVER_PORT", Server.port),
+            workers=env.int("WEB_CONCURRENCY", Server.workers),
+            graceful_timeout=env.int("SERVER_GRACEFUL_TIMEOUT", Server.graceful_timeout)
         ),
     )
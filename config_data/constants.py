@@ -5,6 +5,12 @@ ALREADY_EXIST_SEMESTER_MESSAGE = "Semester with this name already exist!"
 USER_NOT_FOUND_MESSAGE = "Cancel found this user"
 GROUP_NOT_FOUND_MESSAGE = "Cancel found this group"
 SEMESTER_NOT_FOUND_MESSAGE = "Cancel found this semester"
+INVALID_IMPORT_ROW_MESSAGE = "Row has empty or invalid fields"
+DUPLICATE_IMPORT_LOGIN_MESSAGE = "Login is repeated in the file"
+IMPORT_STOPPED_MESSAGE = "The file could not be read from this row on, neither it nor the rows below were loaded"
+DUPLICATE_BANK_REFERENCE_MESSAGE = "Bank reference is repeated in the file"
+ALREADY_EXIST_PAYMENT_MESSAGE = "Payment with this bank reference already exist!"
+PAYMENTS_FILE_FORMAT_MESSAGE = "Excepted .xlsx or .csv file"
 
 TRANSACTION_COMMENT = "Оплата обучения за семестр {semester_name} на сумму {amount}"
 
@@ -13,6 +19,21 @@ TOKEN_TYPE_FIELD = "type"
 ACCESS_TOKEN_TYPE = "access"
 REFRESH_TOKEN_TYPE = "refresh"
 
+# PAGINATION SETTINGS
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 500
+
+# EXPORT SETTINGS
+EXPORT_BATCH_SIZE = 2000
+TRANSACTIONS_EXPORT_HEADER = (
+    "ID", "Дата", "Семестр", "Сумма", "Фамилия", "Имя", "Отчество", "Логин", "Группа", "Комментарий"
+)
+OPERATIONS_EXPORT_HEADER = ("ID", "Дата", "Тип", "Фамилия", "Имя", "Отчество", "Логин", "Комментарий")
+
+# OPERATIONS PARTITIONS
+OPERATIONS_PARTITION_PATTERN = r"^operations_p\d{4}_\d{2}$"
+OPERATIONS_ARCHIVE_HEADER = ("id", "type", "user_id", "comment", "created_at")
+
 # OPERATION COMMENTS
 LOAD_USERS_COMMENT = "Загружено {count} пользователей из excel файла"
 CREATE_USER_COMMENT = "Создан новый пользователь {surname} {name} {patronymic} с ролью {role}"
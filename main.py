@@ -1,24 +1,56 @@
-import os
+import logging
+
 import uvicorn
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 
 from src.routers.users_router import router as user_router
 from src.routers.infra_router import router as infra_router
 from src.routers.operations_router import router as operations_router
+from src.routers.stats_router import router as stats_router
+
+from src.database import async_session, database_config, engine
+from src.services.partition_service import PartitionService
+from utils import migrations, password_hashing
+from utils.audit_log import audit_log
+from utils.invalidation import invalidation_bus
+
+logger = logging.getLogger(__name__)
+
+
+async def create_future_partitions() -> None:
+    # the daily `manage.py maintain-partitions` does the same; a failure here must not keep the API down
+    try:
+        async with async_session() as session:
+            await PartitionService(session).create_future_partitions()
+    except Exception:
+        logger.exception("Failed to create the future partitions of operations")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    os.system("alembic upgrade head")
+    if migrations.migrations_config.check_on_startup:
+        await migrations.check_revision()
+    await create_future_partitions()
+    audit_log.start()
+    if database_config.cache.invalidation_bus:
+        invalidation_bus.start()
     yield
+    # runs after the server has drained in-flight requests
+    await invalidation_bus.stop()
+    await audit_log.stop()
+    password_hashing.shutdown_process_pool()
+    password_hashing.password_hasher.shutdown()
+    await engine.dispose()
 
 
 app = FastAPI(
     title="Students payment service",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 
@@ -37,11 +69,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 app.include_router(user_router)
 app.include_router(infra_router)
 app.include_router(operations_router)
+app.include_router(stats_router)
 
 if __name__ == "__main__":
     uvicorn.run(
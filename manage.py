@@ -0,0 +1,93 @@
+import asyncio
+import typer
+import uvicorn
+
+from src.database import async_session, engine, server_config
+from src.services.operation_service import OperationService
+from src.services.partition_service import PartitionService
+from src.services.stats_service import StatsService
+from utils import migrations
+
+app = typer.Typer(help="Maintenance commands of the payment service")
+
+
+@app.callback()
+def main() -> None:
+    pass
+
+
+async def _rebuild_stats() -> int:
+    try:
+        async with async_session() as session:
+            return await StatsService(session).rebuild()
+    finally:
+        await engine.dispose()
+
+
+@app.command("rebuild-stats")
+def rebuild_stats() -> None:
+    """Recompute the payment_stats rollup from transactions, e.g. after a backfill."""
+    buckets = asyncio.run(_rebuild_stats())
+    typer.echo(f"payment_stats rebuilt: {buckets} buckets")
+
+
+async def _purge_idempotency_keys() -> int:
+    try:
+        async with async_session() as session:
+            return await OperationService(session).delete_expired_idempotency_keys()
+    finally:
+        await engine.dispose()
+
+
+@app.command("purge-idempotency-keys")
+def purge_idempotency_keys() -> None:
+    """Delete stored Idempotency-Key responses older than IDEMPOTENCY_KEY_RETENTION; run it daily."""
+    deleted = asyncio.run(_purge_idempotency_keys())
+    typer.echo(f"idempotency keys deleted: {deleted}")
+
+
+async def _maintain_partitions():
+    try:
+        async with async_session() as session:
+            service = PartitionService(session)
+            return await service.create_future_partitions(), await service.archive_expired_partitions()
+    finally:
+        await engine.dispose()
+
+
+@app.command("maintain-partitions")
+def maintain_partitions() -> None:
+    """Create the coming monthly partitions of operations and archive the expired ones; run it daily."""
+    created, archived = asyncio.run(_maintain_partitions())
+    typer.echo(f"operations partitions created: {', '.join(created) or 'none'}")
+    for path in archived:
+        typer.echo(f"archived and dropped: {path}")
+
+
+@app.command("migrate")
+def migrate(revision: str = typer.Argument("heads", help="Target revision")) -> None:
+    """Upgrade the database schema; run once per deploy, before the API workers start."""
+    asyncio.run(migrations.upgrade(revision))
+    typer.echo(f"Database upgraded to {revision}")
+
+
+@app.command("serve")
+def serve() -> None:
+    """Run the API in production mode: a worker per CPU (or WEB_CONCURRENCY), uvloop and httptools."""
+    uvicorn.run(
+        "main:app",
+        host=server_config.host,
+        port=server_config.port,
+        workers=server_config.worker_count,
+        # uvloop when it is installed (it is not available on Windows)
+        loop="auto",
+        http="httptools",
+        lifespan="on",
+        proxy_headers=True,
+        # on SIGTERM stop accepting connections and give in-flight requests this long to finish
+        timeout_graceful_shutdown=server_config.graceful_timeout,
+    )
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,41 @@
+"""Add payment_stats rollup table
+
+Revision ID: 7c2e5a9d4f10
+Revises: ff9678690015
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2e5a9d4f10'
+down_revision: Union[str, None] = 'ff9678690015'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('payment_stats',
+    sa.Column('semester_id', sa.UUID(), nullable=False),
+    sa.Column('group_id', sa.UUID(), nullable=False),
+    sa.Column('total_amount', sa.Float(), nullable=False),
+    sa.Column('payments_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['semester_id'], ['semesters.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('semester_id', 'group_id')
+    )
+    # backfill from existing payments; students without a group go to the all-zero group id
+    op.execute(
+        "INSERT INTO payment_stats (semester_id, group_id, total_amount, payments_count) "
+        "SELECT t.semester_id, COALESCE(u.group_id, '00000000-0000-0000-0000-000000000000'::uuid), "
+        "SUM(t.amount), COUNT(*) "
+        "FROM transactions t JOIN users u ON u.id = t.user_id "
+        "GROUP BY t.semester_id, u.group_id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('payment_stats')
@@ -0,0 +1,31 @@
+"""Add entity_versions table
+
+Revision ID: a6d4f0c2e8b1
+Revises: f3b9d27a6c15
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6d4f0c2e8b1'
+down_revision: Union[str, None] = 'f3b9d27a6c15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # rows are created by the first committed change of each entity type
+    op.create_table('entity_versions',
+    sa.Column('entity', sa.String(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('entity')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('entity_versions')
@@ -0,0 +1,44 @@
+"""Add indexes for foreign keys and filter columns
+
+Revision ID: b41d8e07c3a5
+Revises: 7c2e5a9d4f10
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b41d8e07c3a5'
+down_revision: Union[str, None] = '7c2e5a9d4f10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# name, table, columns, extra create_index kwargs
+INDEXES = (
+    ('ix_transactions_user_id_semester_id', 'transactions', ['user_id', 'semester_id'], {}),
+    ('ix_transactions_semester_id_user_id', 'transactions', ['semester_id', 'user_id'],
+     {'postgresql_include': ['amount']}),
+    ('ix_operations_user_id', 'operations', ['user_id'], {}),
+    ('ix_operations_created_at_id', 'operations', ['created_at', 'id'], {}),
+    ('ix_users_group_id', 'users', ['group_id'], {}),
+    ('ix_users_role_surname_id', 'users', ['role', 'surname', 'id'], {}),
+    ('ix_payment_stats_group_id', 'payment_stats', ['group_id'], {}),
+)
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY does not block writes but cannot run inside a transaction.
+    # if_not_exists skips indexes built by an interrupted run; an index a failed build left
+    # INVALID has to be dropped by hand before repeating the upgrade
+    with op.get_context().autocommit_block():
+        for name, table, columns, kwargs in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True, **kwargs)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
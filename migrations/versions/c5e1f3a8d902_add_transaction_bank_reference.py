@@ -0,0 +1,36 @@
+"""Add bank_reference to transactions
+
+Revision ID: c5e1f3a8d902
+Revises: b41d8e07c3a5
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e1f3a8d902'
+down_revision: Union[str, None] = 'b41d8e07c3a5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # a nullable column without a default is added without rewriting the table
+    op.add_column('transactions', sa.Column('bank_reference', sa.String(), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_transactions_bank_reference', 'transactions', ['bank_reference'],
+            unique=True, postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_transactions_bank_reference', table_name='transactions', postgresql_concurrently=True, if_exists=True
+        )
+    op.drop_column('transactions', 'bank_reference')
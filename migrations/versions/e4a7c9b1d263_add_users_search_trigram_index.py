@@ -0,0 +1,35 @@
+"""Add trigram index for the users search
+
+Revision ID: e4a7c9b1d263
+Revises: d82b6c4e17f3
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a7c9b1d263'
+down_revision: Union[str, None] = 'd82b6c4e17f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# the expression of src.repositories.user_repository.user_search_text, character for character
+SEARCH_TEXT = "lower(surname || ' ' || name || ' ' || patronymic || ' ' || login || ' ' || phone)"
+
+
+def upgrade() -> None:
+    # pg_trgm ships with Postgres; creating it needs the CREATE privilege on the database
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_search_trgm "
+            f"ON users USING gin ({SEARCH_TEXT} gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_search_trgm")
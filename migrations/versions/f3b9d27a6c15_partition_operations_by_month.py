@@ -0,0 +1,108 @@
+"""Partition operations by created_at month
+
+Revision ID: f3b9d27a6c15
+Revises: e4a7c9b1d263
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b9d27a6c15'
+down_revision: Union[str, None] = 'e4a7c9b1d263'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# months created in advance here; afterwards `python manage.py maintain-partitions` keeps them ahead
+MONTHS_AHEAD = 3
+
+COLUMNS = "id, type, user_id, comment, created_at"
+
+# one partition per month from the oldest operation to MONTHS_AHEAD months after the latest one or today,
+# named operations_pYYYY_MM like src.services.partition_service.partition_name
+CREATE_PARTITIONS = f"""
+DO $$
+DECLARE
+    partition_start timestamp;
+BEGIN
+    FOR partition_start IN
+        SELECT generate_series(
+            date_trunc('month', coalesce(min(created_at), localtimestamp)),
+            date_trunc('month', greatest(max(created_at), localtimestamp)) + interval '{MONTHS_AHEAD} months',
+            interval '1 month'
+        )
+        FROM operations_unpartitioned
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF operations FOR VALUES FROM (%L) TO (%L)',
+            'operations_p' || to_char(partition_start, 'YYYY_MM'), partition_start,
+            partition_start + interval '1 month'
+        );
+    END LOOP;
+END
+$$
+"""
+
+
+def create_indexes() -> None:
+    op.create_index('ix_operations_user_id', 'operations', ['user_id'])
+    op.create_index('ix_operations_created_at_id', 'operations', ['created_at', 'id'])
+
+
+def drop_old_table_indexes(table: str, primary_key: str) -> None:
+    # index names are unique per schema, so the copy's indexes cannot be built while these exist
+    op.drop_index('ix_operations_user_id', table_name=table)
+    op.drop_index('ix_operations_created_at_id', table_name=table)
+    op.execute(f'ALTER TABLE {table} RENAME CONSTRAINT operations_pkey TO {primary_key}')
+
+
+def upgrade() -> None:
+    # the rows are copied inside the migration transaction: operations is locked until it commits,
+    # so run it in a quiet window on a large table
+    op.rename_table('operations', 'operations_unpartitioned')
+    drop_old_table_indexes('operations_unpartitioned', 'operations_unpartitioned_pkey')
+
+    # the partition key has to be part of the primary key
+    op.create_table(
+        'operations',
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('type', postgresql.ENUM(name='operationtypes', create_type=False), nullable=False),
+        sa.Column('user_id', sa.UUID(), nullable=False),
+        sa.Column('comment', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id', 'created_at', name='operations_pkey'),
+        postgresql_partition_by='RANGE (created_at)'
+    )
+    op.execute(CREATE_PARTITIONS)
+    op.execute(f'INSERT INTO operations ({COLUMNS}) SELECT {COLUMNS} FROM operations_unpartitioned')
+    op.drop_table('operations_unpartitioned')
+    # built after the copy, on every partition at once
+    create_indexes()
+    # autovacuum analyzes the partitions but never the partitioned table itself
+    op.execute('ANALYZE operations')
+
+
+def downgrade() -> None:
+    # archived months are not brought back, and partitions detached by hand are left alone
+    op.rename_table('operations', 'operations_partitioned')
+    drop_old_table_indexes('operations_partitioned', 'operations_partitioned_pkey')
+
+    op.create_table(
+        'operations',
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('type', postgresql.ENUM(name='operationtypes', create_type=False), nullable=False),
+        sa.Column('user_id', sa.UUID(), nullable=False),
+        sa.Column('comment', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id', name='operations_pkey')
+    )
+    op.execute(f'INSERT INTO operations ({COLUMNS}) SELECT {COLUMNS} FROM operations_partitioned')
+    op.drop_table('operations_partitioned')
+    create_indexes()
@@ -1,13 +1,121 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncAttrs
+import time
+import uuid
+
+from typing import Any, AsyncIterator, Dict, Tuple
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncAttrs, AsyncSession
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from config_data.config import Config, load_config
+from utils import metrics
 
 database_config: Config = load_config(".env")
 DATABASE_URL = database_config.database.DATABASE_URL
+pool_config = database_config.databasePool
+server_config = database_config.server
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that also counts checkouts, timeouts and the time requests wait for a connection."""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self._timeouts += 1
+            raise
+        finally:
+            wait_seconds = time.perf_counter() - started_at
+            self._wait_seconds += wait_seconds
+            self._max_wait_seconds = max(self._max_wait_seconds, wait_seconds)
+        self._checkouts += 1
+        return connection
+
+    def recreate(self) -> "InstrumentedPool":
+        # dispose() swaps in a fresh pool; keep the counters running across it
+        pool = super().recreate()
+        pool._checkouts, pool._timeouts = self._checkouts, self._timeouts
+        pool._wait_seconds, pool._max_wait_seconds = self._wait_seconds, self._max_wait_seconds
+        return pool
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "overflow": max(self.overflow(), 0),
+            "checkouts": self._checkouts,
+            "timeouts": self._timeouts,
+            "wait_seconds_total": self._wait_seconds,
+            "wait_seconds_max": self._max_wait_seconds,
+        }
+
+
+def get_pool_limits() -> Tuple[int, int]:
+    """pool_size and max_overflow of this worker, shrunk to its share of DB_MAX_CONNECTIONS."""
+    if not pool_config.max_connections:
+        return pool_config.pool_size, pool_config.max_overflow
+
+    share = pool_config.max_connections // server_config.worker_count
+    if database_config.cache.invalidation_bus:
+        # the invalidation bus keeps one LISTEN connection open outside the pool
+        share -= 1
+    if share < 1:
+        raise ValueError(
+            f"DB_MAX_CONNECTIONS={pool_config.max_connections} leaves no connections "
+            f"for {server_config.worker_count} workers"
+        )
+    pool_size = min(pool_config.pool_size, share)
+    return pool_size, min(pool_config.max_overflow, share - pool_size)
+
+
+def get_connect_args() -> Dict[str, Any]:
+    if pool_config.pgbouncer:
+        # PgBouncer in transaction mode hands every transaction to any server connection,
+        # so named prepared statements must not be reused and startup parameters are not passed
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+
+    connect_args: Dict[str, Any] = {
+        "statement_cache_size": pool_config.statement_cache_size,
+        "prepared_statement_cache_size": pool_config.statement_cache_size,
+    }
+    if pool_config.statement_timeout:
+        connect_args["server_settings"] = {"statement_timeout": str(pool_config.statement_timeout)}
+    return connect_args
+
+
+pool_size, max_overflow = get_pool_limits()
+engine = create_async_engine(
+    DATABASE_URL,
+    poolclass=InstrumentedPool,
+    pool_size=pool_size,
+    max_overflow=max_overflow,
+    pool_timeout=pool_config.pool_timeout,
+    pool_recycle=pool_config.pool_recycle,
+    pool_pre_ping=pool_config.pool_pre_ping,
+    connect_args=get_connect_args(),
+)
+async_session = async_sessionmaker(engine, expire_on_commit=False)
+metrics.register("database_pool", lambda: engine.pool.metrics())
+
 
-engine = create_async_engine(DATABASE_URL)
-async_session = async_sessionmaker(engine)
+async def get_session() -> AsyncIterator[AsyncSession]:
+    """Request-scoped session shared by every repository; services commit it once per business operation."""
+    async with async_session() as session:
+        yield session
 
 
 class Base(AsyncAttrs, DeclarativeBase):
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from fastapi import HTTPException, status
 
 
@@ -27,8 +29,8 @@ class IncorrectFileFormatException(HTTPException):
     status_code = status.HTTP_400_BAD_REQUEST
     detail = "Excepted .xlsx file"
 
-    def __init__(self):
-        super().__init__(status_code=self.status_code, detail=self.detail)
+    def __init__(self, detail: Optional[str] = None):
+        super().__init__(status_code=self.status_code, detail=detail or self.detail)
 
 
 class ErrorLoadFileException(HTTPException):
@@ -39,6 +41,38 @@ class ErrorLoadFileException(HTTPException):
         super().__init__(status_code=self.status_code, detail=self.detail)
 
 
+class FileTooLargeException(HTTPException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+    def __init__(self, max_size: int):
+        super().__init__(status_code=self.status_code, detail=f"File is larger than {max_size} bytes")
+
+
+class IdempotencyKeyReusedException(HTTPException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    detail = "Idempotency-Key was already used with a different request"
+
+    def __init__(self):
+        super().__init__(status_code=self.status_code, detail=self.detail)
+
+
+class IncorrectCursorException(HTTPException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    detail = "Invalid pagination cursor"
+
+    def __init__(self):
+        super().__init__(status_code=self.status_code, detail=self.detail)
+
+
+class ServiceOverloadedException(HTTPException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    detail = "Service is overloaded, retry later"
+    headers = {"Retry-After": "1"}
+
+    def __init__(self):
+        super().__init__(status_code=self.status_code, detail=self.detail, headers=self.headers)
+
+
 class CredentialException(HTTPException):
     status_code = status.HTTP_401_UNAUTHORIZED
     detail = "Could not validate credentials"
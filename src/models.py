@@ -3,7 +3,7 @@ import uuid
 
 from enum import Enum
 from typing import Dict, Any, Optional, List
-from sqlalchemy import UUID, func, ForeignKey
+from sqlalchemy import JSON, UUID, BigInteger, func, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.database import Base
@@ -23,6 +23,10 @@ class OperationTypes(Enum):
     payment = "payment"
 
 
+# payment_stats bucket of students without a group (a primary key column cannot be NULL)
+NO_GROUP_ID = uuid.UUID(int=0)
+
+
 class Semester(Base):
     __tablename__ = "semesters"
 
@@ -40,14 +44,21 @@ class Semester(Base):
 
 class Operation(Base):
     __tablename__ = "operations"
+    __table_args__ = (
+        Index("ix_operations_user_id", "user_id"),
+        Index("ix_operations_created_at_id", "created_at", "id"),
+        # one partition per month, see src.services.partition_service
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     type: Mapped[OperationTypes] = mapped_column()
     user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
     comment: Mapped[str] = mapped_column(nullable=True)
-    created_at: Mapped[datetime.datetime] = mapped_column(default=func.now())
+    # part of the primary key because it is the partition key
+    created_at: Mapped[datetime.datetime] = mapped_column(primary_key=True, default=func.now())
 
-    initiator: Mapped["User"] = relationship(back_populates="operations", uselist=False, lazy="selectin")
+    initiator: Mapped["User"] = relationship(back_populates="operations", uselist=False, lazy="raise")
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -74,7 +85,7 @@ class Group(Base):
     created_at: Mapped[datetime.datetime] = mapped_column(default=func.now())
 
     users: Mapped[List["User"]] = relationship(back_populates="group", uselist=True,
-                                               lazy="selectin", cascade="all, delete-orphan")
+                                               lazy="raise", cascade="all, delete-orphan")
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -87,15 +98,22 @@ class Group(Base):
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        Index("ix_transactions_user_id_semester_id", "user_id", "semester_id"),
+        Index("ix_transactions_semester_id_user_id", "semester_id", "user_id", postgresql_include=["amount"]),
+        Index("ix_transactions_bank_reference", "bank_reference", unique=True),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
     semester_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("semesters.id", ondelete="CASCADE"))
     amount: Mapped[float] = mapped_column()
     comment: Mapped[str] = mapped_column()
+    # reference of the bank transfer for payments loaded from a bank statement
+    bank_reference: Mapped[Optional[str]] = mapped_column(nullable=True, default=None)
     created_at: Mapped[datetime.datetime] = mapped_column(default=func.now())
 
-    user: Mapped["User"] = relationship(back_populates="transactions", uselist=False)
+    user: Mapped["User"] = relationship(back_populates="transactions", uselist=False, lazy="raise")
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -104,12 +122,17 @@ class Transaction(Base):
             "semester_id": self.semester_id,
             "amount": self.amount,
             "comment": self.comment,
+            "bank_reference": self.bank_reference,
             "created_at": self.created_at.isoformat(),
         }
 
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_group_id", "group_id"),
+        Index("ix_users_role_surname_id", "role", "surname", "id"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name: Mapped[str] = mapped_column()
@@ -122,11 +145,11 @@ class User(Base):
     password_hash: Mapped[bytes] = mapped_column()
     created_at: Mapped[datetime.datetime] = mapped_column(default=func.now())
 
-    group: Mapped["Group"] = relationship(back_populates="users", uselist=False)
+    group: Mapped["Group"] = relationship(back_populates="users", uselist=False, lazy="raise")
     transactions: Mapped[List["Transaction"]] = relationship(back_populates="user", uselist=True,
-                                                             lazy="selectin", cascade="all, delete-orphan")
+                                                             lazy="raise", cascade="all, delete-orphan")
     operations: Mapped[List["Operation"]] = relationship(back_populates="initiator", uselist=True,
-                                                         lazy="selectin", cascade="all, delete-orphan")
+                                                         lazy="raise", cascade="all, delete-orphan")
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -141,3 +164,38 @@ class User(Base):
             "created_at": self.created_at.isoformat(),
             "transactions": [transaction.to_dict() for transaction in self.transactions],
         }
+
+
+class PaymentStats(Base):
+    __tablename__ = "payment_stats"
+    __table_args__ = (
+        Index("ix_payment_stats_group_id", "group_id"),
+    )
+
+    semester_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("semesters.id", ondelete="CASCADE"), primary_key=True)
+    group_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    total_amount: Mapped[float] = mapped_column(default=0)
+    payments_count: Mapped[int] = mapped_column(default=0)
+
+
+class IdempotencyKey(Base):
+    """Idempotency-Key sent with a payment and the response it got; the key is unique per user."""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        Index("ix_idempotency_keys_created_at", "created_at"),
+    )
+
+    user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    key: Mapped[str] = mapped_column(primary_key=True)
+    # the request the key was first used with, a retry has to send the same one
+    fingerprint: Mapped[str] = mapped_column()
+    response: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSON, nullable=True)
+    created_at: Mapped[datetime.datetime] = mapped_column(default=func.now())
+
+
+class EntityVersion(Base):
+    """Change counter of an entity type, shared by every worker (see utils.versions)."""
+    __tablename__ = "entity_versions"
+
+    entity: Mapped[str] = mapped_column(primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, default=0)
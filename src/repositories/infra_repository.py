@@ -1,101 +1,168 @@
 import uuid
 
-from typing import List
-from sqlalchemy import insert, select, delete, update
+from typing import List, Optional, Sequence, Tuple
+from sqlalchemy import Row, select, delete, update, func, null, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
-from src.database import async_session
-from src.models import Group, Semester
+from src.models import Group, Semester, User, Transaction, Roles
+from utils.versions import entity_versions, GROUPS, SEMESTERS, TRANSACTIONS
 
 
 class InfraRepository:
-    async def get_group_by_name(self, group_name: str) -> Group:
-        async with async_session() as session:
-            query = select(Group).where(Group.name == group_name)
-            result = await session.execute(query)
-            group = result.scalars().first()
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get_group_by_id(self, group_id: uuid.UUID, with_users: bool = False) -> Group:
+        query = select(Group).where(Group.id == group_id)
+        if with_users:
+            query = query.options(
+                selectinload(Group.users).selectinload(User.transactions)
+            ).execution_options(populate_existing=True)
+        result = await self.session.execute(query)
+        group = result.scalars().first()
 
         return group
 
-    async def get_group_by_id(self, group_id: uuid.UUID) -> Group:
-        async with async_session() as session:
-            query = select(Group).where(Group.id == group_id)
-            result = await session.execute(query)
-            group = result.scalars().first()
-
-        return group
-
-    async def get_semester_by_name(self, semester_name: str) -> Semester:
-        async with async_session() as session:
-            query = select(Semester).where(Semester.name == semester_name)
-            result = await session.execute(query)
-            semester = result.scalars().first()
-
-        return semester
-
-    async def get_all_groups(self) -> List[Group]:
-        async with async_session() as session:
-            query = select(Group)
-            result = await session.execute(query)
-            groups = result.scalars().all()
+    async def get_all_groups(self, with_users: bool = True) -> List[Group]:
+        query = select(Group)
+        if with_users:
+            query = query.options(selectinload(Group.users).selectinload(User.transactions))
+        result = await self.session.execute(query)
+        groups = result.scalars().all()
 
         return groups
 
     async def get_all_semesters(self) -> List[Semester]:
-        async with async_session() as session:
-            query = select(Semester)
-            result = await session.execute(query)
-            semesters = result.scalars().all()
+        query = select(Semester)
+        result = await self.session.execute(query)
+        semesters = result.scalars().all()
 
         return semesters
 
+    async def get_groups_summary(self, semester_id: Optional[uuid.UUID] = None) -> Sequence[Row]:
+        """Every group with its students count and, for the semester, how many of them paid."""
+        query = (
+            select(Group.id, Group.name, func.count(User.id).label("students_count"))
+            .outerjoin(User, (User.group_id == Group.id) & (User.role == Roles.student))
+            .group_by(Group.id, Group.name)
+            .order_by(Group.name)
+        )
+        if semester_id is None:
+            query = query.add_columns(null().label("paid_count"))
+        else:
+            paid = (
+                select(Transaction.user_id)
+                .where(Transaction.semester_id == semester_id)
+                .distinct()
+                .subquery()
+            )
+            query = query.outerjoin(paid, paid.c.user_id == User.id).add_columns(
+                func.count(paid.c.user_id).label("paid_count")
+            )
+        result = await self.session.execute(query)
+
+        return result.all()
+
+    async def get_group_members(
+            self,
+            group_id: uuid.UUID,
+            limit: int,
+            semester_id: Optional[uuid.UUID] = None,
+            after: Optional[Tuple[str, uuid.UUID]] = None
+    ) -> Sequence[Row]:
+        """Page of the group's users ordered by (surname, id), with the amount each paid for the semester."""
+        query = (
+            select(
+                User.id, User.surname, User.name, User.patronymic, User.role, User.phone, User.login
+            )
+            .where(User.group_id == group_id)
+            .order_by(User.surname, User.id)
+            .limit(limit)
+        )
+        if semester_id is None:
+            query = query.add_columns(null().label("paid_amount"))
+        else:
+            # correlated, so only the members on the page are summed, through the (user_id, semester_id) index
+            paid_amount = (
+                select(func.coalesce(func.sum(Transaction.amount), 0))
+                .where(Transaction.user_id == User.id, Transaction.semester_id == semester_id)
+                .scalar_subquery()
+            )
+            query = query.add_columns(paid_amount.label("paid_amount"))
+        if after is not None:
+            query = query.where(tuple_(User.surname, User.id) > tuple_(*after))
+        result = await self.session.execute(query)
+
+        return result.all()
+
     async def get_semester_by_id(self, semester_id: uuid.UUID) -> Semester:
-        async with async_session() as session:
-            query = select(Semester).where(Semester.id == semester_id)
-            result = await session.execute(query)
-            semester = result.scalars().first()
+        query = select(Semester).where(Semester.id == semester_id)
+        result = await self.session.execute(query)
+        semester = result.scalars().first()
 
         return semester
 
-    async def create_group(self, group_name: str) -> Group:
-        async with async_session() as session:
-            stmt = insert(Group).values(name=group_name)
-            await session.execute(stmt)
-            await session.commit()
+    async def create_group(self, group_name: str) -> Optional[Group]:
+        """Insert the group and return it, or None if the name is already taken."""
+        stmt = (
+            pg_insert(Group)
+            .values(id=uuid.uuid4(), name=group_name)
+            .on_conflict_do_nothing(index_elements=[Group.name])
+            .returning(Group)
+        )
+        result = await self.session.execute(stmt)
+        group = result.scalars().first()
+        if group is not None:
+            set_committed_value(group, "users", [])
+            entity_versions.touch(self.session, GROUPS)
 
-        return await self.get_group_by_name(group_name)
+        return group
 
-    async def create_semester(self, semester_name: str) -> Semester:
-        async with async_session() as session:
-            stmt = insert(Semester).values(name=semester_name)
-            await session.execute(stmt)
-            await session.commit()
+    async def create_semester(self, semester_name: str) -> Optional[Semester]:
+        """Insert the semester and return it, or None if the name is already taken."""
+        stmt = (
+            pg_insert(Semester)
+            .values(id=uuid.uuid4(), name=semester_name)
+            .on_conflict_do_nothing(index_elements=[Semester.name])
+            .returning(Semester)
+        )
+        result = await self.session.execute(stmt)
+        semester = result.scalars().first()
+        if semester is not None:
+            entity_versions.touch(self.session, SEMESTERS)
 
-        return await self.get_semester_by_name(semester_name)
+        return semester
 
     async def edit_group(self, group_id: uuid.UUID, new_group_name: str) -> Group:
-        async with async_session() as session:
-            stmt = update(Group).where(Group.id == group_id).values(name=new_group_name)
-            await session.execute(stmt)
-            await session.commit()
-
-        return await self.get_group_by_id(group_id)
+        stmt = (
+            update(Group)
+            .where(Group.id == group_id)
+            .values(name=new_group_name)
+            .returning(Group)
+            .options(selectinload(Group.users).selectinload(User.transactions))
+        )
+        result = await self.session.execute(stmt)
+        entity_versions.touch(self.session, GROUPS)
+
+        return result.scalars().first()
 
     async def edit_semester(self, semester_id: uuid.UUID, new_semester_name: str) -> Semester:
-        async with async_session() as session:
-            stmt = update(Semester).where(Semester.id == semester_id).values(name=new_semester_name)
-            await session.execute(stmt)
-            await session.commit()
+        stmt = update(Semester).where(Semester.id == semester_id).values(name=new_semester_name).returning(Semester)
+        result = await self.session.execute(stmt)
+        entity_versions.touch(self.session, SEMESTERS)
 
-        return await self.get_semester_by_id(semester_id)
+        return result.scalars().first()
 
     async def delete_group(self, group_id: uuid.UUID) -> None:
-        async with async_session() as session:
-            stmt = delete(Group).where(Group.id == group_id)
-            await session.execute(stmt)
-            await session.commit()
+        stmt = delete(Group).where(Group.id == group_id)
+        await self.session.execute(stmt)
+        entity_versions.touch(self.session, GROUPS)
 
     async def delete_semester(self, semester_id: uuid.UUID) -> None:
-        async with async_session() as session:
-            stmt = delete(Semester).where(Semester.id == semester_id)
-            await session.execute(stmt)
-            await session.commit()
+        stmt = delete(Semester).where(Semester.id == semester_id)
+        await self.session.execute(stmt)
+        # transactions of the semester are deleted by cascade
+        entity_versions.touch(self.session, SEMESTERS, TRANSACTIONS)
@@ -1,41 +1,165 @@
+import datetime
 import uuid
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 
-from sqlalchemy import insert, select, update
+from sqlalchemy import Row, column, delete, insert, select, table, text, update, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncResult, AsyncSession
+from sqlalchemy.orm import joinedload, load_only, raiseload
 
-from src.database import async_session
 from config_data import constants
 
-from src.models import User, Group, Transaction, Operation, OperationTypes
+from src.models import User, Group, Semester, Transaction, Operation, OperationTypes, IdempotencyKey
 from src.schemas import TransactionCreate
-from src.repositories.infra_repository import InfraRepository
+from utils.audit_log import audit_log
+from utils.versions import entity_versions, USERS, TRANSACTIONS, OPERATIONS
 
 
 class OperationsRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
     async def get_transaction_by_id(self, transaction_id: uuid.UUID) -> Transaction:
-        async with async_session() as session:
-            query = select(Transaction).where(Transaction.id == transaction_id)
-            result = await session.execute(query)
-            transaction = result.scalars().first()
+        query = select(Transaction).where(Transaction.id == transaction_id)
+        result = await self.session.execute(query)
+        transaction = result.scalars().first()
 
         return transaction
 
     async def get_operation_by_id(self, operation_id: uuid.UUID) -> Operation:
-        async with async_session() as session:
-            query = select(Operation).where(Operation.id == operation_id)
-            result = await session.execute(query)
-            operation = result.scalars().first()
+        query = select(Operation).where(Operation.id == operation_id)
+        result = await self.session.execute(query)
+        operation = result.scalars().first()
 
         return operation
 
-    async def get_all_operations(self) -> List[Operation]:
-        async with async_session() as session:
-            query = select(Operation)
-            result = await session.execute(query)
-            operations = result.scalars().all()
+    async def get_all_operations(
+            self,
+            limit: int,
+            after: Optional[Tuple[datetime.datetime, uuid.UUID]] = None,
+            date_from: Optional[datetime.datetime] = None,
+            date_to: Optional[datetime.datetime] = None
+    ) -> List[Operation]:
+        query = (
+            select(Operation)
+            .options(
+                joinedload(Operation.initiator).options(
+                    load_only(User.id, User.name, User.surname, User.patronymic, User.role),
+                    raiseload("*")
+                )
+            )
+            .order_by(Operation.created_at.desc(), Operation.id.desc())
+            .limit(limit)
+        )
+        if after is not None:
+            # the plain bound on created_at is what lets Postgres skip the newer partitions
+            query = query.where(
+                tuple_(Operation.created_at, Operation.id) < tuple_(*after), Operation.created_at <= after[0]
+            )
+        if date_from is not None:
+            query = query.where(Operation.created_at >= date_from)
+        if date_to is not None:
+            query = query.where(Operation.created_at < date_to)
+        result = await self.session.execute(query)
+        operations = result.scalars().all()
 
         return operations
 
+    async def stream_transactions(
+            self,
+            semester_id: Optional[uuid.UUID] = None,
+            group_id: Optional[uuid.UUID] = None,
+            batch_size: int = constants.EXPORT_BATCH_SIZE
+    ) -> AsyncResult:
+        """Transactions with their student, group and semester names, fetched batch_size rows at a time."""
+        query = (
+            select(
+                Transaction.id, Transaction.created_at, Semester.name, Transaction.amount,
+                User.surname, User.name, User.patronymic, User.login, Group.name, Transaction.comment
+            )
+            .join(User, User.id == Transaction.user_id)
+            .join(Semester, Semester.id == Transaction.semester_id)
+            .outerjoin(Group, Group.id == User.group_id)
+            .order_by(Transaction.created_at, Transaction.id)
+            .execution_options(yield_per=batch_size)
+        )
+        if semester_id is not None:
+            query = query.where(Transaction.semester_id == semester_id)
+        if group_id is not None:
+            query = query.where(User.group_id == group_id)
+
+        return await self.session.stream(query)
+
+    async def stream_operations(
+            self,
+            date_from: Optional[datetime.datetime] = None,
+            date_to: Optional[datetime.datetime] = None,
+            batch_size: int = constants.EXPORT_BATCH_SIZE
+    ) -> AsyncResult:
+        """Operations created in [date_from, date_to) with their initiator, fetched batch_size rows at a time."""
+        query = (
+            select(
+                Operation.id, Operation.created_at, Operation.type,
+                User.surname, User.name, User.patronymic, User.login, Operation.comment
+            )
+            .join(User, User.id == Operation.user_id)
+            .order_by(Operation.created_at, Operation.id)
+            .execution_options(yield_per=batch_size)
+        )
+        if date_from is not None:
+            query = query.where(Operation.created_at >= date_from)
+        if date_to is not None:
+            query = query.where(Operation.created_at < date_to)
+
+        return await self.session.stream(query)
+
+    async def get_operations_partitions(self) -> List[Row]:
+        """Monthly operations tables, attached or detached, with their state."""
+        query = text(
+            "SELECT c.relname AS name, c.relispartition AS attached, "
+            "coalesce(i.inhdetachpending, false) AS detach_pending "
+            "FROM pg_class c LEFT JOIN pg_inherits i ON i.inhrelid = c.oid "
+            "WHERE c.relkind = 'r' AND c.relnamespace = to_regnamespace(current_schema()) "
+            "AND c.relname ~ :pattern ORDER BY c.relname"
+        )
+        result = await self.session.execute(query, {"pattern": constants.OPERATIONS_PARTITION_PATTERN})
+        return result.all()
+
+    # partition names and bounds below are built by PartitionService, never taken from a request
+
+    async def create_operations_partition(self, name: str, start: datetime.date, end: datetime.date) -> None:
+        await self.session.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF operations "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        ))
+
+    async def detach_operations_partition(self, name: str, finalize: bool = False) -> None:
+        """Needs a session in autocommit mode: DETACH ... CONCURRENTLY runs in two transactions of its own."""
+        await self.session.execute(text(
+            f"ALTER TABLE operations DETACH PARTITION {name} {'FINALIZE' if finalize else 'CONCURRENTLY'}"
+        ))
+        # the month is gone from operations as soon as the detach commits
+        await entity_versions.notify(self.session, OPERATIONS)
+
+    async def stream_operations_partition(
+            self, name: str, batch_size: int = constants.EXPORT_BATCH_SIZE
+    ) -> AsyncResult:
+        partition = table(name, *map(column, constants.OPERATIONS_ARCHIVE_HEADER))
+        query = (
+            select(partition)
+            .order_by(partition.c.created_at, partition.c.id)
+            .execution_options(yield_per=batch_size)
+        )
+        return await self.session.stream(query)
+
+    async def drop_operations_partition(self, name: str) -> None:
+        await self.session.execute(text(f"DROP TABLE {name}"))
+        await entity_versions.notify(self.session, OPERATIONS)
+
+    async def analyze_operations(self) -> None:
+        # autovacuum analyzes every partition but never the partitioned table itself
+        await self.session.execute(text("ANALYZE operations"))
+
     async def create_transaction(self, user_id: uuid.UUID, new_transaction: TransactionCreate, semester_name: str):
         transaction_dc = new_transaction.dict()
         transaction_dc["id"] = uuid.uuid4()
@@ -44,32 +168,102 @@ class OperationsRepository:
             semester_name=semester_name, amount=new_transaction.amount
         )
 
-        async with async_session() as session:
-            stmt = insert(Transaction).values(**transaction_dc)
-            await session.execute(stmt)
-            await session.commit()
+        stmt = insert(Transaction).values(**transaction_dc).returning(Transaction)
+        result = await self.session.execute(stmt)
+        entity_versions.touch(self.session, TRANSACTIONS)
+
+        return result.scalars().one()
+
+    async def create_transactions(self, new_transactions: List[Dict]) -> Dict[str, uuid.UUID]:
+        """Insert prepared rows in one executemany, skipping bank references that are already recorded;
+        returns bank_reference -> id of the inserted rows."""
+        if not new_transactions:
+            return {}
+
+        stmt = (
+            pg_insert(Transaction)
+            .on_conflict_do_nothing(index_elements=[Transaction.bank_reference])
+            .returning(Transaction.bank_reference, Transaction.id)
+        )
+        result = await self.session.execute(stmt, new_transactions)
+        created_transactions = {bank_reference: transaction_id for bank_reference, transaction_id in result.all()}
+        entity_versions.touch(self.session, TRANSACTIONS)
 
-        return await self.get_transaction_by_id(transaction_dc["id"])
+        return created_transactions
 
-    async def create_operation(self, operation_type: OperationTypes, user_id: uuid.UUID, comment: str) -> Operation:
-        operation_id = uuid.uuid4()
-        async with async_session() as session:
-            stmt = insert(Operation).values(id=operation_id, type=operation_type, user_id=user_id, comment=comment)
-            await session.execute(stmt)
-            await session.commit()
+    async def create_operation(self, operation_type: OperationTypes, user_id: uuid.UUID, comment: str) -> None:
+        operation = {"id": uuid.uuid4(), "type": operation_type, "user_id": user_id, "comment": comment}
+        if audit_log.defers():
+            audit_log.defer(self.session, operation)
+        else:
+            await self.session.execute(insert(Operation).values(**operation))
+            entity_versions.touch(self.session, OPERATIONS)
 
-        return await self.get_operation_by_id(operation_id)
+    async def create_operations(self, operation_type: OperationTypes, user_id: uuid.UUID, comments: List[str]) -> None:
+        operations = [
+            {"id": uuid.uuid4(), "type": operation_type, "user_id": user_id, "comment": comment} for comment in comments
+        ]
+        if not operations:
+            return
+        if audit_log.defers():
+            for operation in operations:
+                audit_log.defer(self.session, operation)
+        else:
+            await self.session.execute(insert(Operation), operations)
+            entity_versions.touch(self.session, OPERATIONS)
 
     async def add_user_to_group(self, user_id: uuid.UUID, group_id: uuid.UUID) -> Group:
-        async with async_session() as session:
-            stmt = update(User).where(User.id == user_id).values(group_id=group_id)
-            await session.execute(stmt)
-            await session.commit()
+        stmt = update(User).where(User.id == user_id).values(group_id=group_id)
+        await self.session.execute(stmt)
+        entity_versions.touch(self.session, USERS)
+
+        # the group row comes with its users in one query, their transactions in a second
+        query = (
+            select(Group)
+            .where(Group.id == group_id)
+            .options(joinedload(Group.users).selectinload(User.transactions))
+            .execution_options(populate_existing=True)
+        )
+        result = await self.session.execute(query)
 
-        return await InfraRepository().get_group_by_id(group_id)
+        return result.unique().scalars().first()
 
     async def remove_user_from_group(self, user_id: uuid.UUID) -> None:
-        async with async_session() as session:
-            stmt = update(User).where(User.id == user_id).values(group_id=None)
-            await session.execute(stmt)
-            await session.commit()
+        stmt = update(User).where(User.id == user_id).values(group_id=None)
+        await self.session.execute(stmt)
+        entity_versions.touch(self.session, USERS)
+
+    async def claim_idempotency_key(self, user_id: uuid.UUID, key: str, fingerprint: str) -> Optional[IdempotencyKey]:
+        """Insert the key and return None, or return the stored key if it was used before.
+
+        While the transaction that claimed a key is open, a concurrent claim of the same key waits for it:
+        it gets the stored key after a commit and claims the key itself after a rollback.
+        """
+        stmt = (
+            pg_insert(IdempotencyKey)
+            .values(user_id=user_id, key=key, fingerprint=fingerprint)
+            .on_conflict_do_nothing(index_elements=[IdempotencyKey.user_id, IdempotencyKey.key])
+            .returning(IdempotencyKey.key)
+        )
+        result = await self.session.execute(stmt)
+        if result.scalar_one_or_none() is not None:
+            return None
+
+        query = select(IdempotencyKey).where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+        result = await self.session.execute(query)
+
+        return result.scalars().one()
+
+    async def save_idempotent_response(self, user_id: uuid.UUID, key: str, response: Dict[str, Any]) -> None:
+        stmt = (
+            update(IdempotencyKey)
+            .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+            .values(response=response)
+        )
+        await self.session.execute(stmt)
+
+    async def delete_idempotency_keys(self, created_before: datetime.datetime) -> int:
+        stmt = delete(IdempotencyKey).where(IdempotencyKey.created_at < created_before)
+        result = await self.session.execute(stmt)
+
+        return result.rowcount
@@ -0,0 +1,212 @@
+import uuid
+
+from typing import Dict, Optional, Sequence, Tuple
+from sqlalchemy import Row, Select, select, delete, func, literal, text, tuple_, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models import PaymentStats, Transaction, User, Group, Semester, Roles, NO_GROUP_ID
+
+STATS_COLUMNS = [
+    PaymentStats.semester_id, PaymentStats.group_id, PaymentStats.total_amount, PaymentStats.payments_count
+]
+
+
+class StatsRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    @staticmethod
+    def _accumulate(stmt):
+        return stmt.on_conflict_do_update(
+            index_elements=[PaymentStats.semester_id, PaymentStats.group_id],
+            set_={
+                "total_amount": PaymentStats.total_amount + stmt.excluded.total_amount,
+                "payments_count": PaymentStats.payments_count + stmt.excluded.payments_count,
+            }
+        )
+
+    @staticmethod
+    def _aggregates():
+        total_amount = func.sum(PaymentStats.total_amount)
+        payments_count = func.sum(PaymentStats.payments_count)
+        return (
+            total_amount.label("total_amount"),
+            payments_count.label("payments_count"),
+            (total_amount / payments_count).label("average_amount"),
+        )
+
+    async def add_payment(self, semester_id: uuid.UUID, group_id: Optional[uuid.UUID], amount: float) -> None:
+        stmt = pg_insert(PaymentStats).values(
+            semester_id=semester_id, group_id=group_id or NO_GROUP_ID, total_amount=amount, payments_count=1
+        )
+        await self.session.execute(self._accumulate(stmt))
+
+    async def add_payments(self, totals: Dict[Tuple[uuid.UUID, Optional[uuid.UUID]], Tuple[float, int]]) -> None:
+        """Add (amount, count) totals keyed by (semester_id, group_id) in one statement."""
+        if not totals:
+            return
+
+        stmt = pg_insert(PaymentStats).values([
+            {
+                "semester_id": semester_id, "group_id": group_id or NO_GROUP_ID,
+                "total_amount": total_amount, "payments_count": payments_count
+            }
+            for (semester_id, group_id), (total_amount, payments_count) in totals.items()
+        ])
+        await self.session.execute(self._accumulate(stmt))
+
+    @staticmethod
+    def _user_totals(user_id: uuid.UUID, group_id: Optional[uuid.UUID], sign: int) -> Select:
+        return (
+            select(
+                Transaction.semester_id,
+                literal(group_id or NO_GROUP_ID, PaymentStats.group_id.type),
+                sign * func.sum(Transaction.amount),
+                sign * func.count(),
+            )
+            .where(Transaction.user_id == user_id)
+            .group_by(Transaction.semester_id)
+        )
+
+    async def _add_user_payments(self, user_id: uuid.UUID, group_id: Optional[uuid.UUID], sign: int) -> None:
+        stmt = pg_insert(PaymentStats).from_select(STATS_COLUMNS, self._user_totals(user_id, group_id, sign))
+        await self.session.execute(self._accumulate(stmt))
+
+    async def move_user_payments(
+            self, user_id: uuid.UUID, from_group_id: Optional[uuid.UUID], to_group_id: Optional[uuid.UUID]
+    ) -> None:
+        if from_group_id == to_group_id:
+            return
+        # one statement for both buckets: the groups differ, so no row is updated twice
+        moves = union_all(
+            self._user_totals(user_id, from_group_id, -1),
+            self._user_totals(user_id, to_group_id, 1),
+        )
+        stmt = pg_insert(PaymentStats).from_select(STATS_COLUMNS, moves)
+        await self.session.execute(self._accumulate(stmt))
+
+    async def remove_user_payments(self, user_id: uuid.UUID, group_id: Optional[uuid.UUID]) -> None:
+        await self._add_user_payments(user_id, group_id, -1)
+
+    async def release_group(self, group_id: uuid.UUID) -> None:
+        """Move the buckets of a deleted group to the students-without-group bucket."""
+        group_totals = select(
+            PaymentStats.semester_id,
+            literal(NO_GROUP_ID, PaymentStats.group_id.type),
+            PaymentStats.total_amount,
+            PaymentStats.payments_count,
+        ).where(PaymentStats.group_id == group_id)
+        stmt = pg_insert(PaymentStats).from_select(STATS_COLUMNS, group_totals)
+        await self.session.execute(self._accumulate(stmt))
+        await self.session.execute(delete(PaymentStats).where(PaymentStats.group_id == group_id))
+
+    async def rebuild(self) -> int:
+        """Recompute every bucket from transactions; returns the number of buckets."""
+        # concurrent payments wait for the rebuild instead of updating rows it is about to replace
+        await self.session.execute(text("LOCK TABLE payment_stats IN EXCLUSIVE MODE"))
+        await self.session.execute(delete(PaymentStats))
+
+        totals = (
+            select(
+                Transaction.semester_id,
+                func.coalesce(User.group_id, literal(NO_GROUP_ID, PaymentStats.group_id.type)),
+                func.sum(Transaction.amount),
+                func.count(),
+            )
+            .join(User, User.id == Transaction.user_id)
+            .group_by(Transaction.semester_id, User.group_id)
+        )
+        await self.session.execute(pg_insert(PaymentStats).from_select(STATS_COLUMNS, totals))
+        result = await self.session.execute(select(func.count()).select_from(PaymentStats))
+
+        return result.scalar_one()
+
+    async def get_semester_stats(self) -> Sequence[Row]:
+        query = (
+            select(Semester.id.label("semester_id"), Semester.name.label("semester_name"), *self._aggregates())
+            .select_from(PaymentStats)
+            .join(Semester, Semester.id == PaymentStats.semester_id)
+            .where(PaymentStats.payments_count > 0)
+            .group_by(Semester.id, Semester.name)
+            .order_by(Semester.name)
+        )
+        result = await self.session.execute(query)
+
+        return result.all()
+
+    async def get_group_stats(self) -> Sequence[Row]:
+        query = (
+            select(Group.id.label("group_id"), Group.name.label("group_name"), *self._aggregates())
+            .select_from(PaymentStats)
+            .outerjoin(Group, Group.id == PaymentStats.group_id)
+            .where(PaymentStats.payments_count > 0)
+            .group_by(PaymentStats.group_id, Group.id, Group.name)
+            .order_by(Group.name.nulls_last())
+        )
+        result = await self.session.execute(query)
+
+        return result.all()
+
+    async def get_group_semester_stats(
+            self, group_id: Optional[uuid.UUID] = None, semester_id: Optional[uuid.UUID] = None
+    ) -> Sequence[Row]:
+        query = (
+            select(
+                Group.id.label("group_id"), Group.name.label("group_name"),
+                Semester.id.label("semester_id"), Semester.name.label("semester_name"),
+                *self._aggregates()
+            )
+            .select_from(PaymentStats)
+            .join(Semester, Semester.id == PaymentStats.semester_id)
+            .outerjoin(Group, Group.id == PaymentStats.group_id)
+            .where(PaymentStats.payments_count > 0)
+            .group_by(PaymentStats.group_id, Group.id, Group.name, Semester.id, Semester.name)
+            .order_by(Group.name.nulls_last(), Semester.name)
+        )
+        if group_id is not None:
+            query = query.where(PaymentStats.group_id == group_id)
+        if semester_id is not None:
+            query = query.where(PaymentStats.semester_id == semester_id)
+        result = await self.session.execute(query)
+
+        return result.all()
+
+    async def get_arrears(
+            self,
+            semester_id: uuid.UUID,
+            limit: int,
+            expected_amount: Optional[float] = None,
+            group_id: Optional[uuid.UUID] = None,
+            after: Optional[Tuple[str, uuid.UUID]] = None
+    ) -> Sequence[Row]:
+        """Students who paid nothing for the semester, or less than expected_amount when it is given."""
+        paid = (
+            select(Transaction.user_id, func.sum(Transaction.amount).label("paid_amount"))
+            .where(Transaction.semester_id == semester_id)
+            .group_by(Transaction.user_id)
+            .subquery()
+        )
+        paid_amount = func.coalesce(paid.c.paid_amount, 0)
+        query = (
+            select(
+                User.id.label("user_id"), User.surname, User.name, User.patronymic,
+                User.group_id, Group.name.label("group_name"), paid_amount.label("paid_amount")
+            )
+            .outerjoin(paid, paid.c.user_id == User.id)
+            .outerjoin(Group, Group.id == User.group_id)
+            .where(User.role == Roles.student)
+            .order_by(User.surname, User.id)
+            .limit(limit)
+        )
+        if expected_amount is None:
+            query = query.where(paid.c.user_id.is_(None))
+        else:
+            query = query.where(paid_amount < expected_amount)
+        if group_id is not None:
+            query = query.where(User.group_id == group_id)
+        if after is not None:
+            query = query.where(tuple_(User.surname, User.id) > tuple_(*after))
+        result = await self.session.execute(query)
+
+        return result.all()
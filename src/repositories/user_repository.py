@@ -1,81 +1,195 @@
 import uuid
 
-from typing import Optional, List
-from sqlalchemy import insert, select, delete, update
+from typing import Optional, List, Dict, Collection, Sequence, Set, Tuple
+from sqlalchemy import Float, Integer, Row, ColumnElement, cast, func, literal_column, select, delete, update, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
-from utils import auth_settings
-from src.database import async_session
+from utils.password_hashing import password_hasher
+from utils.versions import entity_versions, USERS, TRANSACTIONS, OPERATIONS
 
-from src.models import User, Roles
-from src.schemas import UserCreate, UserEdit
+from src.models import User, Group, Roles
+from src.schemas import UserCreate, UserEdit, UserPrincipal
+
+
+def user_search_text() -> ColumnElement[str]:
+    """Lower-cased surname, name, patronymic, login and phone of a user, separated by spaces.
+
+    Has to stay the expression of the ix_users_search_trgm index (migration e4a7c9b1d263): Postgres uses
+    an expression index only for the same expression, so the separators are literals, not parameters.
+    """
+    separator = literal_column("' '")
+    return func.lower(
+        User.surname + separator + User.name + separator + User.patronymic + separator + User.login
+        + separator + User.phone
+    )
+
+
+def escape_like(value: str) -> str:
+    """Escape LIKE wildcards with "/", the escape character used with the returned pattern."""
+    return value.replace("/", "//").replace("%", "/%").replace("_", "/_")
 
 
 class UserRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
     async def get_user_by_login(self, login: str) -> Optional[User]:
-        async with async_session() as session:
-            query = select(User).where(User.login == login)
-            result = await session.execute(query)
-            user = result.scalars().first()
+        query = select(User).where(User.login == login)
+        result = await self.session.execute(query)
+        user = result.scalars().first()
         return user
 
     async def get_all_users(self) -> List[User]:
-        async with async_session() as session:
-            query = select(User)
-            result = await session.execute(query)
-            users = result.scalars().all()
+        query = select(User).options(selectinload(User.transactions))
+        result = await self.session.execute(query)
+        users = result.scalars().all()
 
-            return users
+        return users
 
-    async def get_user_by_id(self, user_id: uuid.UUID) -> Optional[User]:
-        async with async_session() as session:
-            query = select(User).where(User.id == user_id)
-            result = await session.execute(query)
-            user = result.scalars().first()
+    async def get_user_by_id(self, user_id: uuid.UUID, with_transactions: bool = False) -> Optional[User]:
+        query = select(User).where(User.id == user_id)
+        if with_transactions:
+            query = query.options(selectinload(User.transactions)).execution_options(populate_existing=True)
+        result = await self.session.execute(query)
+        user = result.scalars().first()
 
         return user
 
+    async def get_principal_by_id(self, user_id: uuid.UUID) -> Optional[UserPrincipal]:
+        query = select(User.id, User.role, User.login, User.group_id).where(User.id == user_id)
+        result = await self.session.execute(query)
+        row = result.first()
+
+        return UserPrincipal(**row._mapping) if row is not None else None
+
     async def get_all_students(self) -> List[User]:
-        async with async_session() as session:
-            query = select(User).where(User.role == Roles.student)
-            result = await session.execute(query)
-            students = result.scalars().all()
+        query = select(User).where(User.role == Roles.student).options(selectinload(User.transactions))
+        result = await self.session.execute(query)
+        students = result.scalars().all()
 
         return students
 
+    async def get_existing_logins(self, logins: Collection[str]) -> Set[str]:
+        if not logins:
+            return set()
+
+        query = select(User.login).where(User.login.in_(logins))
+        result = await self.session.execute(query)
+        existing_logins = set(result.scalars().all())
+
+        return existing_logins
+
+    async def get_students_by_logins(self, logins: Collection[str]) -> Dict[str, Row]:
+        """login -> (id, group_id, surname, name, patronymic) of the students among logins."""
+        if not logins:
+            return {}
+
+        query = (
+            select(User.login, User.id, User.group_id, User.surname, User.name, User.patronymic)
+            .where(User.login.in_(logins), User.role == Roles.student)
+        )
+        result = await self.session.execute(query)
+
+        return {row.login: row for row in result.all()}
+
+    async def search_users(
+            self,
+            text: str,
+            limit: int,
+            role: Optional[Roles] = None,
+            group_id: Optional[uuid.UUID] = None,
+            after: Optional[Tuple[float, uuid.UUID]] = None
+    ) -> Sequence[Row]:
+        """Page of users whose search text contains the lower-cased text or has a word similar to it
+        (pg_trgm word similarity), ordered by (rank, id) descending; a surname or login that starts
+        with the text ranks above every fuzzy match."""
+        search_text = user_search_text()
+        escaped = escape_like(text)
+        prefix_match = (
+            func.lower(User.surname).like(f"{escaped}%", escape="/")
+            | func.lower(User.login).like(f"{escaped}%", escape="/")
+        )
+        rank = cast(func.word_similarity(text, search_text), Float) + cast(prefix_match, Integer)
+        query = (
+            select(
+                User.id, User.surname, User.name, User.patronymic, User.role, User.phone, User.login,
+                User.group_id, Group.name.label("group_name"), rank.label("rank")
+            )
+            .outerjoin(Group, Group.id == User.group_id)
+            # both conditions are served by the trigram index
+            .where(search_text.like(f"%{escaped}%", escape="/") | search_text.bool_op("%>")(text))
+            .order_by(rank.desc(), User.id.desc())
+            .limit(limit)
+        )
+        if role is not None:
+            query = query.where(User.role == role)
+        if group_id is not None:
+            query = query.where(User.group_id == group_id)
+        if after is not None:
+            query = query.where(tuple_(rank, User.id) < tuple_(*after))
+        result = await self.session.execute(query)
+
+        return result.all()
+
     async def delete_group_for_users_by_id(self, group_id: uuid.UUID) -> None:
-        async with async_session() as session:
-            stmt = update(User).where(User.group_id == group_id).values(group_id=None)
-            await session.execute(stmt)
-            await session.commit()
+        stmt = update(User).where(User.group_id == group_id).values(group_id=None)
+        await self.session.execute(stmt)
+        entity_versions.touch(self.session, USERS)
 
-    async def create_user(self, new_user: UserCreate) -> User:
+    async def create_user(self, new_user: UserCreate) -> Optional[User]:
+        """Insert the user and return it, or None if the login is already taken."""
         password = new_user.password
         user_dc = new_user.dict(exclude={"password"})
-        user_dc["password_hash"] = auth_settings.hash_password(password)
+        user_dc["password_hash"] = await password_hasher.hash(password)
         user_dc["id"] = uuid.uuid4()
 
-        async with async_session() as session:
-            stmt = insert(User).values(**user_dc)
-            await session.execute(stmt)
-            await session.commit()
+        stmt = (
+            pg_insert(User)
+            .values(**user_dc)
+            .on_conflict_do_nothing(index_elements=[User.login])
+            .returning(User)
+        )
+        result = await self.session.execute(stmt)
+        user = result.scalars().first()
+        if user is not None:
+            set_committed_value(user, "transactions", [])
+            entity_versions.touch(self.session, USERS)
+
+        return user
 
-        return await self.get_user_by_id(user_dc["id"])
+    async def create_users(self, new_users: List[Dict]) -> Dict[str, uuid.UUID]:
+        """Insert prepared rows in one executemany, skipping logins taken meanwhile; returns login -> id."""
+        if not new_users:
+            return {}
+
+        stmt = (
+            pg_insert(User)
+            .on_conflict_do_nothing(index_elements=[User.login])
+            .returning(User.login, User.id)
+        )
+        result = await self.session.execute(stmt, new_users)
+        created_users = {login: user_id for login, user_id in result.all()}
+        entity_versions.touch(self.session, USERS)
+
+        return created_users
 
     async def edit_user(self, user_id: uuid.UUID, new_user_data: UserEdit) -> User:
-        async with async_session() as session:
-            stmt = update(User).where(User.id == user_id).values(
-                name=new_user_data.name,
-                surname=new_user_data.surname,
-                patronymic=new_user_data.patronymic,
-                phone=new_user_data.phone,
-            )
-            await session.execute(stmt)
-            await session.commit()
+        stmt = update(User).where(User.id == user_id).values(
+            name=new_user_data.name,
+            surname=new_user_data.surname,
+            patronymic=new_user_data.patronymic,
+            phone=new_user_data.phone,
+        ).returning(User).options(selectinload(User.transactions))
+        result = await self.session.execute(stmt)
+        entity_versions.touch(self.session, USERS)
 
-        return await self.get_user_by_id(user_id)
+        return result.scalars().first()
 
     async def delete_user(self, user_id: uuid.UUID) -> None:
-        async with async_session() as session:
-            stmt = delete(User).where(User.id == user_id)
-            await session.execute(stmt)
-            await session.commit()
+        stmt = delete(User).where(User.id == user_id)
+        await self.session.execute(stmt)
+        # transactions and operations of the user are deleted by cascade
+        entity_versions.touch(self.session, USERS, TRANSACTIONS, OPERATIONS)
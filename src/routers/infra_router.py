@@ -1,100 +1,171 @@
 import uuid
 
-from typing import Annotated, Optional, List
-from fastapi import APIRouter, Depends, Query
-
-from src.models import User, Roles
-from src.schemas import GroupResponse, SuccessfulResponse, SemesterResponse
-from src.services.user_service import UserService
+from typing import Annotated, Optional, List, Dict
+from fastapi import APIRouter, Depends, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models import Roles
+from src.schemas import GroupResponse, SuccessfulResponse, SemesterResponse, UserPrincipal, GroupSummaryResponse, \
+    GroupMembersPageResponse
+from src.database import get_session
+from src.services.user_service import UserService, get_current_user
 from src.services.infra_service import InfraService
 
+from config_data import constants
+from utils import metrics
+from utils.serialization import serialize
+from utils.versions import entity_versions, USERS, GROUPS, SEMESTERS, TRANSACTIONS
+
 router = APIRouter(tags=["infra"], prefix="/infra")
 
 
 @router.get("/semesters", response_model=List[SemesterResponse])
-async def get_semesters_list() -> List[SemesterResponse]:
-    semesters = await InfraService().get_all_semesters()
-    return list(map(lambda x: SemesterResponse(**x.to_dict()), semesters))
+async def get_semesters_list(
+        request: Request,
+        session: Annotated[AsyncSession, Depends(get_session)]
+) -> Response:
+    etag = await entity_versions.etag(session, SEMESTERS)
+    if (not_modified := entity_versions.not_modified(request, etag)) is not None:
+        return not_modified
+
+    semesters = await InfraService(session).get_all_semesters()
+    return serialize(List[SemesterResponse], semesters, etag)
 
 
 @router.get("/groups", response_model=List[GroupResponse])
 async def get_groups(
-        current_user: Annotated[User, Depends(UserService().get_current_user)],
+        request: Request,
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)],
         group_id: Optional[uuid.UUID] = Query(None, description="group id for get only one group"),
-) -> List[GroupResponse]:
-    UserService().validate_role(current_user.role, (Roles.admin, Roles.accountant))
+) -> Response:
+    UserService.validate_role(current_user.role, (Roles.admin, Roles.accountant))
+    etag = await entity_versions.etag(session, GROUPS, USERS, TRANSACTIONS)
+    if (not_modified := entity_versions.not_modified(request, etag)) is not None:
+        return not_modified
 
     if group_id is None:
-        groups = await InfraService().get_all_groups()
+        groups = await InfraService(session).get_all_groups()
     else:
-        groups = [await InfraService().get_group_by_id(group_id)]
+        groups = [await InfraService(session).get_group_by_id(group_id, with_users=True)]
+
+    return serialize(List[GroupResponse], groups, etag)
 
-    return list(map(lambda x: GroupResponse(**x.to_dict()), groups))
+
+@router.get("/groups_summary", response_model=List[GroupSummaryResponse])
+async def get_groups_summary(
+        request: Request,
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)],
+        semester_id: Optional[uuid.UUID] = Query(None, description="semester id for paid and unpaid counts"),
+) -> Response:
+    UserService.validate_role(current_user.role, (Roles.admin, Roles.accountant))
+    etag = await entity_versions.etag(session, GROUPS, SEMESTERS, USERS, TRANSACTIONS)
+    if (not_modified := entity_versions.not_modified(request, etag)) is not None:
+        return not_modified
+
+    summary = await InfraService(session).get_groups_summary(semester_id)
+    return serialize(List[GroupSummaryResponse], summary, etag)
+
+
+@router.get("/group_members/{group_id}", response_model=GroupMembersPageResponse)
+async def get_group_members(
+        request: Request,
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)],
+        group_id: uuid.UUID,
+        semester_id: Optional[uuid.UUID] = Query(None, description="semester id for the amount each member paid"),
+        limit: int = Query(constants.DEFAULT_PAGE_LIMIT, ge=1, le=constants.MAX_PAGE_LIMIT,
+                           description="max members count on page"),
+        after: Optional[str] = Query(None, description="next_cursor from the previous page"),
+) -> Response:
+    UserService.validate_role(current_user.role, (Roles.admin, Roles.accountant))
+    etag = await entity_versions.etag(session, GROUPS, SEMESTERS, USERS, TRANSACTIONS)
+    if (not_modified := entity_versions.not_modified(request, etag)) is not None:
+        return not_modified
+
+    members, next_cursor = await InfraService(session).get_group_members_page(group_id, limit, semester_id, after)
+    return serialize(GroupMembersPageResponse, {"items": members, "next_cursor": next_cursor}, etag)
 
 
 @router.post("/new_group", response_model=GroupResponse)
 async def create_new_group(
         group_name: str,
-        current_user: Annotated[User, Depends(UserService().get_current_user)]
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)]
 ) -> GroupResponse:
-    UserService().validate_role(current_user.role, (Roles.admin,))
+    UserService.validate_role(current_user.role, (Roles.admin,))
 
-    new_group = await InfraService().create_group(group_name, current_user.id)
-    return GroupResponse(**new_group.to_dict())
+    new_group = await InfraService(session).create_group(group_name, current_user.id)
+    return GroupResponse.model_validate(new_group)
 
 
 @router.post("/new_semester", response_model=SemesterResponse)
 async def create_new_semester(
         semester_name: str,
-        current_user: Annotated[User, Depends(UserService().get_current_user)]
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)]
 ) -> SemesterResponse:
-    UserService().validate_role(current_user.role, (Roles.admin,))
+    UserService.validate_role(current_user.role, (Roles.admin,))
 
-    new_semester = await InfraService().create_semester(semester_name, current_user.id)
-    return SemesterResponse(**new_semester.to_dict())
+    new_semester = await InfraService(session).create_semester(semester_name, current_user.id)
+    return SemesterResponse.model_validate(new_semester)
 
 
 @router.put("/edit_group/{group_id}", response_model=GroupResponse)
 async def edit_group(
-        current_user: Annotated[User, Depends(UserService().get_current_user)],
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)],
         group_id: uuid.UUID,
         new_group_name: str
 ) -> GroupResponse:
-    UserService().validate_role(current_user.role, (Roles.admin,))
+    UserService.validate_role(current_user.role, (Roles.admin,))
 
-    group = await InfraService().edit_group(group_id, new_group_name, current_user.id)
-    return GroupResponse(**group.to_dict())
+    group = await InfraService(session).edit_group(group_id, new_group_name, current_user.id)
+    return GroupResponse.model_validate(group)
 
 
 @router.put("/edit_semester/{semester_id}", response_model=SemesterResponse)
 async def edit_semester(
-        current_user: Annotated[User, Depends(UserService().get_current_user)],
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)],
         semester_id: uuid.UUID,
         new_semester_name: str
 ) -> SemesterResponse:
-    UserService().validate_role(current_user.role, (Roles.admin,))
+    UserService.validate_role(current_user.role, (Roles.admin,))
 
-    semester = await InfraService().edit_semester(semester_id, new_semester_name, current_user.id)
-    return SemesterResponse(**semester.to_dict())
+    semester = await InfraService(session).edit_semester(semester_id, new_semester_name, current_user.id)
+    return SemesterResponse.model_validate(semester)
 
 
 @router.delete("/delete_group/{group_id}", response_model=SuccessfulResponse)
 async def delete_group(
-        current_user: Annotated[User, Depends(UserService().get_current_user)],
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)],
         group_id: uuid.UUID,
 ) -> SuccessfulResponse:
-    UserService().validate_role(current_user.role, (Roles.admin,))
+    UserService.validate_role(current_user.role, (Roles.admin,))
 
-    await InfraService().delete_group(group_id, current_user.id)
+    await InfraService(session).delete_group(group_id, current_user.id)
     return SuccessfulResponse(success="Group has been successful delete!")
 
 
 @router.delete("/delete_semester/{semester_id}", response_model=SuccessfulResponse)
 async def delete_semester(
-        current_user: Annotated[User, Depends(UserService().get_current_user)],
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)],
         semester_id: uuid.UUID,
 ) -> SuccessfulResponse:
-    UserService().validate_role(current_user.role, (Roles.admin,))
+    UserService.validate_role(current_user.role, (Roles.admin,))
 
-    await InfraService().delete_semester(semester_id, current_user.id)
+    await InfraService(session).delete_semester(semester_id, current_user.id)
     return SuccessfulResponse(success="Semester has been successful delete!")
+
+
+@router.get("/metrics", response_model=Dict[str, Dict[str, float]])
+async def get_metrics(
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+) -> Dict[str, Dict[str, float]]:
+    UserService.validate_role(current_user.role, (Roles.admin,))
+
+    return metrics.collect()
@@ -1,55 +1,130 @@
+import datetime
 import uuid
 
-from typing import Annotated, List
-from fastapi import APIRouter, Depends
+from typing import Annotated, Optional
+from fastapi import APIRouter, Depends, Header, Query, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.models import User, Roles
-from src.schemas import GroupResponse, TransactionResponse, TransactionCreate, SuccessfulResponse, OperationResponse
-from src.services.user_service import UserService
+from src.models import Roles
+from src.schemas import GroupResponse, TransactionResponse, TransactionCreate, SuccessfulResponse, \
+    OperationsPageResponse, UserPrincipal, PaymentImportResponse
+from src.database import get_session
+from src.services.user_service import UserService, get_current_user
 from src.services.operation_service import OperationService
+from src.services.export_service import ExportService
+
+from config_data import constants
+from utils.export_writer import ExportFormats, MEDIA_TYPES, content_disposition
+from utils.serialization import serialize
+from utils.versions import entity_versions, USERS, OPERATIONS
 
 router = APIRouter(tags=["operations"], prefix="/operations")
 
 
-@router.get("/show_list", response_model=List[OperationResponse])
+@router.get("/show_list", response_model=OperationsPageResponse)
 async def get_operations_list(
-        current_user: Annotated[User, Depends(UserService().get_current_user)]
-) -> List[OperationResponse]:
-    UserService().validate_role(current_user.role, (Roles.admin,))
+        request: Request,
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)],
+        limit: int = Query(constants.DEFAULT_PAGE_LIMIT, ge=1, le=constants.MAX_PAGE_LIMIT,
+                           description="max operations count on page"),
+        after: Optional[str] = Query(None, description="next_cursor from the previous page"),
+        date_from: Optional[datetime.datetime] = Query(None, description="operations created at or after this time"),
+        date_to: Optional[datetime.datetime] = Query(None, description="operations created before this time"),
+) -> Response:
+    UserService.validate_role(current_user.role, (Roles.admin,))
+    etag = await entity_versions.etag(session, OPERATIONS, USERS)
+    if (not_modified := entity_versions.not_modified(request, etag)) is not None:
+        return not_modified
+
+    operations, next_cursor = await OperationService(session).get_operations_page(limit, after, date_from, date_to)
+    return serialize(OperationsPageResponse, {"items": operations, "next_cursor": next_cursor}, etag)
+
+
+@router.get("/export_transactions", response_class=StreamingResponse)
+async def export_transactions(
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)],
+        export_format: ExportFormats = Query(ExportFormats.csv, alias="format"),
+        semester_id: Optional[uuid.UUID] = Query(None, description="semester id for payments of only one semester"),
+        group_id: Optional[uuid.UUID] = Query(None, description="group id for payments of only one group"),
+) -> StreamingResponse:
+    UserService.validate_role(current_user.role, (Roles.admin, Roles.accountant))
+
+    chunks = await ExportService(session).export_transactions(export_format, semester_id, group_id)
+    return StreamingResponse(
+        chunks, media_type=MEDIA_TYPES[export_format],
+        headers=content_disposition(f"transactions.{export_format.value}")
+    )
 
-    operations = await OperationService().get_all_operations()
-    return list(map(lambda x: OperationResponse(**x.to_dict()), operations))
+
+@router.get("/export_operations", response_class=StreamingResponse)
+async def export_operations(
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)],
+        export_format: ExportFormats = Query(ExportFormats.csv, alias="format"),
+        date_from: Optional[datetime.datetime] = Query(None, description="operations created at or after this time"),
+        date_to: Optional[datetime.datetime] = Query(None, description="operations created before this time"),
+) -> StreamingResponse:
+    UserService.validate_role(current_user.role, (Roles.admin,))
+
+    chunks = await ExportService(session).export_operations(export_format, date_from, date_to)
+    return StreamingResponse(
+        chunks, media_type=MEDIA_TYPES[export_format],
+        headers=content_disposition(f"operations.{export_format.value}")
+    )
 
 
 @router.post("/new_transaction", response_model=TransactionResponse)
 async def new_semester_payment(
         new_transaction: TransactionCreate,
-        current_user: Annotated[User, Depends(UserService().get_current_user)]
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)],
+        idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", min_length=1, max_length=255,
+                                                description="retries with the same key get the first response"),
 ) -> TransactionResponse:
-    UserService().validate_role(current_user.role, (Roles.student,))
+    UserService.validate_role(current_user.role, (Roles.student,))
+
+    if idempotency_key is not None:
+        return await OperationService(session).create_transaction_once(
+            current_user.id, new_transaction, current_user.id, idempotency_key
+        )
+    transaction = await OperationService(session).create_transaction(current_user.id, new_transaction, current_user.id)
+    return TransactionResponse.model_validate(transaction)
+
+
+@router.post("/load_payments", response_model=PaymentImportResponse)
+async def load_payments_from_statement(
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)],
+        file: UploadFile
+) -> PaymentImportResponse:
+    UserService.validate_role(current_user.role, (Roles.accountant,))
 
-    transaction = await OperationService().create_transaction(current_user, new_transaction, current_user.id)
-    return TransactionResponse(**transaction.to_dict())
+    return await OperationService(session).load_payments_from_file(file, current_user.id)
 
 
 @router.put("/add_to_group", response_model=GroupResponse)
 async def add_student_to_group(
         group_id: uuid.UUID,
         user_id: uuid.UUID,
-        current_user: Annotated[User, Depends(UserService().get_current_user)]
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)]
 ) -> GroupResponse:
-    UserService().validate_role(current_user.role, (Roles.admin,))
+    UserService.validate_role(current_user.role, (Roles.admin,))
 
-    group = await OperationService().add_student_to_group(user_id, group_id, current_user.id)
-    return GroupResponse(**group.to_dict())
+    group = await OperationService(session).add_student_to_group(user_id, group_id, current_user.id)
+    return GroupResponse.model_validate(group)
 
 
 @router.delete("/remove_from_group", response_model=SuccessfulResponse)
 async def remove_student_from_group(
         user_id: uuid.UUID,
-        current_user: Annotated[User, Depends(UserService().get_current_user)]
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)]
 ) -> SuccessfulResponse:
-    UserService().validate_role(current_user.role, (Roles.admin,))
+    UserService.validate_role(current_user.role, (Roles.admin,))
 
-    await OperationService().remove_student_from_group(user_id, current_user.id)
+    await OperationService(session).remove_student_from_group(user_id, current_user.id)
     return SuccessfulResponse(success="Student successfully delete from group!")
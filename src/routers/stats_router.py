@@ -0,0 +1,71 @@
+import uuid
+
+from typing import Annotated, Optional, List
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models import Roles
+from src.schemas import SemesterStatsResponse, GroupStatsResponse, GroupSemesterStatsResponse, ArrearsPageResponse, \
+    UserPrincipal
+from src.database import get_session
+from src.services.user_service import UserService, get_current_user
+from src.services.stats_service import StatsService
+
+from config_data import constants
+from utils.serialization import serialize
+
+router = APIRouter(tags=["stats"], prefix="/stats")
+
+
+@router.get("/semesters", response_model=List[SemesterStatsResponse])
+async def get_semester_stats(
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)],
+) -> Response:
+    UserService.validate_role(current_user.role, (Roles.admin, Roles.observer, Roles.accountant))
+
+    return serialize(List[SemesterStatsResponse], await StatsService(session).get_semester_stats())
+
+
+@router.get("/groups", response_model=List[GroupStatsResponse])
+async def get_group_stats(
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)],
+) -> Response:
+    UserService.validate_role(current_user.role, (Roles.admin, Roles.observer, Roles.accountant))
+
+    return serialize(List[GroupStatsResponse], await StatsService(session).get_group_stats())
+
+
+@router.get("/groups_semesters", response_model=List[GroupSemesterStatsResponse])
+async def get_group_semester_stats(
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)],
+        group_id: Optional[uuid.UUID] = Query(None, description="group id for stats of only one group"),
+        semester_id: Optional[uuid.UUID] = Query(None, description="semester id for stats of only one semester"),
+) -> Response:
+    UserService.validate_role(current_user.role, (Roles.admin, Roles.observer, Roles.accountant))
+
+    stats = await StatsService(session).get_group_semester_stats(group_id, semester_id)
+    return serialize(List[GroupSemesterStatsResponse], stats)
+
+
+@router.get("/arrears", response_model=ArrearsPageResponse)
+async def get_arrears(
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)],
+        semester_id: uuid.UUID,
+        expected_amount: Optional[float] = Query(None, gt=0,
+                                                 description="students who paid less are in arrears, "
+                                                             "by default only students who paid nothing"),
+        group_id: Optional[uuid.UUID] = Query(None, description="group id for arrears of only one group"),
+        limit: int = Query(constants.DEFAULT_PAGE_LIMIT, ge=1, le=constants.MAX_PAGE_LIMIT,
+                           description="max students count on page"),
+        after: Optional[str] = Query(None, description="next_cursor from the previous page"),
+) -> Response:
+    UserService.validate_role(current_user.role, (Roles.admin, Roles.accountant))
+
+    arrears, next_cursor = await StatsService(session).get_arrears_page(
+        semester_id, limit, expected_amount, group_id, after
+    )
+    return serialize(ArrearsPageResponse, {"items": arrears, "next_cursor": next_cursor})
@@ -1,79 +1,124 @@
 import uuid
 
 from typing import Annotated, List, Optional
-from fastapi import APIRouter, Depends, Query, UploadFile
-
-from src.models import User, Roles
-from src.schemas import UserResponse, UserCreate, Token, UserEdit, SuccessfulResponse
-from src.services.user_service import UserService
+from fastapi import APIRouter, Depends, Query, Request, Response, UploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models import Roles
+from src.schemas import UserResponse, UserCreate, UserLogin, Token, UserEdit, SuccessfulResponse, UserImportResponse, \
+    UserPrincipal, UserSearchPageResponse
+from src.database import get_session
+from src.services.user_service import UserService, get_current_user, get_current_user_for_refresh
 from src.services.infra_service import InfraService
 
+from config_data import constants
 from utils import auth_settings
+from utils.serialization import serialize
+from utils.versions import entity_versions, USERS, GROUPS, TRANSACTIONS
 
 router = APIRouter(tags=["users"], prefix="/users")
 
 
 @router.get("/self", response_model=UserResponse)
 async def login_for_access_token(
-        current_user: Annotated[User, Depends(UserService().get_current_user)]
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)]
 ) -> UserResponse:
-    user_dc = current_user.to_dict()
-    if isinstance(current_user.group_id, uuid.UUID):
-        user_group = await InfraService().get_group_by_id(current_user.group_id)
-        user_dc["group_name"] = user_group.name
+    user = await UserService(session).get_user_by_id(current_user.id, with_transactions=True)
+    response = UserResponse.model_validate(user)
+    if isinstance(user.group_id, uuid.UUID):
+        user_group = await InfraService(session).get_group_by_id(user.group_id)
+        response.group_name = user_group.name
 
-    return UserResponse(**user_dc)
+    return response
 
 
 @router.get("/all", response_model=List[UserResponse])
 async def get_all_users(
-        current_user: Annotated[User, Depends(UserService().get_current_user)],
-) -> List[UserResponse]:
-    UserService().validate_role(current_user.role, (Roles.admin, Roles.observer, Roles.accountant))
+        request: Request,
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)],
+) -> Response:
+    UserService.validate_role(current_user.role, (Roles.admin, Roles.observer, Roles.accountant))
+    etag = await entity_versions.etag(session, USERS, TRANSACTIONS)
+    if (not_modified := entity_versions.not_modified(request, etag)) is not None:
+        return not_modified
 
-    users = await UserService().get_all_users()
-    return list(map(lambda x: UserResponse(**x.to_dict()), users))
+    users = await UserService(session).get_all_users()
+    return serialize(List[UserResponse], users, etag)
 
 
 @router.get("/students", response_model=List[UserResponse])
 async def get_students(
-        current_user: Annotated[User, Depends(UserService().get_current_user)],
+        request: Request,
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)],
         student_id: Optional[uuid.UUID] = Query(None, description="student id for get only one student"),
-) -> List[UserResponse]:
-    UserService().validate_role(current_user.role, (Roles.admin, Roles.observer, Roles.accountant))
+) -> Response:
+    UserService.validate_role(current_user.role, (Roles.admin, Roles.observer, Roles.accountant))
+    etag = await entity_versions.etag(session, USERS, TRANSACTIONS)
+    if (not_modified := entity_versions.not_modified(request, etag)) is not None:
+        return not_modified
 
     if student_id is None:
-        students = await UserService().get_all_students()
+        students = await UserService(session).get_all_students()
     else:
-        students = [await UserService().get_student_by_id(student_id)]
+        students = [await UserService(session).get_student_by_id(student_id, with_transactions=True)]
+
+    return serialize(List[UserResponse], students, etag)
+
 
-    return list(map(lambda x: UserResponse(**x.to_dict()), students))
+@router.get("/search", response_model=UserSearchPageResponse)
+async def search_users(
+        request: Request,
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)],
+        q: str = Query(min_length=2, max_length=100,
+                       description="part of the surname, name, patronymic, login or phone, typos allowed"),
+        role: Optional[Roles] = Query(None, description="role of the users to search"),
+        group_id: Optional[uuid.UUID] = Query(None, description="group id to search only its users"),
+        limit: int = Query(constants.DEFAULT_PAGE_LIMIT, ge=1, le=constants.MAX_PAGE_LIMIT,
+                           description="max users count on page"),
+        after: Optional[str] = Query(None, description="next_cursor from the previous page"),
+) -> Response:
+    UserService.validate_role(current_user.role, (Roles.admin, Roles.observer, Roles.accountant))
+    etag = await entity_versions.etag(session, USERS, GROUPS)
+    if (not_modified := entity_versions.not_modified(request, etag)) is not None:
+        return not_modified
+
+    users, next_cursor = await UserService(session).search_users_page(q, limit, role, group_id, after)
+    return serialize(UserSearchPageResponse, {"items": users, "next_cursor": next_cursor}, etag)
 
 
 @router.post("/new", response_model=UserResponse)
 async def create_new_user(
         user_create: UserCreate,
-        current_user: Annotated[User, Depends(UserService().get_current_user)]
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)]
 ) -> UserResponse:
-    UserService().validate_role(current_user.role, (Roles.admin,))
+    UserService.validate_role(current_user.role, (Roles.admin,))
 
-    user = await UserService().create_user(user_create, current_user.id)
-    return UserResponse(**user.to_dict())
+    user = await UserService(session).create_user(user_create, current_user.id)
+    return UserResponse.model_validate(user)
 
 
-@router.post("/load_students", response_model=List[UserResponse])
+@router.post("/load_students", response_model=UserImportResponse)
 async def load_students_from_xlsx(
-        current_user: Annotated[User, Depends(UserService().get_current_user)],
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)],
         file: UploadFile
-):
-    UserService().validate_role(current_user.role, (Roles.admin,))
+) -> UserImportResponse:
+    UserService.validate_role(current_user.role, (Roles.admin,))
 
-    loaded_users = await UserService().load_users_from_file(file, current_user.id)
-    return list(map(lambda x: UserResponse(**x.to_dict()), loaded_users))
+    return await UserService(session).load_users_from_file(file, current_user.id)
 
 
 @router.post("/login", response_model=Token)
-async def authenticate_user_jwt(user: User = Depends(UserService().authenticate_user)) -> Token:
+async def authenticate_user_jwt(
+        user_data: UserLogin,
+        session: Annotated[AsyncSession, Depends(get_session)]
+) -> Token:
+    user = await UserService(session).authenticate_user(user_data)
     access_token = auth_settings.create_access_token(user)
     refresh_token = auth_settings.create_refresh_token(user)
     return Token(access_token=access_token, refresh_token=refresh_token)
@@ -81,7 +126,7 @@ async def authenticate_user_jwt(user: User = Depends(UserService().authenticate_
 
 @router.post("/refresh", response_model=Token, response_model_exclude_none=True)
 async def refresh_jwt(
-        current_user: Annotated[User, Depends(UserService().get_current_user_for_refresh)]
+        current_user: Annotated[UserPrincipal, Depends(get_current_user_for_refresh)]
 ) -> Token:
     access_token = auth_settings.create_access_token(current_user)
     return Token(access_token=access_token)
@@ -89,22 +134,24 @@ async def refresh_jwt(
 
 @router.put("/edit/{user_id}", response_model=UserResponse)
 async def edit_user(
-        current_user: Annotated[User, Depends(UserService().get_current_user)],
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)],
         user_id: uuid.UUID,
         new_user_data: UserEdit
 ) -> UserResponse:
-    UserService().validate_role(current_user.role, (Roles.admin,))
+    UserService.validate_role(current_user.role, (Roles.admin,))
 
-    user = await UserService().edit_user(user_id, new_user_data, current_user.id)
-    return UserResponse(**user.to_dict())
+    user = await UserService(session).edit_user(user_id, new_user_data, current_user.id)
+    return UserResponse.model_validate(user)
 
 
 @router.delete("/delete/{user_id}", response_model=SuccessfulResponse)
 async def delete_user(
-        current_user: Annotated[User, Depends(UserService().get_current_user)],
+        current_user: Annotated[UserPrincipal, Depends(get_current_user)],
+        session: Annotated[AsyncSession, Depends(get_session)],
         user_id: uuid.UUID,
 ) -> SuccessfulResponse:
-    UserService().validate_role(current_user.role, (Roles.admin,))
+    UserService.validate_role(current_user.role, (Roles.admin,))
 
-    await UserService().delete_user(user_id, current_user.id)
+    await UserService(session).delete_user(user_id, current_user.id)
     return SuccessfulResponse(success="User has been successful delete!")
@@ -2,15 +2,28 @@ import datetime
 import uuid
 from typing import Optional, List
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 from src.models import Roles, OperationTypes
 
 
+class ORMModel(BaseModel):
+    """Response model that is built straight from ORM objects and result rows."""
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ReferenceItem(ORMModel):
+    """Id and name of a semester or group, as kept in the reference cache."""
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+    id: uuid.UUID
+    name: str
+
+
 class SuccessfulResponse(BaseModel):
     success: str = "ok"
 
 
-class SemesterResponse(BaseModel):
+class SemesterResponse(ORMModel):
     id: uuid.UUID
     name: str
 
@@ -20,12 +33,13 @@ class TransactionCreate(BaseModel):
     amount: float
 
 
-class TransactionResponse(BaseModel):
+class TransactionResponse(ORMModel):
     id: uuid.UUID
     user_id: uuid.UUID
     semester_id: uuid.UUID
     amount: float
     comment: str
+    bank_reference: Optional[str] = None
     created_at: datetime.datetime
 
 
@@ -33,6 +47,13 @@ class TokenData(BaseModel):
     uid: uuid.UUID | None = None
 
 
+class UserPrincipal(BaseModel):
+    id: uuid.UUID
+    role: Roles
+    login: str
+    group_id: Optional[uuid.UUID] = None
+
+
 class Token(BaseModel):
     access_token: str
     refresh_token: str | None = None
@@ -61,7 +82,7 @@ class UserLogin(BaseModel):
     password: str
 
 
-class UserResponse(BaseModel):
+class UserResponse(ORMModel):
     id: uuid.UUID
     name: str
     surname: str
@@ -74,19 +95,99 @@ class UserResponse(BaseModel):
     transactions: List[TransactionResponse]
 
 
-class GroupResponse(BaseModel):
+class UserSearchResponse(ORMModel):
+    id: uuid.UUID
+    surname: str
+    name: str
+    patronymic: str
+    role: Roles
+    phone: str
+    login: str
+    group_id: Optional[uuid.UUID] = None
+    group_name: Optional[str] = None
+    rank: float
+
+
+class UserSearchPageResponse(ORMModel):
+    items: List[UserSearchResponse]
+    next_cursor: Optional[str] = None
+
+
+class UserImportRowResponse(BaseModel):
+    row: int
+    login: Optional[str] = None
+    accepted: bool
+    user_id: Optional[uuid.UUID] = None
+    detail: Optional[str] = None
+
+
+class UserImportResponse(BaseModel):
+    accepted: int
+    rejected: int
+    rows: List[UserImportRowResponse]
+
+
+class PaymentImportRow(BaseModel):
+    bank_reference: str
+    login: str
+    semester: str
+    amount: float = Field(gt=0)
+
+
+class PaymentImportRowResponse(BaseModel):
+    row: int
+    bank_reference: Optional[str] = None
+    login: Optional[str] = None
+    amount: Optional[float] = None
+    accepted: bool
+    transaction_id: Optional[uuid.UUID] = None
+    detail: Optional[str] = None
+
+
+class PaymentImportResponse(BaseModel):
+    accepted: int
+    rejected: int
+    accepted_amount: float
+    rows: List[PaymentImportRowResponse]
+
+
+class GroupResponse(ORMModel):
     id: uuid.UUID
     name: str
     users: List[UserResponse]
 
 
+class GroupSummaryResponse(ORMModel):
+    id: uuid.UUID
+    name: str
+    students_count: int
+    paid_count: Optional[int] = None
+    unpaid_count: Optional[int] = None
+
+
+class GroupMemberResponse(ORMModel):
+    id: uuid.UUID
+    surname: str
+    name: str
+    patronymic: str
+    role: Roles
+    phone: str
+    login: str
+    paid_amount: Optional[float] = None
+
+
+class GroupMembersPageResponse(ORMModel):
+    items: List[GroupMemberResponse]
+    next_cursor: Optional[str] = None
+
+
 class OperationCreate(BaseModel):
     type: OperationTypes
     user_id: uuid.UUID
     comment: str
 
 
-class UserOperationsResponse(BaseModel):
+class UserOperationsResponse(ORMModel):
     id: uuid.UUID
     name: str
     surname: str
@@ -94,10 +195,52 @@ class UserOperationsResponse(BaseModel):
     role: Roles
 
 
-class OperationResponse(BaseModel):
+class OperationResponse(ORMModel):
     id: uuid.UUID
     type: OperationTypes
     user_id: uuid.UUID
     comment: str
     created_at: datetime.datetime
     initiator: UserOperationsResponse
+
+
+class OperationsPageResponse(ORMModel):
+    items: List[OperationResponse]
+    next_cursor: Optional[str] = None
+
+
+class PaymentStatsResponse(ORMModel):
+    total_amount: float
+    payments_count: int
+    average_amount: float
+
+
+class SemesterStatsResponse(PaymentStatsResponse):
+    semester_id: uuid.UUID
+    semester_name: str
+
+
+class GroupStatsResponse(PaymentStatsResponse):
+    group_id: Optional[uuid.UUID] = None
+    group_name: Optional[str] = None
+
+
+class GroupSemesterStatsResponse(GroupStatsResponse):
+    semester_id: uuid.UUID
+    semester_name: str
+
+
+class ArrearsResponse(ORMModel):
+    user_id: uuid.UUID
+    surname: str
+    name: str
+    patronymic: str
+    group_id: Optional[uuid.UUID] = None
+    group_name: Optional[str] = None
+    paid_amount: float
+    debt_amount: Optional[float] = None
+
+
+class ArrearsPageResponse(ORMModel):
+    items: List[ArrearsResponse]
+    next_cursor: Optional[str] = None
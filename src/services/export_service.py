@@ -0,0 +1,59 @@
+import datetime
+import uuid
+
+from typing import AsyncIterator, Awaitable, Callable, Optional, Sequence
+
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import AsyncResult, AsyncSession
+
+from config_data import constants
+from src import database
+from src.repositories import operations_repository as operations_repo
+from src.services.infra_service import InfraService
+from utils.export_writer import ExportFormats, write_export
+from utils.pagination import naive_utc
+
+
+class ExportService:
+    """Builds file exports that are read and written batch by batch while the response is sent.
+
+    Filters are checked on the request session, but the rows are read on a session of their own:
+    the request session is closed before a streaming response starts.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    @staticmethod
+    async def _partitions(
+            stream: Callable[[operations_repo.OperationsRepository], Awaitable[AsyncResult]]
+    ) -> AsyncIterator[Sequence[Row]]:
+        async with database.async_session() as session:
+            result = await stream(operations_repo.OperationsRepository(session))
+            async for partition in result.partitions():
+                yield partition
+
+    async def export_transactions(
+            self,
+            export_format: ExportFormats,
+            semester_id: Optional[uuid.UUID] = None,
+            group_id: Optional[uuid.UUID] = None
+    ) -> AsyncIterator[bytes]:
+        infra_service = InfraService(self.session)
+        if semester_id is not None:
+            semester_id = (await infra_service.get_semester_by_id(semester_id)).id
+        if group_id is not None:
+            group_id = (await infra_service.get_group_by_id(group_id)).id
+
+        partitions = self._partitions(lambda repository: repository.stream_transactions(semester_id, group_id))
+        return write_export(export_format, constants.TRANSACTIONS_EXPORT_HEADER, partitions, "Transactions")
+
+    async def export_operations(
+            self,
+            export_format: ExportFormats,
+            date_from: Optional[datetime.datetime] = None,
+            date_to: Optional[datetime.datetime] = None
+    ) -> AsyncIterator[bytes]:
+        date_from, date_to = naive_utc(date_from), naive_utc(date_to)
+        partitions = self._partitions(lambda repository: repository.stream_operations(date_from, date_to))
+        return write_export(export_format, constants.OPERATIONS_EXPORT_HEADER, partitions, "Operations")
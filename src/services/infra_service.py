@@ -1,105 +1,196 @@
 import uuid
 
-from typing import List
+from typing import List, Optional, Tuple, Union
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.models import Group, Semester, OperationTypes
-from src.exceptions import AlreadyExistException, NotFoundException, AccessException
+from src.schemas import GroupSummaryResponse, GroupMemberResponse, ReferenceItem
+from src.exceptions import AlreadyExistException, NotFoundException
 from src.repositories import (
     infra_repository as infra_repo,
     operations_repository as operations_repo,
+    stats_repository as stats_repo,
     user_repository as users_repo
 )
 
+from src.services.user_service import principal_cache
+
 from config_data import constants
+from config_data.config import Config, load_config
+from utils import metrics, versions
+from utils.cache import ReferenceCache
+from utils.pagination import encode_cursor, decode_cursor
 
+settings: Config = load_config(".env")
+
+# Per-process snapshots of semesters and groups, reloaded after every committed change of them in any worker
+semester_cache = ReferenceCache(versions.SEMESTERS, settings.cache.reference_ttl)
+group_cache = ReferenceCache(versions.GROUPS, settings.cache.reference_ttl)
+metrics.register("semester_cache", semester_cache.metrics)
+metrics.register("group_cache", group_cache.metrics)
 
-class InfraService:
-    infra_repository = infra_repo.InfraRepository()
-    operations_repository = operations_repo.OperationsRepository()
-    users_repository = users_repo.UserRepository()
 
-    async def get_group_by_id(self, group_id: uuid.UUID) -> Group:
-        group = await self.infra_repository.get_group_by_id(group_id)
+class InfraService:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.infra_repository = infra_repo.InfraRepository(session)
+        self.operations_repository = operations_repo.OperationsRepository(session)
+        self.users_repository = users_repo.UserRepository(session)
+        self.stats_repository = stats_repo.StatsRepository(session)
+
+    async def _load_groups(self) -> List[ReferenceItem]:
+        return [ReferenceItem.model_validate(group) for group in await self.infra_repository.get_all_groups(False)]
+
+    async def _load_semesters(self) -> List[ReferenceItem]:
+        return [ReferenceItem.model_validate(semester) for semester in await self.infra_repository.get_all_semesters()]
+
+    async def get_group_by_id(self, group_id: uuid.UUID, with_users: bool = False) -> Union[Group, ReferenceItem]:
+        """The group with its users, or only its cached id and name without with_users."""
+        if not with_users:
+            group = (await group_cache.get_items(self._load_groups)).get(group_id)
+            if group is not None:
+                return group
+
+        group = await self.infra_repository.get_group_by_id(group_id, with_users)
         if group is None:
             raise NotFoundException(constants.GROUP_NOT_FOUND_MESSAGE)
+        if not with_users:
+            # created by another worker whose invalidation has not arrived yet
+            group_cache.clear()
 
         return group
 
-    async def get_semester_by_id(self, semester_id: uuid.UUID) -> Semester:
+    async def get_semester_by_id(self, semester_id: uuid.UUID) -> ReferenceItem:
+        semester = (await semester_cache.get_items(self._load_semesters)).get(semester_id)
+        if semester is not None:
+            return semester
+
         semester = await self.infra_repository.get_semester_by_id(semester_id)
         if semester is None:
             raise NotFoundException(constants.SEMESTER_NOT_FOUND_MESSAGE)
+        semester_cache.clear()
 
-        return semester
+        return ReferenceItem.model_validate(semester)
 
     async def get_all_groups(self) -> List[Group]:
         return await self.infra_repository.get_all_groups()
 
-    async def get_all_semesters(self) -> List[Semester]:
-        return await self.infra_repository.get_all_semesters()
+    async def get_all_semesters(self) -> List[ReferenceItem]:
+        return list((await semester_cache.get_items(self._load_semesters)).values())
+
+    async def get_groups_summary(self, semester_id: Optional[uuid.UUID] = None) -> List[GroupSummaryResponse]:
+        if semester_id is not None:
+            semester_id = (await self.get_semester_by_id(semester_id)).id
+
+        rows = await self.infra_repository.get_groups_summary(semester_id)
+        return [
+            GroupSummaryResponse(
+                **row._mapping,
+                unpaid_count=None if row.paid_count is None else row.students_count - row.paid_count
+            )
+            for row in rows
+        ]
+
+    async def get_group_members_page(
+            self,
+            group_id: uuid.UUID,
+            limit: int,
+            semester_id: Optional[uuid.UUID] = None,
+            after: Optional[str] = None
+    ) -> Tuple[List[GroupMemberResponse], Optional[str]]:
+        group = await self.get_group_by_id(group_id)
+        if semester_id is not None:
+            semester_id = (await self.get_semester_by_id(semester_id)).id
+        after_key = None
+        if after is not None:
+            after_key = tuple(decode_cursor(after, str, uuid.UUID))
+
+        rows = await self.infra_repository.get_group_members(group.id, limit + 1, semester_id, after_key)
+        members = [GroupMemberResponse.model_validate(row) for row in rows[:limit]]
+        if len(rows) <= limit:
+            return members, None
+
+        last_member = members[-1]
+        return members, encode_cursor((last_member.surname, last_member.id))
 
     async def create_group(self, group_name: str, initiator_id: uuid.UUID) -> Group:
-        if await self.infra_repository.get_group_by_name(group_name):
+        group = await self.infra_repository.create_group(group_name)
+        if group is None:
             raise AlreadyExistException(constants.ALREADY_EXIST_GROUP_MESSAGE)
         await self.operations_repository.create_operation(
             operation_type=OperationTypes.group,
             user_id=initiator_id,
             comment=constants.CREATE_GROUP_COMMENT.format(group_name=group_name)
         )
+        await self.session.commit()
 
-        return await self.infra_repository.create_group(group_name)
+        return group
 
     async def create_semester(self, semester_name: str, initiator_id: uuid.UUID) -> Semester:
-        if await self.infra_repository.get_semester_by_name(semester_name):
+        semester = await self.infra_repository.create_semester(semester_name)
+        if semester is None:
             raise AlreadyExistException(constants.ALREADY_EXIST_SEMESTER_MESSAGE)
         await self.operations_repository.create_operation(
             operation_type=OperationTypes.semester,
             user_id=initiator_id,
             comment=constants.CREATE_SEMESTER_COMMENT.format(semester_name=semester_name)
         )
+        await self.session.commit()
 
-        return await self.infra_repository.create_semester(semester_name)
+        return semester
 
     async def edit_group(self, group_id: uuid.UUID, new_group_name: str, initiator_id: uuid.UUID) -> Group:
-        if await self.infra_repository.get_group_by_name(new_group_name):
-            raise AccessException()
-
         group = await self.get_group_by_id(group_id)
+        name_before = group.name
+        try:
+            group = await self.infra_repository.edit_group(group.id, new_group_name)
+        except IntegrityError:
+            raise AlreadyExistException(constants.ALREADY_EXIST_GROUP_MESSAGE)
+
         await self.operations_repository.create_operation(
             operation_type=OperationTypes.group,
             user_id=initiator_id,
             comment=constants.EDIT_GROUP_COMMENT.format(
-                name_before=group.name, name_after=new_group_name
+                name_before=name_before, name_after=new_group_name
             )
         )
-        return await self.infra_repository.edit_group(group.id, new_group_name)
+        await self.session.commit()
 
-    async def edit_semester(self, semester_id: uuid.UUID, new_semester_name: str, initiator_id: uuid.UUID) -> Semester:
-        if await self.infra_repository.get_semester_by_name(new_semester_name):
-            raise AccessException()
+        return group
 
+    async def edit_semester(self, semester_id: uuid.UUID, new_semester_name: str, initiator_id: uuid.UUID) -> Semester:
         semester = await self.get_semester_by_id(semester_id)
+        name_before = semester.name
+        try:
+            semester = await self.infra_repository.edit_semester(semester.id, new_semester_name)
+        except IntegrityError:
+            raise AlreadyExistException(constants.ALREADY_EXIST_SEMESTER_MESSAGE)
+
         await self.operations_repository.create_operation(
             operation_type=OperationTypes.semester,
             user_id=initiator_id,
             comment=constants.EDIT_SEMESTER_COMMENT.format(
-                name_before=semester.name, name_after=new_semester_name
+                name_before=name_before, name_after=new_semester_name
             )
         )
+        await self.session.commit()
 
-        return await self.infra_repository.edit_semester(semester.id, new_semester_name)
+        return semester
 
     async def delete_group(self, group_id: uuid.UUID, initiator_id: uuid.UUID) -> None:
         group = await self.get_group_by_id(group_id)
         await self.users_repository.delete_group_for_users_by_id(group.id)
-
+        await self.stats_repository.release_group(group.id)
         await self.operations_repository.create_operation(
             operation_type=OperationTypes.group,
             user_id=initiator_id,
             comment=constants.DELETE_GROUP_COMMENT.format(group_name=group.name)
         )
-
-        return await self.infra_repository.delete_group(group.id)
+        await self.infra_repository.delete_group(group.id)
+        await self.session.commit()
+        principal_cache.clear()
 
     async def delete_semester(self, semester_id: uuid.UUID, initiator_id: uuid.UUID) -> None:
         semester = await self.get_semester_by_id(semester_id)
@@ -108,4 +199,5 @@ class InfraService:
             user_id=initiator_id,
             comment=constants.DELETE_SEMESTER_COMMENT.format(semester_name=semester.name)
         )
-        return await self.infra_repository.delete_semester(semester.id)
+        await self.infra_repository.delete_semester(semester.id)
+        await self.session.commit()
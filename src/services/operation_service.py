@@ -1,25 +1,121 @@
+import datetime
 import uuid
-from typing import List
+from typing import AsyncIterable, Dict, List, Optional, Set, Tuple
+
+from fastapi import UploadFile
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from config_data import constants
-from src.exceptions import NotFoundException
-from src.models import User, Group, Transaction, Operation, OperationTypes
-from src.repositories import operations_repository as operations_repo
-from src.schemas import TransactionCreate
+from config_data.config import Config, load_config
+from src.exceptions import NotFoundException, IncorrectFileFormatException, FileTooLargeException, \
+    IdempotencyKeyReusedException
+from src.models import Group, Transaction, Operation, OperationTypes
+from src.repositories import (
+    operations_repository as operations_repo,
+    stats_repository as stats_repo,
+    user_repository as user_repo
+)
+from src.schemas import TransactionCreate, TransactionResponse, PaymentImportRow, PaymentImportRowResponse, \
+    PaymentImportResponse, ReferenceItem
 from src.services.infra_service import InfraService
-from src.services.user_service import UserService
+from src.services.user_service import UserService, principal_cache
+from utils import metrics
+from utils.cache import KeyedLocks, TTLCache
+from utils.excel_parser import Parser as FileParser
+from utils.pagination import encode_cursor, decode_cursor, naive_utc
+
+settings: Config = load_config(".env")
+import_config = settings.usersImport
+idempotency_config = settings.idempotency
+
+# Per-process front of the idempotency_keys table: (user id, key) -> (request fingerprint, response).
+# Stored responses never change, so the cache needs no invalidation
+idempotency_cache = TTLCache(idempotency_config.cache_size, idempotency_config.cache_ttl)
+idempotency_locks = KeyedLocks()
+metrics.register("idempotency_cache", idempotency_cache.metrics)
+metrics.register("idempotency_locks", idempotency_locks.metrics)
 
 
 class OperationService:
-    operations_repository = operations_repo.OperationsRepository()
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.operations_repository = operations_repo.OperationsRepository(session)
+        self.stats_repository = stats_repo.StatsRepository(session)
+        self.user_repository = user_repo.UserRepository(session)
 
-    async def get_all_operations(self) -> List[Operation]:
-        return await self.operations_repository.get_all_operations()
+    async def get_operations_page(
+            self,
+            limit: int,
+            after: Optional[str] = None,
+            date_from: Optional[datetime.datetime] = None,
+            date_to: Optional[datetime.datetime] = None
+    ) -> Tuple[List[Operation], Optional[str]]:
+        after_key = None
+        if after is not None:
+            after_key = tuple(decode_cursor(after, datetime.datetime.fromisoformat, uuid.UUID))
+
+        operations = await self.operations_repository.get_all_operations(
+            limit + 1, after_key, naive_utc(date_from), naive_utc(date_to)
+        )
+        if len(operations) <= limit:
+            return operations, None
+
+        operations = operations[:limit]
+        last_operation = operations[-1]
+        return operations, encode_cursor((last_operation.created_at.isoformat(), last_operation.id))
 
     async def create_transaction(
-            self, user: User, new_transaction: TransactionCreate, initiator_id: uuid.UUID
+            self, user_id: uuid.UUID, new_transaction: TransactionCreate, initiator_id: uuid.UUID
+    ) -> Transaction:
+        transaction = await self._record_transaction(user_id, new_transaction, initiator_id)
+        await self.session.commit()
+
+        return transaction
+
+    async def create_transaction_once(
+            self, user_id: uuid.UUID, new_transaction: TransactionCreate, initiator_id: uuid.UUID, key: str
+    ) -> TransactionResponse:
+        """create_transaction for a request with an Idempotency-Key: a repeated key gets the stored response
+        without another payment, and a request with a key that is in progress waits for it to finish."""
+        cache_key = (user_id, key)
+        fingerprint = f"{new_transaction.semester_id}:{new_transaction.amount!r}"
+        async with idempotency_locks.hold(cache_key):
+            stored = idempotency_cache.get(cache_key)
+            if stored is None:
+                stored_key = await self.operations_repository.claim_idempotency_key(user_id, key, fingerprint)
+                if stored_key is None:
+                    transaction = await self._record_transaction(user_id, new_transaction, initiator_id)
+                    response = TransactionResponse.model_validate(transaction)
+                    await self.operations_repository.save_idempotent_response(
+                        user_id, key, response.model_dump(mode="json")
+                    )
+                    await self.session.commit()
+                    stored = (fingerprint, response)
+                else:
+                    stored = (stored_key.fingerprint, TransactionResponse.model_validate(stored_key.response))
+                idempotency_cache.set(cache_key, stored)
+
+        stored_fingerprint, response = stored
+        if stored_fingerprint != fingerprint:
+            raise IdempotencyKeyReusedException()
+        return response
+
+    async def delete_expired_idempotency_keys(self) -> int:
+        created_before = (
+            datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+            - datetime.timedelta(seconds=idempotency_config.key_retention)
+        )
+        deleted = await self.operations_repository.delete_idempotency_keys(created_before)
+        await self.session.commit()
+
+        return deleted
+
+    async def _record_transaction(
+            self, user_id: uuid.UUID, new_transaction: TransactionCreate, initiator_id: uuid.UUID
     ) -> Transaction:
-        semester = await InfraService().get_semester_by_id(new_transaction.semester_id)
+        semester = await InfraService(self.session).get_semester_by_id(new_transaction.semester_id)
+        user = await UserService(self.session).get_user_by_id(user_id)
         await self.operations_repository.create_operation(
             operation_type=OperationTypes.payment,
             user_id=initiator_id,
@@ -27,11 +123,14 @@ class OperationService:
                 name=user.name, surname=user.surname, patronymic=user.patronymic, amount=new_transaction.amount
             )
         )
-        return await self.operations_repository.create_transaction(user.id, new_transaction, semester.name)
+        transaction = await self.operations_repository.create_transaction(user.id, new_transaction, semester.name)
+        await self.stats_repository.add_payment(semester.id, user.group_id, new_transaction.amount)
+
+        return transaction
 
     async def add_student_to_group(self, user_id: uuid.UUID, group_id: uuid.UUID, initiator_id: uuid.UUID) -> Group:
-        group = await InfraService().get_group_by_id(group_id)
-        student = await UserService().get_student_by_id(user_id)
+        group = await InfraService(self.session).get_group_by_id(group_id)
+        student = await UserService(self.session).get_student_by_id(user_id)
 
         await self.operations_repository.create_operation(
             operation_type=OperationTypes.user,
@@ -41,10 +140,15 @@ class OperationService:
             )
         )
 
-        return await self.operations_repository.add_user_to_group(student.id, group.id)
+        await self.stats_repository.move_user_payments(student.id, student.group_id, group.id)
+        group = await self.operations_repository.add_user_to_group(student.id, group.id)
+        await self.session.commit()
+        principal_cache.invalidate(student.id)
+
+        return group
 
     async def remove_student_from_group(self, user_id: uuid.UUID, initiator_id: uuid.UUID) -> None:
-        student = await UserService().get_student_by_id(user_id)
+        student = await UserService(self.session).get_student_by_id(user_id)
         if student.group_id is None:
             raise NotFoundException(constants.GROUP_NOT_FOUND_MESSAGE)
 
@@ -56,4 +160,118 @@ class OperationService:
             )
         )
 
-        return await self.operations_repository.remove_user_from_group(student.id)
+        await self.stats_repository.move_user_payments(student.id, student.group_id, None)
+        await self.operations_repository.remove_user_from_group(student.id)
+        await self.session.commit()
+        principal_cache.invalidate(student.id)
+
+    async def load_payments_from_file(
+            self, statement_file: UploadFile, initiator_id: uuid.UUID
+    ) -> PaymentImportResponse:
+        if not statement_file.filename.lower().endswith((".xlsx", ".csv")):
+            raise IncorrectFileFormatException(constants.PAYMENTS_FILE_FORMAT_MESSAGE)
+        if statement_file.size is not None and statement_file.size > import_config.max_file_size:
+            await statement_file.close()
+            raise FileTooLargeException(import_config.max_file_size)
+
+        parser = FileParser(statement_file, chunk_size=import_config.batch_size)
+        try:
+            return await self.import_payments(parser.parse_payments(), initiator_id)
+        finally:
+            await statement_file.close()
+
+    async def import_payments(
+            self, chunks: AsyncIterable[List[Tuple[int, Dict]]], initiator_id: uuid.UUID
+    ) -> PaymentImportResponse:
+        """Record payments chunk by chunk from (row number, fields) pairs and report every row.
+
+        Every chunk is committed on its own; a statement that failed halfway can be loaded again,
+        since the payments already recorded are rejected by their bank reference.
+        """
+        semesters = {semester.name: semester for semester in await InfraService(self.session).get_all_semesters()}
+        rows: List[PaymentImportRowResponse] = []
+        seen_references: Set[str] = set()
+        async for chunk in chunks:
+            rows.extend(await self._import_payments_chunk(chunk, semesters, seen_references, initiator_id))
+            await self.session.commit()
+
+        accepted_rows = [row for row in rows if row.accepted]
+        return PaymentImportResponse(
+            accepted=len(accepted_rows), rejected=len(rows) - len(accepted_rows),
+            accepted_amount=sum(row.amount for row in accepted_rows), rows=rows
+        )
+
+    async def _import_payments_chunk(
+            self,
+            chunk: List[Tuple[int, Dict]],
+            semesters: Dict[str, ReferenceItem],
+            seen_references: Set[str],
+            initiator_id: uuid.UUID
+    ) -> List[PaymentImportRowResponse]:
+        report: Dict[int, PaymentImportRowResponse] = {}
+
+        def reject(row_number: int, row: Dict, detail: str) -> None:
+            report[row_number] = PaymentImportRowResponse(
+                row=row_number, bank_reference=row.get("bank_reference"), login=row.get("login"),
+                accepted=False, detail=detail
+            )
+
+        candidates: List[Tuple[int, PaymentImportRow, ReferenceItem]] = []
+        for row_number, row in chunk:
+            try:
+                payment = PaymentImportRow(**row)
+            except ValidationError:
+                reject(row_number, row, constants.INVALID_IMPORT_ROW_MESSAGE)
+                continue
+
+            if payment.bank_reference in seen_references:
+                reject(row_number, row, constants.DUPLICATE_BANK_REFERENCE_MESSAGE)
+                continue
+            seen_references.add(payment.bank_reference)
+
+            semester = semesters.get(payment.semester)
+            if semester is None:
+                reject(row_number, row, constants.SEMESTER_NOT_FOUND_MESSAGE)
+                continue
+            candidates.append((row_number, payment, semester))
+
+        students = await self.user_repository.get_students_by_logins({payment.login for _, payment, _ in candidates})
+        new_transactions = []
+        for row_number, payment, semester in candidates:
+            student = students.get(payment.login)
+            if student is None:
+                reject(row_number, payment.model_dump(), constants.USER_NOT_FOUND_MESSAGE)
+                continue
+            new_transactions.append((row_number, payment, semester, student))
+
+        created_transactions = await self.operations_repository.create_transactions([
+            {
+                "id": uuid.uuid4(), "user_id": student.id, "semester_id": semester.id, "amount": payment.amount,
+                "bank_reference": payment.bank_reference,
+                "comment": constants.TRANSACTION_COMMENT.format(semester_name=semester.name, amount=payment.amount),
+            }
+            for _, payment, semester, student in new_transactions
+        ])
+
+        comments = []
+        totals: Dict[Tuple[uuid.UUID, Optional[uuid.UUID]], Tuple[float, int]] = {}
+        for row_number, payment, semester, student in new_transactions:
+            transaction_id = created_transactions.get(payment.bank_reference)
+            if transaction_id is None:
+                reject(row_number, payment.model_dump(), constants.ALREADY_EXIST_PAYMENT_MESSAGE)
+                continue
+
+            report[row_number] = PaymentImportRowResponse(
+                row=row_number, bank_reference=payment.bank_reference, login=payment.login, amount=payment.amount,
+                accepted=True, transaction_id=transaction_id
+            )
+            comments.append(constants.PAYMENT_COMMENT.format(
+                name=student.name, surname=student.surname, patronymic=student.patronymic, amount=payment.amount
+            ))
+            total_amount, payments_count = totals.get((semester.id, student.group_id), (0, 0))
+            totals[(semester.id, student.group_id)] = (total_amount + payment.amount, payments_count + 1)
+
+        await self.operations_repository.create_operations(OperationTypes.payment, initiator_id, comments)
+        await self.stats_repository.add_payments(totals)
+
+        return [report[row_number] for row_number in sorted(report)]
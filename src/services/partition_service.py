@@ -0,0 +1,115 @@
+import datetime
+
+from pathlib import Path
+from typing import List
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config_data import constants
+from config_data.config import Config, load_config
+from src import database
+from src.repositories import operations_repository as operations_repo
+from utils.export_writer import save_gzip, write_csv
+
+settings: Config = load_config(".env")
+partitions_config = settings.partitions
+
+# pg_advisory locks: workers starting together create partitions one at a time, archive runs never overlap
+CREATE_PARTITIONS_LOCK_ID = 0x6F70732D6E6577
+ARCHIVE_PARTITIONS_LOCK_ID = 0x6F70732D617263
+
+
+def add_months(month: datetime.date, months: int) -> datetime.date:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def current_month() -> datetime.date:
+    # created_at is stored in UTC without a time zone
+    return datetime.datetime.now(datetime.timezone.utc).date().replace(day=1)
+
+
+def partition_name(month: datetime.date) -> str:
+    return f"operations_p{month:%Y_%m}"
+
+
+def partition_month(name: str) -> datetime.date:
+    return datetime.datetime.strptime(name, "operations_p%Y_%m").date()
+
+
+class PartitionService:
+    """Keeps a partition of operations for every coming month and archives the months past the retention.
+
+    Old months are removed by dropping their partition rather than by DELETE, which leaves no dead
+    rows for vacuum and no bloated indexes behind.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.operations_repository = operations_repo.OperationsRepository(session)
+
+    async def create_future_partitions(self, months_ahead: int = partitions_config.months_ahead) -> List[str]:
+        """Creates the missing partitions from the current month to months_ahead months later."""
+        await self.session.execute(select(func.pg_advisory_xact_lock(CREATE_PARTITIONS_LOCK_ID)))
+        existing = {partition.name for partition in await self.operations_repository.get_operations_partitions()}
+
+        created = []
+        for offset in range(months_ahead + 1):
+            start = add_months(current_month(), offset)
+            name = partition_name(start)
+            if name not in existing:
+                await self.operations_repository.create_operations_partition(name, start, add_months(start, 1))
+                created.append(name)
+        await self.session.commit()
+
+        return created
+
+    async def archive_expired_partitions(
+            self,
+            retention_months: int = partitions_config.retention_months,
+            archive_dir: Path = partitions_config.archive_dir
+    ) -> List[Path]:
+        """Detaches every month older than retention_months, saves it to archive_dir/<partition>.csv.gz and drops it.
+
+        A run that was interrupted is picked up by the next one: detached tables are still archived and dropped.
+        """
+        if retention_months <= 0:
+            return []
+        oldest_kept = add_months(current_month(), -retention_months)
+        archive_dir.mkdir(parents=True, exist_ok=True)
+
+        archived = []
+        async with database.engine.connect() as connection:
+            # DETACH ... CONCURRENTLY cannot run inside a transaction block
+            connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+            await connection.execute(select(func.pg_advisory_lock(ARCHIVE_PARTITIONS_LOCK_ID)))
+            try:
+                async with AsyncSession(bind=connection) as detaching_session:
+                    detaching_repository = operations_repo.OperationsRepository(detaching_session)
+                    for partition in await detaching_repository.get_operations_partitions():
+                        if partition_month(partition.name) >= oldest_kept:
+                            continue
+                        if partition.attached or partition.detach_pending:
+                            await detaching_repository.detach_operations_partition(
+                                partition.name, finalize=partition.detach_pending
+                            )
+                        archived.append(await self._archive_partition(partition.name, archive_dir))
+            finally:
+                await connection.execute(select(func.pg_advisory_unlock(ARCHIVE_PARTITIONS_LOCK_ID)))
+
+        if archived:
+            await self.operations_repository.analyze_operations()
+            await self.session.commit()
+
+        return archived
+
+    async def _archive_partition(self, name: str, archive_dir: Path) -> Path:
+        path = archive_dir / f"{name}.csv.gz"
+        result = await self.operations_repository.stream_operations_partition(name)
+        await save_gzip(path, write_csv(constants.OPERATIONS_ARCHIVE_HEADER, result.partitions()))
+        await self.operations_repository.drop_operations_partition(name)
+        await self.session.commit()
+
+        return path
+
@@ -0,0 +1,63 @@
+import uuid
+
+from typing import List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.repositories import stats_repository as stats_repo
+from src.schemas import SemesterStatsResponse, GroupStatsResponse, GroupSemesterStatsResponse, ArrearsResponse
+from src.services.infra_service import InfraService
+from utils.pagination import encode_cursor, decode_cursor
+
+
+class StatsService:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.stats_repository = stats_repo.StatsRepository(session)
+
+    async def get_semester_stats(self) -> List[SemesterStatsResponse]:
+        rows = await self.stats_repository.get_semester_stats()
+        return [SemesterStatsResponse.model_validate(row) for row in rows]
+
+    async def get_group_stats(self) -> List[GroupStatsResponse]:
+        rows = await self.stats_repository.get_group_stats()
+        return [GroupStatsResponse.model_validate(row) for row in rows]
+
+    async def get_group_semester_stats(
+            self, group_id: Optional[uuid.UUID] = None, semester_id: Optional[uuid.UUID] = None
+    ) -> List[GroupSemesterStatsResponse]:
+        rows = await self.stats_repository.get_group_semester_stats(group_id, semester_id)
+        return [GroupSemesterStatsResponse.model_validate(row) for row in rows]
+
+    async def get_arrears_page(
+            self,
+            semester_id: uuid.UUID,
+            limit: int,
+            expected_amount: Optional[float] = None,
+            group_id: Optional[uuid.UUID] = None,
+            after: Optional[str] = None
+    ) -> Tuple[List[ArrearsResponse], Optional[str]]:
+        semester = await InfraService(self.session).get_semester_by_id(semester_id)
+        after_key = None
+        if after is not None:
+            after_key = tuple(decode_cursor(after, str, uuid.UUID))
+
+        rows = await self.stats_repository.get_arrears(semester.id, limit + 1, expected_amount, group_id, after_key)
+        arrears = [
+            ArrearsResponse(
+                **row._mapping,
+                debt_amount=None if expected_amount is None else expected_amount - row.paid_amount
+            )
+            for row in rows[:limit]
+        ]
+        if len(rows) <= limit:
+            return arrears, None
+
+        last_row = arrears[-1]
+        return arrears, encode_cursor((last_row.surname, last_row.user_id))
+
+    async def rebuild(self) -> int:
+        buckets = await self.stats_repository.rebuild()
+        await self.session.commit()
+
+        return buckets
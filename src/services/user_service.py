@@ -1,31 +1,51 @@
 import uuid
 import jwt
 
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Dict, Set, AsyncIterable
 from fastapi import Depends, UploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import ValidationError
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 from src.models import User, Roles, OperationTypes
-from src.schemas import UserCreate, TokenData, UserLogin, UserEdit
+from src.schemas import UserCreate, TokenData, UserLogin, UserEdit, UserImportResponse, UserImportRowResponse, \
+    UserPrincipal, UserSearchResponse
 from src.exceptions import CredentialException, TokenTypeException, AlreadyExistException, NotFoundException, \
-    AccessException, IncorrectFileFormatException, ErrorLoadFileException
+    AccessException, IncorrectFileFormatException, FileTooLargeException, ErrorLoadFileException
 from src.repositories import (
     user_repository as user_repo,
     infra_repository as infra_repo,
-    operations_repository as operations_repo
+    operations_repository as operations_repo,
+    stats_repository as stats_repo
 )
 
+from src.database import get_session
+
 from config_data import constants
-from utils import auth_settings
+from config_data.config import Config, load_config
+from utils import auth_settings, password_hashing, metrics
+from utils.cache import SharedTTLCache
 from utils.excel_parser import Parser as XlsxParser
+from utils.pagination import encode_cursor, decode_cursor
 
+settings: Config = load_config(".env")
+import_config = settings.usersImport
 http_bearer = HTTPBearer()
 
+# Per-process cache of authenticated principals; every write that changes a principal invalidates it in all workers
+principal_cache = SharedTTLCache(
+    "principal", settings.cache.principal_size, settings.cache.principal_ttl, key_type=uuid.UUID
+)
+metrics.register("principal_cache", principal_cache.metrics)
+
 
 class UserService:
-    user_repository = user_repo.UserRepository()
-    infra_repository = infra_repo.InfraRepository()
-    operations_repository = operations_repo.OperationsRepository()
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.user_repository = user_repo.UserRepository(session)
+        self.infra_repository = infra_repo.InfraRepository(session)
+        self.operations_repository = operations_repo.OperationsRepository(session)
+        self.stats_repository = stats_repo.StatsRepository(session)
 
     @staticmethod
     def validate_role(current_role: Roles, expected_roles: Tuple[Roles, ...]) -> bool:
@@ -37,12 +57,12 @@ class UserService:
         user = await self.user_repository.get_user_by_login(user_data.login)
         if not user:
             raise CredentialException()
-        if not auth_settings.validate_password(user_data.password, user.password_hash):
+        if not await password_hashing.password_hasher.verify(user_data.password, user.password_hash):
             raise CredentialException()
 
         return user
 
-    async def validate_user(self, expected_token_type: str, token: str | bytes) -> User:
+    async def validate_user(self, expected_token_type: str, token: str | bytes) -> UserPrincipal:
 
         try:
             payload = auth_settings.decode_jwt(token=token)
@@ -60,17 +80,20 @@ class UserService:
         except jwt.ExpiredSignatureError:
             raise CredentialException()
 
-        user = await self.user_repository.get_user_by_id(token_data.uid)
-        if user is None:
-            raise CredentialException()
+        principal = principal_cache.get(token_data.uid)
+        if principal is None:
+            principal = await self.user_repository.get_principal_by_id(token_data.uid)
+            if principal is None:
+                raise CredentialException()
+            principal_cache.set(principal.id, principal)
 
-        return user
+        return principal
 
-    async def get_user_by_id(self, user_id: uuid.UUID) -> User:
-        return await self.user_repository.get_user_by_id(user_id)
+    async def get_user_by_id(self, user_id: uuid.UUID, with_transactions: bool = False) -> User:
+        return await self.user_repository.get_user_by_id(user_id, with_transactions)
 
-    async def get_student_by_id(self, student_id: uuid.UUID) -> User:
-        student = await self.user_repository.get_user_by_id(student_id)
+    async def get_student_by_id(self, student_id: uuid.UUID, with_transactions: bool = False) -> User:
+        student = await self.user_repository.get_user_by_id(student_id, with_transactions)
         if student is None or student.role != Roles.student:
             raise NotFoundException(constants.USER_NOT_FOUND_MESSAGE)
         return student
@@ -81,20 +104,29 @@ class UserService:
     async def get_all_users(self) -> List[User]:
         return await self.user_repository.get_all_users()
 
-    async def get_current_user_for_refresh(
-            self,
-            token: HTTPAuthorizationCredentials = Depends(http_bearer)
-    ) -> User:
-        return await self.validate_user(expected_token_type=constants.REFRESH_TOKEN_TYPE, token=token.credentials)
-
-    async def get_current_user(
+    async def search_users_page(
             self,
-            token: HTTPAuthorizationCredentials = Depends(http_bearer)
-    ) -> User:
-        return await self.validate_user(expected_token_type=constants.ACCESS_TOKEN_TYPE, token=token.credentials)
+            text: str,
+            limit: int,
+            role: Optional[Roles] = None,
+            group_id: Optional[uuid.UUID] = None,
+            after: Optional[str] = None
+    ) -> Tuple[List[UserSearchResponse], Optional[str]]:
+        after_key = None
+        if after is not None:
+            after_key = tuple(decode_cursor(after, float, uuid.UUID))
+
+        rows = await self.user_repository.search_users(text.strip().lower(), limit + 1, role, group_id, after_key)
+        users = [UserSearchResponse.model_validate(row) for row in rows[:limit]]
+        if len(rows) <= limit:
+            return users, None
+
+        last_user = users[-1]
+        return users, encode_cursor((last_user.rank, last_user.id))
 
     async def create_user(self, user: UserCreate, initiator_id: uuid.UUID) -> User:
-        if await self.user_repository.get_user_by_login(user.login) is not None:
+        created_user = await self.user_repository.create_user(user)
+        if created_user is None:
             raise AlreadyExistException(constants.ALREADY_EXIST_USER_MESSAGE)
         await self.operations_repository.create_operation(
             operation_type=OperationTypes.user,
@@ -103,37 +135,102 @@ class UserService:
                 name=user.name, surname=user.surname, patronymic=user.patronymic, role=user.role.value
             )
         )
+        await self.session.commit()
 
-        return await self.user_repository.create_user(user)
+        return created_user
 
-    async def load_users_from_file(self, xlsx_file: UploadFile, initiator_id: uuid.UUID) -> List[User]:
+    async def load_users_from_file(self, xlsx_file: UploadFile, initiator_id: uuid.UUID) -> UserImportResponse:
         if not xlsx_file.filename.endswith('.xlsx'):
             raise IncorrectFileFormatException()
+        if xlsx_file.size is not None and xlsx_file.size > import_config.max_file_size:
+            await xlsx_file.close()
+            raise FileTooLargeException(import_config.max_file_size)
 
+        xlsx_parser = XlsxParser(xlsx_file, chunk_size=import_config.batch_size)
         try:
-            xlsx_parser = XlsxParser(xlsx_file)
-            users = xlsx_parser.parse_users()
-        except Exception:
+            return await self.import_users(xlsx_parser.parse_users(), initiator_id)
+        finally:
             await xlsx_file.close()
-            raise ErrorLoadFileException()
 
-        users_create_response: List[User] = []
-        for user in users:
-            try:
-                new_user = await self.user_repository.create_user(UserCreate(**user))
-                users_create_response.append(new_user)
-            except Exception:
-                continue
+    async def import_users(
+            self, chunks: AsyncIterable[List[Tuple[int, Dict]]], initiator_id: uuid.UUID
+    ) -> UserImportResponse:
+        """Create users chunk by chunk from (row number, fields) pairs and report every row.
 
+        Every chunk is committed on its own. If the file cannot be read past some chunk, the rows
+        loaded so far are reported with the first row that was not loaded, so the rest can be uploaded again.
+        """
+        rows: List[UserImportRowResponse] = []
+        seen_logins: Set[str] = set()
+        try:
+            async for chunk in chunks:
+                rows.extend(await self._import_users_chunk(chunk, seen_logins))
+                await self.session.commit()
+        except ErrorLoadFileException:
+            if not rows:
+                raise
+            await self.session.rollback()
+            rows.append(UserImportRowResponse(
+                row=max(row.row for row in rows) + 1, accepted=False, detail=constants.IMPORT_STOPPED_MESSAGE
+            ))
+
+        accepted_count = sum(row.accepted for row in rows)
         await self.operations_repository.create_operation(
             operation_type=OperationTypes.user,
             user_id=initiator_id,
-            comment=constants.LOAD_USERS_COMMENT.format(count=len(users_create_response))
+            comment=constants.LOAD_USERS_COMMENT.format(count=accepted_count)
         )
+        await self.session.commit()
+
+        return UserImportResponse(accepted=accepted_count, rejected=len(rows) - accepted_count, rows=rows)
 
-        await xlsx_file.close()
+    async def _import_users_chunk(
+            self, chunk: List[Tuple[int, Dict]], seen_logins: Set[str]
+    ) -> List[UserImportRowResponse]:
+        report: Dict[int, UserImportRowResponse] = {}
+        candidates: Dict[str, Tuple[int, UserCreate]] = {}
+        for row_number, row in chunk:
+            try:
+                user = UserCreate(**row)
+            except ValidationError:
+                report[row_number] = UserImportRowResponse(
+                    row=row_number, login=row.get("login"), accepted=False,
+                    detail=constants.INVALID_IMPORT_ROW_MESSAGE
+                )
+                continue
 
-        return users_create_response
+            if user.login in seen_logins:
+                report[row_number] = UserImportRowResponse(
+                    row=row_number, login=user.login, accepted=False,
+                    detail=constants.DUPLICATE_IMPORT_LOGIN_MESSAGE
+                )
+                continue
+            seen_logins.add(user.login)
+            candidates[user.login] = (row_number, user)
+
+        existing_logins = await self.user_repository.get_existing_logins(candidates.keys())
+        for login in existing_logins:
+            row_number, _ = candidates.pop(login)
+            report[row_number] = UserImportRowResponse(
+                row=row_number, login=login, accepted=False, detail=constants.ALREADY_EXIST_USER_MESSAGE
+            )
+
+        accepted_users = list(candidates.values())
+        password_hashes = await password_hashing.hash_passwords_parallel(
+            [user.password for _, user in accepted_users]
+        )
+        created_users = await self.user_repository.create_users([
+            {**user.model_dump(exclude={"password"}), "id": uuid.uuid4(), "password_hash": password_hash}
+            for (_, user), password_hash in zip(accepted_users, password_hashes)
+        ])
+        for row_number, user in accepted_users:
+            user_id = created_users.get(user.login)
+            report[row_number] = UserImportRowResponse(
+                row=row_number, login=user.login, accepted=user_id is not None, user_id=user_id,
+                detail=None if user_id is not None else constants.ALREADY_EXIST_USER_MESSAGE
+            )
+
+        return [report[row_number] for row_number in sorted(report)]
 
     async def edit_user(self, user_id: uuid.UUID, new_user_data: UserEdit, initiator_id: uuid.UUID) -> User:
         user = await self.get_user_by_id(user_id)
@@ -146,7 +243,11 @@ class UserService:
                 name=user.name, surname=user.surname, patronymic=user.patronymic
             )
         )
-        return await self.user_repository.edit_user(user.id, new_user_data)
+        edited_user = await self.user_repository.edit_user(user.id, new_user_data)
+        await self.session.commit()
+        principal_cache.invalidate(user.id)
+
+        return edited_user
 
     async def delete_user(self, user_id: uuid.UUID, initiator_id: uuid.UUID) -> None:
         user = await self.get_user_by_id(user_id)
@@ -162,4 +263,25 @@ class UserService:
                 name=user.name, surname=user.surname, patronymic=user.patronymic, role=user.role.value
             )
         )
-        return await self.user_repository.delete_user(user_id)
+        await self.stats_repository.remove_user_payments(user.id, user.group_id)
+        await self.user_repository.delete_user(user_id)
+        await self.session.commit()
+        principal_cache.invalidate(user_id)
+
+
+async def get_current_user_for_refresh(
+        token: HTTPAuthorizationCredentials = Depends(http_bearer),
+        session: AsyncSession = Depends(get_session)
+) -> UserPrincipal:
+    return await UserService(session).validate_user(
+        expected_token_type=constants.REFRESH_TOKEN_TYPE, token=token.credentials
+    )
+
+
+async def get_current_user(
+        token: HTTPAuthorizationCredentials = Depends(http_bearer),
+        session: AsyncSession = Depends(get_session)
+) -> UserPrincipal:
+    return await UserService(session).validate_user(
+        expected_token_type=constants.ACCESS_TOKEN_TYPE, token=token.credentials
+    )
@@ -0,0 +1,58 @@
+"""The batched journal never buffers past max_queue and drops only rows of deleted initiators."""
+import uuid
+
+import pytest
+
+from sqlalchemy import func, select
+
+from src.models import Operation, OperationTypes
+from src.repositories.operations_repository import OperationsRepository
+from utils.audit_log import audit_log, BATCHED_MODE
+
+
+@pytest.fixture
+def batched_audit(monkeypatch):
+    monkeypatch.setattr(audit_log, "mode", BATCHED_MODE)
+    monkeypatch.setattr(audit_log, "_queue", [])
+
+
+def operation(user_id: uuid.UUID, operation_id: uuid.UUID = None) -> dict:
+    return {"id": operation_id or uuid.uuid4(), "type": OperationTypes.user, "user_id": user_id, "comment": "audit"}
+
+
+async def count_operations(sessions) -> int:
+    async with sessions() as session:
+        return await session.scalar(select(func.count()).select_from(Operation))
+
+
+async def test_full_queue_writes_in_the_request(sessions, seed, batched_audit, monkeypatch):
+    monkeypatch.setattr(audit_log, "max_queue", 1)
+    audit_log._queue.append(operation(seed["admin"].id))
+
+    async with sessions() as session:
+        await OperationsRepository(session).create_operation(OperationTypes.user, seed["admin"].id, "in request")
+        await session.commit()
+
+    assert len(audit_log._queue) == 1
+    assert await count_operations(sessions) == 1
+
+
+async def test_flush_drops_only_rows_of_deleted_initiators(sessions, seed, batched_audit):
+    audit_log._queue.extend([operation(seed["admin"].id), operation(uuid.uuid4()), operation(seed["admin"].id)])
+
+    await audit_log.flush()
+
+    assert audit_log._queue == []
+    assert await count_operations(sessions) == 2
+
+
+async def test_flush_keeps_rows_it_could_not_write(sessions, seed, batched_audit):
+    written = operation(seed["admin"].id)
+    # the same id again: a unique violation, not a deleted initiator
+    rejected, pending = operation(seed["admin"].id, written["id"]), operation(seed["admin"].id)
+    audit_log._queue.extend([written, rejected, pending])
+
+    await audit_log.flush()
+
+    assert audit_log._queue == [rejected, pending]
+    assert await count_operations(sessions) == 1
@@ -0,0 +1,62 @@
+"""ETags are built from the entity_versions rows, so every worker issues the same tag for the same data."""
+from utils.invalidation import invalidation_bus
+from utils.versions import EntityVersions, entity_versions, parse_version, USERS, GROUPS, TRANSACTIONS
+
+ENTITIES = (USERS, GROUPS, TRANSACTIONS)
+
+
+async def commit_change(sessions, *entities: str) -> None:
+    async with sessions() as session:
+        entity_versions.touch(session, *entities)
+        await session.commit()
+
+
+async def test_workers_issue_the_same_tag_without_the_bus(sessions):
+    await commit_change(sessions, USERS, GROUPS)
+    await commit_change(sessions, USERS)
+
+    # another worker, or this one after a restart
+    restarted = EntityVersions(ENTITIES)
+    async with sessions() as session:
+        tag = await entity_versions.etag(session, USERS, GROUPS)
+        assert await restarted.etag(session, USERS, GROUPS) == tag == 'W/"2-1"'
+
+        await commit_change(sessions, GROUPS)
+        assert await restarted.etag(session, USERS, GROUPS) == 'W/"2-2"'
+
+
+async def test_workers_that_saw_the_same_changes_issue_the_same_tag(sessions, monkeypatch):
+    monkeypatch.setattr(invalidation_bus, "_connected", True)
+    first, second = EntityVersions(ENTITIES), EntityVersions(ENTITIES)
+    async with sessions() as session:
+        await first.etag(session, USERS)
+        await second.etag(session, USERS)
+
+    # published by the workers that committed them, the messages may arrive in any order
+    messages = ["users:1", "transactions:1", "users:2"]
+    for key in messages:
+        first.invalidate(parse_version(key), broadcast=False)
+    for key in reversed(messages):
+        second.invalidate(parse_version(key), broadcast=False)
+
+    async with sessions() as session:
+        tags = await first.etag(session, USERS, TRANSACTIONS), await second.etag(session, USERS, TRANSACTIONS)
+        assert tags == ('W/"2-1"', 'W/"2-1"')
+        # answered from memory while the bus is connected
+        assert not session.in_transaction()
+
+
+async def test_values_are_read_again_after_the_bus_reconnects(sessions, monkeypatch):
+    monkeypatch.setattr(invalidation_bus, "_connected", True)
+    worker = EntityVersions(ENTITIES)
+    async with sessions() as session:
+        assert await worker.etag(session, USERS) == 'W/"0"'
+
+    # committed while the connection was down, its message is lost
+    worker.clear(broadcast=False)
+    monkeypatch.setattr(invalidation_bus, "_reconnects", invalidation_bus.reconnects + 1)
+    await commit_change(sessions, USERS)
+
+    async with sessions() as session:
+        assert await worker.etag(session, USERS) == 'W/"1"'
+    assert worker.synced
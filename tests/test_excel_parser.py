@@ -0,0 +1,52 @@
+import asyncio
+import threading
+
+import pytest
+
+from utils.excel_parser import Parser
+
+
+async def test_cancelled_reader_closes_the_file_after_the_pending_read():
+    reading = threading.Event()
+    release = threading.Event()
+    closed = threading.Event()
+
+    def chunks():
+        try:
+            yield [(2, {})]
+            reading.set()
+            release.wait(5)
+            yield [(3, {})]
+        finally:
+            closed.set()
+
+    async def consume():
+        async for _ in Parser._read_chunks(chunks()):
+            pass
+
+    consumer = asyncio.create_task(consume())
+    await asyncio.get_running_loop().run_in_executor(None, reading.wait, 5)
+    consumer.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await consumer
+    assert not closed.is_set()
+
+    release.set()
+    await asyncio.get_running_loop().run_in_executor(None, closed.wait, 5)
+    assert closed.is_set()
+
+
+async def test_reader_closes_the_file_when_the_consumer_stops_early():
+    closed = threading.Event()
+
+    def chunks():
+        try:
+            yield [(2, {})]
+            yield [(3, {})]
+        finally:
+            closed.set()
+
+    reader = Parser._read_chunks(chunks())
+    assert await reader.__anext__() == [(2, {})]
+    await reader.aclose()
+    assert closed.is_set()
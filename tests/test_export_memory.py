@@ -0,0 +1,99 @@
+"""/operations/export_transactions streams: the RSS stays flat however many rows the export reads.
+
+EXPORT_MEMORY_ROWS seeds more rows (benchmarks/export_memory.py exports a million from Postgres); the default
+is about the fewest at which an export holding every row would cross MAX_GROWTH_MB.
+"""
+import asyncio
+import os
+
+from typing import Tuple
+
+import pytest
+
+from sqlalchemy import text
+
+from benchmarks.export_memory import RSSSampler, current_rss
+from main import app
+
+from tests.conftest import auth_headers
+
+ROWS = int(os.environ.get("EXPORT_MEMORY_ROWS", 50000))
+STUDENTS = 1000
+# the export grows the RSS by about 10 MB however many rows it reads; holding 50k rows at once takes 35-45 MB
+MAX_GROWTH_MB = 24
+
+SEED_USERS = (
+    "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < :students) "
+    "INSERT INTO users (id, name, surname, role, patronymic, phone, login, group_id, password_hash, created_at) "
+    "SELECT lower(hex(randomblob(16))), 'Имя', 'Фамилия-' || i, 'student', 'Отчество', '0', 'export-student-' || i, "
+    ":group_id, x'00', '2026-09-01 00:00:00' FROM n"
+)
+SEED_TRANSACTIONS = (
+    "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < :rows) "
+    "INSERT INTO transactions (id, user_id, semester_id, amount, comment, created_at) "
+    "SELECT lower(hex(randomblob(16))), u.id, :semester_id, 1000.5, 'Оплата обучения за семестр', "
+    "'2026-09-01 00:00:00' FROM n JOIN users u ON u.login = 'export-student-' || (i % :students + 1)"
+)
+
+
+async def stream(path: str, query: str, headers: dict) -> Tuple[int, int]:
+    """Sends a GET to the app and counts the body bytes as they are sent, keeping none of them.
+
+    httpx's ASGITransport collects the whole body before it returns, which is what this checks against.
+    """
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+        "server": ("test", 80), "client": ("test", 1),
+    }
+    status, size = 0, 0
+    received = False
+    completed = asyncio.Event()
+
+    async def receive() -> dict:
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await completed.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict) -> None:
+        nonlocal status, size
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+            if not message.get("more_body", False):
+                completed.set()
+
+    await app(scope, receive, send)
+    return status, size
+
+
+@pytest.mark.parametrize("export_format", ["csv", "xlsx"])
+async def test_export_streams_without_growing_the_rss(export_format, sessions, seed):
+    semester_id = seed["semester"].id
+    path, query = "/operations/export_transactions", f"format={export_format}&semester_id={semester_id}"
+    headers = auth_headers(seed["admin"])
+    # imports the writer and warms up the app on the two seeded payments; a warm-up as large as the
+    # measured export would leave freed memory behind that a buffering export could reuse unnoticed
+    assert (await stream(path, query, headers))[0] == 200
+
+    # seeded in SQL: rows built in Python would leave freed memory behind for the export to reuse
+    async with sessions() as session:
+        await session.execute(text(SEED_USERS), {"students": STUDENTS, "group_id": seed["group"].id.hex})
+        await session.execute(text(SEED_TRANSACTIONS), {
+            "rows": ROWS, "students": STUDENTS, "semester_id": semester_id.hex
+        })
+        await session.commit()
+
+    baseline = current_rss()
+    sampler = RSSSampler()
+    sampler.start()
+    status, size = await stream(path, query, headers)
+    growth_mb = (sampler.stop() - baseline) / 2 ** 20
+
+    assert status == 200
+    assert growth_mb < MAX_GROWTH_MB, f"{size / 2 ** 20:.1f} MB export grew the RSS by {growth_mb:.1f} MB"
@@ -0,0 +1,50 @@
+import pytest
+
+from sqlalchemy import func, select
+
+from config_data import constants
+from src.exceptions import ErrorLoadFileException
+from src.models import User, Operation
+from src.services.user_service import UserService
+from utils import password_hashing
+
+
+def student_row(i: int) -> dict:
+    return {"surname": f"Surname {i}", "name": f"Name {i}", "patronymic": "Patronymic", "role": "student",
+            "phone": "0", "login": f"imported-{i}", "password": "password"}
+
+
+async def chunks_then_error(*chunks):
+    for chunk in chunks:
+        yield chunk
+    raise ErrorLoadFileException()
+
+
+@pytest.fixture(autouse=True)
+def hash_pool():
+    yield
+    password_hashing.shutdown_process_pool()
+
+
+async def test_unreadable_file_tail_reports_the_rows_already_loaded(seed, sessions):
+    chunks = chunks_then_error([(2, student_row(2)), (3, student_row(3))], [(4, student_row(4)), (5, {"login": None})])
+
+    async with sessions() as session:
+        report = await UserService(session).import_users(chunks, seed["admin"].id)
+
+    assert (report.accepted, report.rejected) == (3, 2)
+    assert [(row.row, row.accepted) for row in report.rows] == [(2, True), (3, True), (4, True), (5, False), (6, False)]
+    assert report.rows[-1].detail == constants.IMPORT_STOPPED_MESSAGE
+    async with sessions() as session:
+        assert await session.scalar(select(func.count()).where(User.login.startswith("imported-"))) == 3
+        comments = (await session.scalars(select(Operation.comment))).all()
+    assert comments == [constants.LOAD_USERS_COMMENT.format(count=3)]
+
+
+async def test_unreadable_file_raises_when_nothing_was_loaded(seed, sessions):
+    async with sessions() as session:
+        with pytest.raises(ErrorLoadFileException):
+            await UserService(session).import_users(chunks_then_error(), seed["admin"].id)
+
+    async with sessions() as session:
+        assert await session.scalar(select(func.count()).select_from(Operation)) == 0
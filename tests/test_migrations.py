@@ -0,0 +1,25 @@
+from alembic.script import ScriptDirectory
+from sqlalchemy import text
+
+from utils import migrations
+
+# the revision that builds its indexes with CREATE INDEX CONCURRENTLY in an autocommit block
+CONCURRENT_INDEXES_REVISION = "b41d8e07c3a5"
+
+
+async def test_migrate_reaches_heads_with_valid_indexes(postgres):
+    await migrations.check_revision()
+
+    script = ScriptDirectory.from_config(migrations.get_alembic_config())
+    expected = {name for name, *_ in script.get_revision(CONCURRENT_INDEXES_REVISION).module.INDEXES}
+    async with postgres.connect() as connection:
+        existing = set((await connection.execute(
+            text("SELECT indexname FROM pg_indexes WHERE indexname = ANY(:names)"), {"names": sorted(expected)}
+        )).scalars())
+        # an index whose concurrent build failed stays behind marked invalid
+        invalid = (await connection.execute(text(
+            "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE NOT i.indisvalid"
+        ))).scalars().all()
+
+    assert existing == expected
+    assert invalid == []
@@ -0,0 +1,24 @@
+"""Creating or renaming a group or semester to a taken name is answered with AlreadyExistException."""
+import pytest
+
+from config_data import constants
+
+from tests.conftest import auth_headers
+
+
+@pytest.mark.parametrize("entity, message", [
+    ("group", constants.ALREADY_EXIST_GROUP_MESSAGE),
+    ("semester", constants.ALREADY_EXIST_SEMESTER_MESSAGE),
+])
+async def test_taken_name_is_a_conflict(entity, message, seed, client):
+    headers = auth_headers(seed["admin"])
+    taken_name = seed[entity].name
+
+    created = await client.post(f"/infra/new_{entity}", params={f"{entity}_name": taken_name}, headers=headers)
+    other = await client.post(f"/infra/new_{entity}", params={f"{entity}_name": "Other"}, headers=headers)
+    renamed = await client.put(
+        f"/infra/edit_{entity}/{other.json()['id']}", params={f"new_{entity}_name": taken_name}, headers=headers
+    )
+
+    assert (created.status_code, created.json()["detail"]) == (400, message)
+    assert (renamed.status_code, renamed.json()["detail"]) == (400, message)
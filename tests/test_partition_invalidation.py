@@ -0,0 +1,36 @@
+"""Dropping an archived month tells the API workers that operations changed, also from manage.py."""
+import json
+
+from sqlalchemy import event, text
+
+from src import database
+from src.repositories.operations_repository import OperationsRepository
+from utils.invalidation import CHANNEL
+from utils.versions import entity_versions, OPERATIONS
+
+
+async def test_dropping_a_partition_notifies_the_workers_on_commit(sessions):
+    notifications = []
+
+    @event.listens_for(database.engine.sync_engine, "connect")
+    def add_pg_notify(dbapi_connection, connection_record) -> None:
+        dbapi_connection.create_function("pg_notify", 2, lambda channel, payload: notifications.append(
+            (channel, json.loads(payload))
+        ))
+
+    # connections opened before the listener have no pg_notify
+    await database.engine.dispose()
+    async with sessions() as session:
+        await session.execute(text("CREATE TABLE operations_p2020_01 (id INTEGER)"))
+        await session.commit()
+
+    version = entity_versions.version(OPERATIONS)
+    async with sessions() as session:
+        await OperationsRepository(session).drop_operations_partition("operations_p2020_01")
+        assert entity_versions.version(OPERATIONS) == version
+        await session.commit()
+
+    assert [(channel, message["cache"], message["key"]) for channel, message in notifications] == [
+        (CHANNEL, "versions", f"{OPERATIONS}:{version + 1}")
+    ]
+    assert entity_versions.version(OPERATIONS) == version + 1
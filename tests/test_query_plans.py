@@ -0,0 +1,182 @@
+"""EXPLAIN every selective repository query on a seeded Postgres and fail on sequential scans.
+
+Seeds the TEST_DATABASE_URL database with rows under the "explain-" prefix, runs each repository call in a
+transaction that is rolled back and EXPLAINs every statement it issued with its real parameters. Queries
+that read whole tables on purpose (get_all_users, get_all_students, ...) are not checked.
+"""
+import datetime
+import json
+
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Tuple
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from src.repositories.infra_repository import InfraRepository
+from src.repositories.operations_repository import OperationsRepository
+from src.repositories.stats_repository import StatsRepository
+from src.repositories.user_repository import UserRepository
+
+PREFIX = "explain-"
+WATCHED_TABLES = {"users", "transactions", "operations"}
+# large enough that the planner prefers an index wherever one applies
+SEED_PARAMS = {"prefix": PREFIX, "students": 40000, "semesters": 6, "groups": 200, "operations": 200000}
+
+SEED_STATEMENTS = (
+    "INSERT INTO groups (id, name, created_at) "
+    "SELECT gen_random_uuid(), :prefix || 'group-' || g, now() FROM generate_series(1, :groups) g",
+    "INSERT INTO semesters (id, name, created_at) "
+    "SELECT gen_random_uuid(), :prefix || 'semester-' || s, now() FROM generate_series(1, :semesters) s",
+    "INSERT INTO users (id, name, surname, role, patronymic, phone, login, group_id, password_hash, created_at) "
+    "SELECT gen_random_uuid(), 'Admin', 'Admin', 'admin', 'Admin', '0', :prefix || 'admin', NULL, '\\x00', now()",
+    "INSERT INTO users (id, name, surname, role, patronymic, phone, login, group_id, password_hash, created_at) "
+    "SELECT gen_random_uuid(), 'Name', 'Surname-' || (i % 5000), 'student', 'Patronymic', '0', "
+    ":prefix || 'student-' || i, g.id, '\\x00', now() "
+    "FROM generate_series(1, :students) i "
+    "LEFT JOIN groups g ON g.name = :prefix || 'group-' || (i % (:groups + 1))",
+    "INSERT INTO transactions (id, user_id, semester_id, amount, comment, created_at) "
+    "SELECT gen_random_uuid(), u.id, s.id, 1000, 'explain', now() "
+    "FROM users u CROSS JOIN semesters s "
+    "WHERE u.login LIKE :prefix || 'student-%' AND s.name LIKE :prefix || '%' AND random() < 0.8",
+    # inside the current month, which always has a partition
+    "INSERT INTO operations (id, type, user_id, comment, created_at) "
+    "SELECT gen_random_uuid(), 'payment', u.id, 'explain', "
+    "date_trunc('month', localtimestamp) + i * interval '1 second' "
+    "FROM generate_series(1, :operations) i CROSS JOIN users u WHERE u.login = :prefix || 'admin'",
+)
+
+CLEANUP_STATEMENTS = (
+    "DELETE FROM users WHERE login LIKE :prefix || '%'",
+    "DELETE FROM groups WHERE name LIKE :prefix || '%'",
+    "DELETE FROM semesters WHERE name LIKE :prefix || '%'",
+)
+
+
+async def run_statements(engine: AsyncEngine, statements) -> None:
+    async with engine.begin() as conn:
+        for statement in statements:
+            await conn.execute(text(statement), SEED_PARAMS)
+
+
+async def vacuum_analyze(engine: AsyncEngine) -> None:
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for table in ("users", "groups", "semesters", "transactions", "operations", "payment_stats"):
+            await conn.execute(text(f"VACUUM ANALYZE {table}"))
+
+
+async def load_sample(engine: AsyncEngine) -> Dict[str, Any]:
+    async with engine.connect() as conn:
+        def scalar(query: str):
+            return conn.scalar(text(query), {"prefix": PREFIX})
+
+        group_id = await scalar("SELECT id FROM groups WHERE name = :prefix || 'group-1'")
+        student = (await conn.execute(text(
+            "SELECT id, login, surname FROM users WHERE login = :prefix || 'student-1'"
+        ), {"prefix": PREFIX})).one()
+        operation = (await conn.execute(text(
+            "SELECT created_at, id FROM operations WHERE comment = 'explain' ORDER BY created_at DESC, id DESC "
+            "OFFSET :offset LIMIT 1"
+        ), {"offset": SEED_PARAMS["operations"] // 2})).one()
+        return {
+            "group_id": group_id,
+            "semester_id": await scalar("SELECT id FROM semesters WHERE name = :prefix || 'semester-1'"),
+            "student_id": student.id,
+            "student_login": student.login,
+            "student_surname": student.surname,
+            "operation_key": (operation.created_at, operation.id),
+            "other_group_id": await scalar("SELECT id FROM groups WHERE name = :prefix || 'group-2'"),
+            "logins": [f"{PREFIX}student-{i}" for i in range(1, 201)],
+        }
+
+
+def repository_cases(sample: Dict[str, Any]) -> Iterator[Tuple[str, Callable[[AsyncSession], Awaitable]]]:
+    yield "UserRepository.get_user_by_login", \
+        lambda s: UserRepository(s).get_user_by_login(sample["student_login"])
+    yield "UserRepository.get_user_by_id(with_transactions)", \
+        lambda s: UserRepository(s).get_user_by_id(sample["student_id"], with_transactions=True)
+    yield "UserRepository.get_principal_by_id", \
+        lambda s: UserRepository(s).get_principal_by_id(sample["student_id"])
+    yield "UserRepository.get_existing_logins", \
+        lambda s: UserRepository(s).get_existing_logins(sample["logins"])
+    yield "UserRepository.search_users", \
+        lambda s: UserRepository(s).search_users(sample["student_surname"].lower(), 50)
+    yield "UserRepository.delete_group_for_users_by_id", \
+        lambda s: UserRepository(s).delete_group_for_users_by_id(sample["group_id"])
+    yield "InfraRepository.get_group_by_id(with_users)", \
+        lambda s: InfraRepository(s).get_group_by_id(sample["group_id"], with_users=True)
+    yield "InfraRepository.get_group_members(semester)", \
+        lambda s: InfraRepository(s).get_group_members(sample["group_id"], 50, sample["semester_id"])
+    yield "OperationsRepository.get_all_operations", \
+        lambda s: OperationsRepository(s).get_all_operations(50)
+    yield "OperationsRepository.get_all_operations(after)", \
+        lambda s: OperationsRepository(s).get_all_operations(50, sample["operation_key"])
+    yield "OperationsRepository.get_all_operations(date range)", \
+        lambda s: OperationsRepository(s).get_all_operations(
+            50, date_from=sample["operation_key"][0] - datetime.timedelta(hours=1), date_to=sample["operation_key"][0]
+        )
+    yield "OperationsRepository.add_user_to_group", \
+        lambda s: OperationsRepository(s).add_user_to_group(sample["student_id"], sample["other_group_id"])
+    yield "StatsRepository.move_user_payments", \
+        lambda s: StatsRepository(s).move_user_payments(
+            sample["student_id"], sample["group_id"], sample["other_group_id"]
+        )
+    yield "StatsRepository.get_arrears(unpaid, group)", \
+        lambda s: StatsRepository(s).get_arrears(sample["semester_id"], 50, group_id=sample["group_id"])
+    yield "StatsRepository.get_arrears(expected, after)", \
+        lambda s: StatsRepository(s).get_arrears(
+            sample["semester_id"], 50, expected_amount=2000,
+            after=(sample["student_surname"], sample["student_id"])
+        )
+
+
+def seq_scans(plan: Dict[str, Any]) -> Iterator[str]:
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in WATCHED_TABLES:
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", ()):
+        yield from seq_scans(child)
+
+
+async def explain_case(engine: AsyncEngine, call: Callable[[AsyncSession], Awaitable]) -> List[str]:
+    statements: List[Tuple[str, Any]] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "INSERT")):
+            statements.append((statement, parameters))
+
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        event.listen(engine.sync_engine, "before_cursor_execute", record)
+        try:
+            async with AsyncSession(bind=conn) as session:
+                await call(session)
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+        problems = []
+        for statement, parameters in statements:
+            result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+            plan = result.scalar_one()
+            plan = (json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]
+            tables = sorted(set(seq_scans(plan)))
+            if tables:
+                problems.append(f"Seq Scan on {', '.join(tables)}: {' '.join(statement.split())[:160]}")
+        await transaction.rollback()
+
+    return problems
+
+
+async def test_selective_queries_use_indexes(postgres):
+    await run_statements(postgres, CLEANUP_STATEMENTS)
+    try:
+        await run_statements(postgres, SEED_STATEMENTS)
+        await vacuum_analyze(postgres)
+        sample = await load_sample(postgres)
+
+        failures = []
+        for name, call in repository_cases(sample):
+            failures.extend(f"{name}: {problem}" for problem in await explain_case(postgres, call))
+    finally:
+        await run_statements(postgres, CLEANUP_STATEMENTS)
+
+    assert failures == []
@@ -0,0 +1,65 @@
+"""User, group and auth endpoints issue a fixed number of SELECTs and load no relationship lazily.
+
+Relationships are lazy="raise", so touching one that a query did not load fails the request. The
+SELECT counts catch the other direction: a relationship made eager again, or a loader option added
+to a query that does not need it, shows up as extra statements.
+"""
+import pytest
+
+from src.services.user_service import principal_cache
+from utils import auth_settings
+
+from tests.conftest import PASSWORD, auth_headers
+
+
+def endpoints(seed):
+    group_id, student_id = seed["group"].id, seed["students"][0].id
+    return {
+        # endpoint: (method, path, query parameters, SELECTs)
+        "own profile": ("GET", "/users/self", None, 2),
+        "all users": ("GET", "/users/all", None, 2),
+        "all students": ("GET", "/users/students", None, 2),
+        "one student": ("GET", "/users/students", {"student_id": str(student_id)}, 2),
+        "all groups": ("GET", "/infra/groups", None, 3),
+        "one group": ("GET", "/infra/groups", {"group_id": str(group_id)}, 3),
+        "groups summary": ("GET", "/infra/groups_summary", None, 1),
+        "group members": ("GET", f"/infra/group_members/{group_id}", None, 2),
+    }
+
+
+@pytest.mark.parametrize("name", [
+    "own profile", "all users", "all students", "one student", "all groups", "one group", "groups summary",
+    "group members",
+])
+async def test_read_endpoint_loads_only_what_it_asks_for(name, seed, client, query_log):
+    method, path, params, expected_selects = endpoints(seed)[name]
+    headers = auth_headers(seed["admin"])
+    # authenticate once so that the counts cover the endpoint and not the principal lookup
+    assert (await client.get("/users/self", headers=headers)).status_code == 200
+    query_log.clear()
+
+    response = await client.request(method, path, params=params, headers=headers)
+
+    assert response.status_code == 200, response.text
+    assert query_log.lazy_loads == []
+    assert len(query_log.selects) == expected_selects, query_log.selects
+
+
+async def test_login_loads_the_user_row_only(seed, client, query_log):
+    response = await client.post("/users/login", json={"login": "admin", "password": PASSWORD})
+
+    assert response.status_code == 200, response.text
+    assert query_log.lazy_loads == []
+    assert len(query_log.selects) == 1, query_log.selects
+
+
+async def test_principal_lookup_loads_the_user_row_only(seed, client, query_log):
+    principal_cache.clear()
+
+    response = await client.post("/users/refresh", headers={
+        "Authorization": f"Bearer {auth_settings.create_refresh_token(seed['admin'])}"
+    })
+
+    assert response.status_code == 200, response.text
+    assert query_log.lazy_loads == []
+    assert len(query_log.selects) == 1, query_log.selects
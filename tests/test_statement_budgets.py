@@ -0,0 +1,22 @@
+"""Write endpoints stay within the statement and commit budgets of benchmarks/count_statements.py,
+below the statements the check-then-insert and re-select path needed for the same calls."""
+import uuid
+
+from benchmarks.count_statements import BUDGETS, StatementCounter, call_endpoints, not_below_baseline, over_budget
+from src import database
+from src.models import User, Roles
+
+
+async def test_write_endpoints_stay_within_budget(sessions, seed, client):
+    # a student out of any group, as the benchmark creates
+    student = User(id=uuid.uuid4(), name="Bench", surname="Bench", patronymic="Bench", role=Roles.student,
+                   phone="0", login="bench-student", password_hash=seed["admin"].password_hash)
+    async with sessions() as session:
+        session.add(student)
+        await session.commit()
+
+    rows = await call_endpoints(client, StatementCounter(database.engine), seed["admin"], student)
+
+    assert {(endpoint, status) for endpoint, status, *_ in rows} == set(BUDGETS)
+    assert [row for row in rows if over_budget(row)] == []
+    assert [row for row in rows if not_below_baseline(row)] == []
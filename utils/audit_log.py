@@ -0,0 +1,178 @@
+import asyncio
+import datetime
+import logging
+
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from config_data.config import Config, load_config
+from src import database
+from src.models import Operation
+from utils import metrics
+from utils.versions import entity_versions, OPERATIONS
+
+SYNC_MODE = "sync"
+BATCHED_MODE = "batched"
+PENDING_OPERATIONS_KEY = "pending_operations"
+FOREIGN_KEY_VIOLATION = "23503"
+
+logger = logging.getLogger(__name__)
+
+settings: Config = load_config(".env")
+audit_config = settings.audit
+
+
+class AuditLog:
+    """Write-behind sink for the operations journal.
+
+    In batched mode an operation is attached to the request session and handed over only when that
+    session commits, so a rolled back change never reaches the journal. Queued rows are written in
+    multi-row INSERTs once batch_size rows are waiting or every flush_interval seconds. In sync mode
+    the repository inserts the row in the request transaction instead, as before. Queued rows are lost
+    if the process dies, so batched mode is opt-in; at most max_queue of them wait, past that requests
+    write their rows themselves.
+    """
+
+    def __init__(self, mode: str, batch_size: int, flush_interval: float, max_queue: int):
+        if mode not in (SYNC_MODE, BATCHED_MODE):
+            raise ValueError(f"Unsupported audit mode: {mode}")
+        self.mode = mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._queue: List[Dict[str, Any]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._closing = False
+        self._written = 0
+        self._batches = 0
+        self._failed_flushes = 0
+        self._dropped = 0
+        self._overflowed = 0
+
+    @property
+    def synchronous(self) -> bool:
+        return self.mode == SYNC_MODE
+
+    def defers(self) -> bool:
+        """Whether a new operation goes to the queue rather than into the request transaction."""
+        if self.synchronous:
+            return False
+        if len(self._queue) >= self.max_queue:
+            # the flushes are failing or falling behind, e.g. while the database is down: do not buffer more
+            self._overflowed += 1
+            return False
+        return True
+
+    def defer(self, session: AsyncSession, operation: Dict[str, Any]) -> None:
+        # created_at is taken now: the row may be written up to flush_interval later
+        operation.setdefault("created_at", datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None))
+        session.info.setdefault(PENDING_OPERATIONS_KEY, []).append(operation)
+
+    def enqueue(self, operations: List[Dict[str, Any]]) -> None:
+        self._queue.extend(operations)
+        if self._task is None:
+            self.start()
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        if self._task is None and not self.synchronous:
+            self._closing = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            while self._queue:
+                batch = self._queue[:self.batch_size]
+                try:
+                    await self._write(batch)
+                except Exception:
+                    # keep the rows queued and retry on the next tick
+                    self._failed_flushes += 1
+                    logger.exception("Failed to write %d audit operations", len(batch))
+                    return
+                del self._queue[:len(batch)]
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> None:
+        async with database.async_session() as session:
+            try:
+                await session.execute(insert(Operation), batch)
+                entity_versions.touch(session, OPERATIONS)
+                await session.commit()
+                self._written += len(batch)
+                self._batches += 1
+                return
+            except IntegrityError:
+                await session.rollback()
+
+            # an initiator may have been deleted after its operation was queued; write the rest row by row
+            for handled, operation in enumerate(batch):
+                try:
+                    await session.execute(insert(Operation), [operation])
+                    entity_versions.touch(session, OPERATIONS)
+                    await session.commit()
+                    self._written += 1
+                except IntegrityError as error:
+                    await session.rollback()
+                    if not _is_foreign_key_violation(error):
+                        # e.g. no partition for the row yet: keep it and the rest queued for the next flush
+                        del self._queue[:handled]
+                        raise
+                    self._dropped += 1
+                    logger.warning("Dropped audit operation %s: %s", operation["id"], operation["comment"])
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "queued": len(self._queue),
+            "written": self._written,
+            "batches": self._batches,
+            "failed_flushes": self._failed_flushes,
+            "dropped": self._dropped,
+            "overflowed": self._overflowed,
+        }
+
+
+def _is_foreign_key_violation(error: IntegrityError) -> bool:
+    # asyncpg reports the SQLSTATE, SQLite only a message
+    return getattr(error.orig, "sqlstate", None) == FOREIGN_KEY_VIOLATION \
+        or "FOREIGN KEY constraint failed" in str(error.orig)
+
+
+audit_log = AuditLog(audit_config.mode, audit_config.batch_size, audit_config.flush_interval, audit_config.max_queue)
+metrics.register("audit_log", audit_log.metrics)
+
+
+@event.listens_for(Session, "after_commit")
+def _enqueue_committed_operations(session: Session) -> None:
+    operations = session.info.pop(PENDING_OPERATIONS_KEY, None)
+    if operations:
+        audit_log.enqueue(operations)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_operations(session: Session) -> None:
+    session.info.pop(PENDING_OPERATIONS_KEY, None)
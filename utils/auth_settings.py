@@ -1,14 +1,43 @@
 import datetime
-import bcrypt
+import hashlib
+import time
 import jwt
 
+from pathlib import Path
+from typing import Any
+from cryptography.hazmat.primitives import serialization
+
 from config_data import constants
 from config_data.config import Config, load_config
 from src.models import User
+from utils import metrics
+from utils.cache import TTLCache
+
+SUPPORTED_ALGORITHMS = ("RS256", "ES256", "EdDSA")
 
 settings: Config = load_config(".env")
 auth_config = settings.authJWT
 
+if auth_config.algorithm not in SUPPORTED_ALGORITHMS:
+    raise ValueError(f"Unsupported JWT algorithm {auth_config.algorithm!r}, expected one of {SUPPORTED_ALGORITHMS}")
+
+
+def load_private_key(path: Path) -> Any:
+    return serialization.load_pem_private_key(path.read_bytes(), password=None)
+
+
+def load_public_key(path: Path) -> Any:
+    return serialization.load_pem_public_key(path.read_bytes())
+
+
+# Parsed once: PyJWT would otherwise re-parse the PEM text on every sign and verify
+jwt_private_key = load_private_key(auth_config.private_key_path)
+jwt_public_key = load_public_key(auth_config.public_key_path)
+
+# Verified claims by token digest, kept no longer than the token's own exp
+token_cache = TTLCache(settings.cache.token_size, settings.cache.token_ttl)
+metrics.register("token_cache", token_cache.metrics)
+
 
 def create_jwt(
         token_type: str,
@@ -28,8 +57,8 @@ def create_jwt(
 
 def encode_jwt(
         payload: dict,
-        private_key: str = auth_config.private_key_path.read_text(),
-        algorithm: str = auth_config.algorithm,
+        private_key: Any = None,
+        algorithm: str | None = None,
         expire_minutes: int = auth_config.access_token_expire_minutes,
         expire_timedelta: datetime.timedelta | None = None
 ) -> str:
@@ -43,41 +72,33 @@ def encode_jwt(
     to_encode.update(exp=expire, iat=now)
     encoded = jwt.encode(
         to_encode,
-        private_key,
-        algorithm=algorithm,
+        private_key or jwt_private_key,
+        algorithm=algorithm or auth_config.algorithm,
     )
     return encoded
 
 
 def decode_jwt(
         token: str | bytes,
-        public_key: str = auth_config.public_key_path.read_text(),
-        algorithm: str = auth_config.algorithm,
+        public_key: Any = None,
+        algorithm: str | None = None,
 ) -> dict:
-    decoded = jwt.decode(
-        token,
-        public_key,
-        algorithms=[algorithm],
-    )
-    return decoded
-
-
-def hash_password(
-        password: str,
-) -> bytes:
-    salt = bcrypt.gensalt()
-    pwd_bytes: bytes = password.encode()
-    return bcrypt.hashpw(pwd_bytes, salt)
-
-
-def validate_password(
-        password: str,
-        hashed_password: bytes,
-) -> bool:
-    return bcrypt.checkpw(
-        password=password.encode(),
-        hashed_password=hashed_password,
-    )
+    if public_key is not None:
+        return jwt.decode(token, public_key, algorithms=[algorithm or auth_config.algorithm])
+
+    digest = hashlib.sha256(token.encode() if isinstance(token, str) else token).digest()
+    decoded = token_cache.get(digest)
+    if decoded is None:
+        decoded = jwt.decode(
+            token,
+            jwt_public_key,
+            algorithms=[auth_config.algorithm],
+        )
+        ttl = min(decoded["exp"] - time.time(), token_cache.ttl)
+        if ttl > 0:
+            token_cache.set(digest, decoded, ttl=ttl)
+
+    return dict(decoded)
 
 
 def create_access_token(user: User) -> str:
@@ -0,0 +1,155 @@
+import asyncio
+import contextlib
+import time
+
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from utils.invalidation import invalidation_bus
+from utils.versions import entity_versions
+
+
+class TTLCache:
+    """In-process LRU cache whose entries also expire after ttl seconds."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._data[key]
+            self._misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self._hits += 1
+        return item[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "size": len(self._data),
+            "hits": self._hits,
+            "misses": self._misses,
+        }
+
+
+class SharedTTLCache(TTLCache):
+    """TTLCache whose invalidations are also applied by the other workers, through the invalidation bus."""
+
+    def __init__(self, name: str, maxsize: int, ttl: float, key_type: Callable[[str], Hashable] = str):
+        super().__init__(maxsize, ttl)
+        self.name = name
+        invalidation_bus.register(name, self, key_type)
+
+    def invalidate(self, key: Hashable, broadcast: bool = True) -> None:
+        super().invalidate(key)
+        if broadcast:
+            invalidation_bus.publish(self.name, key)
+
+    def clear(self, broadcast: bool = True) -> None:
+        super().clear()
+        if broadcast:
+            invalidation_bus.publish(self.name, None)
+
+
+class ReferenceCache:
+    """Whole-table snapshot of rarely changed rows, keyed by id.
+
+    The snapshot is tied to the change counter of its entity type: it is reloaded on first use, after
+    any committed change of that type (in any worker, see utils.versions) and at least every ttl
+    seconds. A load that raced with a change is returned to its caller and reloaded on the next call.
+    """
+
+    def __init__(self, entity: str, ttl: float):
+        self.entity = entity
+        self.ttl = ttl
+        self._items: Optional[Dict[Hashable, Any]] = None
+        self._version = -1
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._loads = 0
+
+    def _fresh(self) -> bool:
+        return (
+            self._items is not None
+            and self._version == entity_versions.version(self.entity)
+            and self._expires_at > time.monotonic()
+        )
+
+    async def get_items(self, loader: Callable[[], Awaitable[List[Any]]]) -> Dict[Hashable, Any]:
+        if self._fresh():
+            self._hits += 1
+            return self._items
+
+        self._misses += 1
+        async with self._lock:
+            if self._fresh():
+                return self._items
+            version = entity_versions.version(self.entity)
+            self._items = {item.id: item for item in await loader()}
+            self._version = version
+            self._expires_at = time.monotonic() + self.ttl
+            self._loads += 1
+            return self._items
+
+    def clear(self) -> None:
+        self._items = None
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "size": len(self._items or ()),
+            "version": self._version,
+            "hits": self._hits,
+            "misses": self._misses,
+            "loads": self._loads,
+        }
+
+
+class KeyedLocks:
+    """asyncio.Lock per key, kept only while someone holds or waits for it."""
+
+    def __init__(self):
+        self._locks: Dict[Hashable, Tuple[asyncio.Lock, int]] = {}
+        self._waits = 0
+
+    @contextlib.asynccontextmanager
+    async def hold(self, key: Hashable) -> AsyncIterator[None]:
+        lock, users = self._locks.get(key, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        elif lock.locked():
+            self._waits += 1
+        self._locks[key] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._locks[key]
+            if users == 1:
+                del self._locks[key]
+            else:
+                self._locks[key] = (lock, users - 1)
+
+    def metrics(self) -> Dict[str, float]:
+        return {"held": len(self._locks), "waits": self._waits}
@@ -1,34 +1,132 @@
+import asyncio
+import csv
+import io
 import openpyxl
 
-from typing import Dict, List
-from io import BytesIO
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 
 from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
 
+from src.exceptions import ErrorLoadFileException
 from src.models import Roles
 
+ParsedRow = Tuple[int, Dict]
+
 
 class Parser:
-    def __init__(self, file: UploadFile):
+    """Reads an uploaded .xlsx or .csv file (chosen by its name) in chunks of parsed rows."""
+
+    def __init__(self, file: UploadFile, chunk_size: int = 1000):
         self.file = file
-        self.file_content = BytesIO(self.file.file.read())
-        self.workbook = openpyxl.load_workbook(self.file_content)
-        self.sheet = self.workbook.active
-
-    def parse_users(self) -> List[Dict]:
-        users = []
-        for row in self.sheet.iter_rows(min_row=2, values_only=True):
-            if row[0] is None:
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def _cell_to_str(value: Any) -> Optional[str]:
+        if value is None:
+            return None
+        value = str(value).strip()
+        return value or None
+
+    def _iter_rows(self) -> Iterator[Tuple[int, Sequence]]:
+        self.file.file.seek(0)
+        rows = self._iter_csv_rows() if self.file.filename.lower().endswith(".csv") else self._iter_xlsx_rows()
+        for row_number, row in rows:
+            if not row or row[0] in (None, ""):
                 break
+            yield row_number, row
+
+    def _iter_xlsx_rows(self) -> Iterator[Tuple[int, tuple]]:
+        workbook = openpyxl.load_workbook(self.file.file, read_only=True, data_only=True)
+        try:
+            yield from enumerate(workbook.active.iter_rows(min_row=2, values_only=True), start=2)
+        finally:
+            workbook.close()
+
+    def _iter_csv_rows(self) -> Iterator[Tuple[int, List[str]]]:
+        # utf-8-sig drops the BOM Excel puts in front of UTF-8 CSV files
+        text = io.TextIOWrapper(self.file.file, encoding="utf-8-sig", newline="")
+        try:
+            sample = text.read(64 * 1024)
+            text.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+            except csv.Error:
+                dialect = csv.excel
+            rows = csv.reader(text, dialect)
+            next(rows, None)
+            yield from enumerate(rows, start=2)
+        finally:
+            text.detach()
+
+    def _iter_chunks(self, columns: int, make_row: Callable[[List[Optional[str]]], Dict]) -> Iterator[List[ParsedRow]]:
+        chunk: List[ParsedRow] = []
+        for row_number, row in self._iter_rows():
+            cells = [self._cell_to_str(value) for value in row[:columns]]
+            cells += [None] * (columns - len(cells))
+            chunk.append((row_number, make_row(cells)))
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    async def _read_chunks(chunks: Iterator[List[ParsedRow]]) -> AsyncIterator[List[ParsedRow]]:
+        pending: Optional[asyncio.Future] = None
+
+        def close_chunks(future: asyncio.Future) -> None:
+            if not future.cancelled():
+                # nobody waits for this chunk any more
+                future.exception()
+            chunks.close()
+
+        try:
+            while True:
+                pending = asyncio.ensure_future(run_in_threadpool(next, chunks, None))
+                try:
+                    # shielded: on cancel the read keeps running and the generator is closed once it returns
+                    chunk = await asyncio.shield(pending)
+                except Exception:
+                    raise ErrorLoadFileException()
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            if pending is None or pending.done():
+                chunks.close()
+            else:
+                # closing a generator that is still running in the thread fails with "generator already executing"
+                pending.add_done_callback(close_chunks)
+
+    @staticmethod
+    def _user_fields(cells: List[Optional[str]]) -> Dict:
+        return {
+            "surname": cells[0],
+            "name": cells[1],
+            "patronymic": cells[2],
+            "role": Roles.student,
+            "phone": cells[3],
+            "login": cells[4],
+            "password": cells[5]
+        }
+
+    @staticmethod
+    def _payment_fields(cells: List[Optional[str]]) -> Dict:
+        amount = cells[3]
+        if amount is not None:
+            # bank statements write amounts like "12 500,00"
+            amount = amount.replace("\xa0", "").replace(" ", "").replace(",", ".")
+        return {"bank_reference": cells[0], "login": cells[1], "semester": cells[2], "amount": amount}
+
+    async def parse_users(self) -> AsyncIterator[List[ParsedRow]]:
+        """Yield (row number, user fields) chunks; the file is read in a worker thread, xlsx in read-only mode."""
+        async for chunk in self._read_chunks(self._iter_chunks(6, self._user_fields)):
+            yield chunk
 
-            users.append({
-                "surname": str(row[0]),
-                "name": str(row[1]),
-                "patronymic": str(row[2]),
-                "role": Roles.student,
-                "phone": str(row[3]),
-                "login": str(row[4]),
-                "password": str(row[5])
-            })
-
-        return users
+    async def parse_payments(self) -> AsyncIterator[List[ParsedRow]]:
+        """Yield (row number, payment fields) chunks of a bank statement:
+        bank reference, student login, semester name and amount."""
+        async for chunk in self._read_chunks(self._iter_chunks(4, self._payment_fields)):
+            yield chunk
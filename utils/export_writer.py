@@ -0,0 +1,125 @@
+import csv
+import gzip
+import io
+import os
+import tempfile
+
+from enum import Enum
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, Sequence
+
+import openpyxl
+
+from starlette.concurrency import run_in_threadpool
+
+# data rows per sheet: Excel has 1048576 rows and the header takes the first one
+XLSX_SHEET_ROWS = 1048575
+FILE_CHUNK_SIZE = 1024 * 1024
+
+
+class ExportFormats(Enum):
+    csv = "csv"
+    xlsx = "xlsx"
+
+
+MEDIA_TYPES = {
+    ExportFormats.csv: "text/csv; charset=utf-8",
+    ExportFormats.xlsx: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+Partitions = AsyncIterator[Sequence[Sequence[Any]]]
+
+
+def _cell(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if value is None or isinstance(value, (str, int, float)) or hasattr(value, "isoformat"):
+        return value
+    return str(value)
+
+
+async def write_csv(header: Sequence[str], partitions: Partitions) -> AsyncIterator[bytes]:
+    """One chunk per partition; starts with a BOM so that Excel reads the file as UTF-8."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(header)
+    async for rows in partitions:
+        writer.writerows([_cell(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _XlsxWriter:
+    """Write-only workbook that starts a new sheet when the current one is full."""
+
+    def __init__(self, header: Sequence[str], title: str):
+        self.header = list(header)
+        self.title = title
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self.sheet = None
+        self.sheet_rows = XLSX_SHEET_ROWS
+
+    def append(self, rows: Iterable[Sequence[Any]]) -> None:
+        for row in rows:
+            if self.sheet_rows == XLSX_SHEET_ROWS:
+                self._add_sheet()
+            self.sheet.append([_cell(value) for value in row])
+            self.sheet_rows += 1
+
+    def _add_sheet(self) -> None:
+        number = len(self.workbook.worksheets) + 1
+        self.sheet = self.workbook.create_sheet(self.title if number == 1 else f"{self.title} {number}")
+        self.sheet.append(self.header)
+        self.sheet_rows = 0
+
+    def save(self, file) -> None:
+        if self.sheet is None:
+            self._add_sheet()
+        self.workbook.save(file)
+
+
+async def write_xlsx(header: Sequence[str], partitions: Partitions, title: str) -> AsyncIterator[bytes]:
+    """Rows go to openpyxl's write-only sheets, which keep them in temporary files, and the
+    finished workbook is streamed from a temporary file."""
+    writer = _XlsxWriter(header, title)
+    async for rows in partitions:
+        await run_in_threadpool(writer.append, rows)
+
+    with tempfile.TemporaryFile() as file:
+        await run_in_threadpool(writer.save, file)
+        file.seek(0)
+        while chunk := await run_in_threadpool(file.read, FILE_CHUNK_SIZE):
+            yield chunk
+
+
+def write_export(
+        export_format: ExportFormats, header: Sequence[str], partitions: Partitions, title: str
+) -> AsyncIterator[bytes]:
+    if export_format is ExportFormats.xlsx:
+        return write_xlsx(header, partitions, title)
+    return write_csv(header, partitions)
+
+
+async def save_gzip(path: Path, chunks: AsyncIterator[bytes]) -> None:
+    """Compresses the chunks to a temporary file beside path that replaces it once synced to disk,
+    so path is either complete or absent."""
+    part_path = path.with_name(f"{path.name}.part")
+    try:
+        with open(part_path, "wb") as file:
+            with gzip.GzipFile(filename=path.stem, mode="wb", fileobj=file) as archive:
+                async for chunk in chunks:
+                    await run_in_threadpool(archive.write, chunk)
+            file.flush()
+            await run_in_threadpool(os.fsync, file.fileno())
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
+    os.replace(part_path, path)
+
+
+def content_disposition(filename: str) -> Dict[str, str]:
+    return {"Content-Disposition": f'attachment; filename="{filename}"'}
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import logging
+import uuid
+
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import asyncpg
+
+from config_data.config import Config, load_config
+from utils import metrics
+
+CHANNEL = "cache_invalidation"
+RECONNECT_DELAY = 1.0
+
+logger = logging.getLogger(__name__)
+
+settings: Config = load_config(".env")
+
+
+class InvalidationBus:
+    """Carries cache invalidations between workers over Postgres LISTEN/NOTIFY.
+
+    Every worker keeps one connection outside the pool that listens on CHANNEL and also sends the
+    notifications. A message names a registered cache and a key (or none to clear it); the worker
+    that sent it ignores its own messages. While the connection is down every registered cache is
+    cleared, since invalidations sent meanwhile are lost.
+    """
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self.origin = uuid.uuid4().hex
+        self._caches: Dict[str, Any] = {}
+        self._key_types: Dict[str, Callable[[str], Hashable]] = {}
+        self._outbox: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._connected = False
+        self._sent = 0
+        self._received = 0
+        self._reconnects = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._connected
+
+    @property
+    def reconnects(self) -> int:
+        return self._reconnects
+
+    def register(self, name: str, cache: Any, key_type: Callable[[str], Hashable] = str) -> None:
+        self._caches[name] = cache
+        self._key_types[name] = key_type
+
+    def message(self, name: str, key: Optional[Hashable]) -> str:
+        return json.dumps({"origin": self.origin, "cache": name, "key": None if key is None else str(key)})
+
+    def publish(self, name: str, key: Optional[Hashable]) -> None:
+        if self._outbox is not None:
+            self._outbox.put_nowait(self.message(name, key))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._outbox = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._outbox = None
+
+    async def _run(self) -> None:
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                await connection.add_listener(CHANNEL, self._on_notification)
+                connection.add_termination_listener(lambda _: self._outbox.put_nowait(None))
+                self._connected = True
+                while (message := await self._outbox.get()) is not None:
+                    await connection.execute("SELECT pg_notify($1, $2)", CHANNEL, message)
+                    self._sent += 1
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError):
+                logger.exception("Cache invalidation bus lost its connection")
+            finally:
+                self._connected = False
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+
+            self._reconnects += 1
+            self._clear_all()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    def _on_notification(self, connection, pid: int, channel: str, payload: str) -> None:
+        message = json.loads(payload)
+        cache = self._caches.get(message["cache"])
+        if message["origin"] == self.origin or cache is None:
+            return
+
+        self._received += 1
+        if message["key"] is None:
+            cache.clear(broadcast=False)
+        else:
+            cache.invalidate(self._key_types[message["cache"]](message["key"]), broadcast=False)
+
+    def _clear_all(self) -> None:
+        for cache in self._caches.values():
+            cache.clear(broadcast=False)
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "connected": int(self._connected),
+            "sent": self._sent,
+            "received": self._received,
+            "reconnects": self._reconnects,
+        }
+
+
+invalidation_bus = InvalidationBus(settings.database.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://"))
+metrics.register("invalidation_bus", invalidation_bus.metrics)
@@ -0,0 +1,11 @@
+from typing import Callable, Dict
+
+_collectors: Dict[str, Callable[[], Dict[str, float]]] = {}
+
+
+def register(name: str, collector: Callable[[], Dict[str, float]]) -> None:
+    _collectors[name] = collector
+
+
+def collect() -> Dict[str, Dict[str, float]]:
+    return {name: collector() for name, collector in _collectors.items()}
@@ -0,0 +1,80 @@
+from typing import Optional, Set
+
+from alembic import command
+from alembic.config import Config as AlembicConfig
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from config_data.config import BASE_DIR, Config, load_config
+from src import database
+
+# pg_advisory_lock key shared by the migrate command (exclusive) and the startup check (shared)
+MIGRATION_LOCK_ID = 0x7061796D656E74
+
+settings: Config = load_config(".env")
+migrations_config = settings.migrations
+
+
+class SchemaRevisionError(RuntimeError):
+    pass
+
+
+def get_alembic_config() -> AlembicConfig:
+    alembic_config = AlembicConfig(str(BASE_DIR / "alembic.ini"))
+    alembic_config.set_main_option("script_location", str(BASE_DIR / "migrations"))
+    return alembic_config
+
+
+def get_head_revisions() -> Set[str]:
+    return set(ScriptDirectory.from_config(get_alembic_config()).get_heads())
+
+
+async def upgrade(revision: str = "heads") -> None:
+    """Run alembic upgrade in process while holding the migration lock."""
+    # a dedicated engine: the application pool may carry a statement_timeout that long migrations exceed
+    engine = create_async_engine(database.DATABASE_URL, poolclass=NullPool)
+    alembic_config = get_alembic_config()
+
+    def run_upgrade(connection) -> None:
+        alembic_config.attributes["connection"] = connection
+        command.upgrade(alembic_config, revision)
+
+    try:
+        async with engine.connect() as lock_connection:
+            await lock_connection.execute(select(func.pg_advisory_lock(MIGRATION_LOCK_ID)))
+            await lock_connection.commit()
+            try:
+                # alembic gets a connection that has not begun a transaction, so it owns the migration
+                # transaction and autocommit_block() can commit it before CREATE INDEX CONCURRENTLY
+                async with engine.connect() as connection:
+                    await connection.run_sync(run_upgrade)
+            finally:
+                await lock_connection.execute(select(func.pg_advisory_unlock(MIGRATION_LOCK_ID)))
+                await lock_connection.commit()
+    finally:
+        await engine.dispose()
+
+
+async def get_current_revisions() -> Set[str]:
+    async with database.engine.connect() as connection:
+        # waits for a migration in progress, but never blocks other workers doing the same check
+        await connection.execute(select(func.set_config("lock_timeout", str(migrations_config.lock_timeout), True)))
+        await connection.execute(select(func.pg_advisory_xact_lock_shared(MIGRATION_LOCK_ID)))
+        revisions = await connection.run_sync(lambda conn: MigrationContext.configure(conn).get_current_heads())
+        await connection.rollback()
+
+    return set(revisions)
+
+
+async def check_revision(expected: Optional[Set[str]] = None) -> None:
+    """Fail startup when the database is not at the revision this code was written for."""
+    expected = expected if expected is not None else get_head_revisions()
+    current = await get_current_revisions()
+    if current != expected:
+        raise SchemaRevisionError(
+            f"Database schema is at {', '.join(sorted(current)) or 'no revision'}, "
+            f"expected {', '.join(sorted(expected))}; run `python manage.py migrate` first"
+        )
@@ -0,0 +1,29 @@
+import base64
+import datetime
+import json
+
+from typing import Any, Callable, List, Optional, Sequence
+
+from src.exceptions import IncorrectCursorException
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([str(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str, *converters: Callable[[str], Any]) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(values) != len(converters):
+            raise ValueError(cursor)
+        return [convert(value) for convert, value in zip(converters, values)]
+    except (ValueError, TypeError):
+        raise IncorrectCursorException()
+
+
+def naive_utc(value: Optional[datetime.datetime]) -> Optional[datetime.datetime]:
+    """Date range bounds for created_at columns, which are stored in UTC without a time zone."""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
@@ -0,0 +1,129 @@
+import asyncio
+import multiprocessing
+import time
+import bcrypt
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import chain
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from config_data.config import Config, load_config
+from src.exceptions import ServiceOverloadedException
+from utils import metrics
+
+settings: Config = load_config(".env")
+import_config = settings.usersImport
+hashing_config = settings.passwordHashing
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def hash_password(password: str) -> bytes:
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt())
+
+
+def validate_password(password: str, hashed_password: bytes) -> bool:
+    return bcrypt.checkpw(password.encode(), hashed_password)
+
+
+def hash_passwords(passwords: Sequence[str]) -> List[bytes]:
+    return [hash_password(password) for password in passwords]
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # spawn keeps workers free of the event loop, sockets and threads of the API process
+        _process_pool = ProcessPoolExecutor(
+            max_workers=import_config.hash_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+
+async def hash_passwords_parallel(passwords: Sequence[str]) -> List[bytes]:
+    if not passwords:
+        return []
+
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+    chunk_size = -(-len(passwords) // import_config.hash_workers)
+    chunks = await asyncio.gather(*(
+        loop.run_in_executor(pool, hash_passwords, passwords[i:i + chunk_size])
+        for i in range(0, len(passwords), chunk_size)
+    ))
+    return list(chain.from_iterable(chunks))
+
+
+def shutdown_process_pool() -> None:
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(cancel_futures=True)
+        _process_pool = None
+
+
+class PasswordHasher:
+    """Runs bcrypt for interactive requests on a bounded thread pool instead of the event loop.
+
+    bcrypt releases the GIL, so threads hash in parallel. At most max_workers calls run and
+    max_queue wait; anything beyond that fails fast with 503 instead of queueing for seconds.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self._max_pending = max_workers + max_queue
+        self._pending = 0
+        self._calls = 0
+        self._rejected = 0
+        self._wait_seconds = 0.0
+        self._hash_seconds = 0.0
+        self._max_wait_seconds = 0.0
+
+    async def _run(self, func: Callable, *args: Any) -> Any:
+        if self._pending >= self._max_pending:
+            self._rejected += 1
+            raise ServiceOverloadedException()
+
+        queued_at = time.perf_counter()
+
+        def call():
+            started_at = time.perf_counter()
+            result = func(*args)
+            return result, started_at - queued_at, time.perf_counter() - started_at
+
+        self._pending += 1
+        try:
+            result, wait_seconds, hash_seconds = await asyncio.get_running_loop().run_in_executor(
+                self._executor, call
+            )
+        finally:
+            self._pending -= 1
+
+        self._calls += 1
+        self._wait_seconds += wait_seconds
+        self._hash_seconds += hash_seconds
+        self._max_wait_seconds = max(self._max_wait_seconds, wait_seconds)
+        return result
+
+    async def hash(self, password: str) -> bytes:
+        return await self._run(hash_password, password)
+
+    async def verify(self, password: str, hashed_password: bytes) -> bool:
+        return await self._run(validate_password, password, hashed_password)
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "pending": self._pending,
+            "calls": self._calls,
+            "rejected": self._rejected,
+            "wait_seconds_total": self._wait_seconds,
+            "hash_seconds_total": self._hash_seconds,
+            "wait_seconds_max": self._max_wait_seconds,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(hashing_config.max_workers, hashing_config.max_queue)
+metrics.register("password_hasher", password_hasher.metrics)
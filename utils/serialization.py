@@ -0,0 +1,34 @@
+from typing import Any, Dict, Optional
+
+import orjson
+
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+
+_adapters: Dict[Any, TypeAdapter] = {}
+
+
+class ORJSONModelResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        # orjson encodes UUID, datetime and Enum natively, so models are dumped in python mode
+        return orjson.dumps(content)
+
+
+def get_adapter(schema: Any) -> TypeAdapter:
+    adapter = _adapters.get(schema)
+    if adapter is None:
+        adapter = _adapters[schema] = TypeAdapter(schema)
+    return adapter
+
+
+def serialize(schema: Any, data: Any, etag: Optional[str] = None) -> ORJSONModelResponse:
+    """Validate ORM objects or rows straight into schema and encode them once with orjson.
+
+    A route returning this response skips FastAPI's second validation against response_model,
+    which is then only used for the OpenAPI schema.
+    """
+    adapter = get_adapter(schema)
+    headers = {"ETag": etag} if etag is not None else None
+    return ORJSONModelResponse(adapter.dump_python(adapter.validate_python(data, from_attributes=True)), headers=headers)
@@ -0,0 +1,151 @@
+from typing import Dict, Iterable, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+from sqlalchemy import event, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.models import EntityVersion
+from utils import metrics
+from utils.invalidation import invalidation_bus, CHANNEL
+
+USERS = "users"
+GROUPS = "groups"
+SEMESTERS = "semesters"
+TRANSACTIONS = "transactions"
+OPERATIONS = "operations"
+TOUCHED_ENTITIES_KEY = "touched_entities"
+COMMITTED_VERSIONS_KEY = "committed_versions"
+NOTIFIED_VERSIONS_KEY = "notified_versions"
+
+
+def parse_version(key: str) -> Tuple[str, int]:
+    entity, version = key.rsplit(":", 1)
+    return entity, int(version)
+
+
+def increment(entities: Iterable[str]):
+    """Upsert adding 1 to the counter of each entity type, returning (entity, version) rows."""
+    # sorted: concurrent transactions lock the rows in the same order
+    stmt = pg_insert(EntityVersion).values([{"entity": entity, "version": 1} for entity in sorted(entities)])
+    return stmt.on_conflict_do_update(
+        index_elements=[EntityVersion.entity],
+        set_={"version": EntityVersion.version + 1}
+    ).returning(EntityVersion.entity, EntityVersion.version)
+
+
+class EntityVersions:
+    """Change counters of entity types, the base of the ETags of read routes.
+
+    The counters are rows of entity_versions, so every worker builds the same tag for the same data, also
+    after a restart. Repository writes mark the entity types they change on the session and the rows are
+    incremented in that session's transaction right before it commits. While the invalidation bus is
+    connected a worker answers from memory: the values are read once after each (re)connect and committed
+    increments are published with their new value. Without the bus every tag is read from the table.
+    """
+
+    def __init__(self, entities: Iterable[str]):
+        self._versions: Dict[str, int] = dict.fromkeys(entities, 0)
+        # invalidation_bus.reconnects when the values were last read with the bus listening
+        self._synced_at: Optional[int] = None
+        self._loads = 0
+        self._not_modified = 0
+
+    @property
+    def synced(self) -> bool:
+        return invalidation_bus.connected and self._synced_at == invalidation_bus.reconnects
+
+    def touch(self, session: AsyncSession, *entities: str) -> None:
+        session.info.setdefault(TOUCHED_ENTITIES_KEY, set()).update(entities)
+
+    async def notify(self, session: AsyncSession, *entities: str) -> None:
+        """Like touch, but the other processes are told by the session's own transaction (pg_notify on the bus
+        channel), so the change reaches the API workers also from processes that do not run the bus, e.g. manage.py."""
+        versions = dict((await session.execute(increment(entities))).all())
+        for entity, version in versions.items():
+            message = invalidation_bus.message("versions", f"{entity}:{version}")
+            await session.execute(select(func.pg_notify(CHANNEL, message)))
+        session.info.setdefault(NOTIFIED_VERSIONS_KEY, {}).update(versions)
+
+    def update(self, versions: Dict[str, int], broadcast: bool = True) -> None:
+        for entity, version in versions.items():
+            # a message may arrive after a newer value was read
+            self._versions[entity] = max(self._versions[entity], version)
+            if broadcast:
+                invalidation_bus.publish("versions", f"{entity}:{version}")
+
+    def invalidate(self, key: Tuple[str, int], broadcast: bool = True) -> None:
+        entity, version = key
+        self.update({entity: version}, broadcast)
+
+    def clear(self, broadcast: bool = True) -> None:
+        # the bus lost its connection and maybe messages with it: read the values again
+        self._synced_at = None
+
+    def reset(self) -> None:
+        """Forget the values, which only ever grow in memory: e.g. after the database was restored from a backup."""
+        self._versions = dict.fromkeys(self._versions, 0)
+        self._synced_at = None
+
+    async def load(self, session: AsyncSession) -> None:
+        reconnects, connected = invalidation_bus.reconnects, invalidation_bus.connected
+        result = await session.execute(select(EntityVersion.entity, EntityVersion.version))
+        self._loads += 1
+        self.update(dict(result.all()), broadcast=False)
+        if connected and reconnects == invalidation_bus.reconnects:
+            # every increment committed after this read reaches the bus connection that was listening before it
+            self._synced_at = reconnects
+
+    def version(self, entity: str) -> int:
+        return self._versions[entity]
+
+    async def etag(self, session: AsyncSession, *entities: str) -> str:
+        if not self.synced:
+            await self.load(session)
+        return f'W/"{"-".join(str(self._versions[entity]) for entity in entities)}"'
+
+    def not_modified(self, request: Request, etag: str) -> Optional[Response]:
+        """304 response when the request's If-None-Match already holds etag, else None."""
+        tags = {tag.strip() for tag in request.headers.get("if-none-match", "").split(",")}
+        # weak comparison: W/"x" matches "x"
+        if etag in tags or etag[2:] in tags:
+            self._not_modified += 1
+            return Response(status_code=304, headers={"ETag": etag})
+        return None
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            **self._versions,
+            "synced": int(self.synced),
+            "loads": self._loads,
+            "not_modified": self._not_modified,
+        }
+
+
+entity_versions = EntityVersions((USERS, GROUPS, SEMESTERS, TRANSACTIONS, OPERATIONS))
+invalidation_bus.register("versions", entity_versions, parse_version)
+metrics.register("entity_versions", entity_versions.metrics)
+
+
+@event.listens_for(Session, "before_commit")
+def _increment_touched_entities(session: Session) -> None:
+    entities = session.info.pop(TOUCHED_ENTITIES_KEY, None)
+    if entities:
+        versions = dict(session.execute(increment(entities)).all())
+        session.info.setdefault(COMMITTED_VERSIONS_KEY, {}).update(versions)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed_versions(session: Session) -> None:
+    # the other processes got the committed pg_notify already
+    entity_versions.update(session.info.pop(NOTIFIED_VERSIONS_KEY, {}), broadcast=False)
+    entity_versions.update(session.info.pop(COMMITTED_VERSIONS_KEY, {}))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_entities(session: Session) -> None:
+    session.info.pop(TOUCHED_ENTITIES_KEY, None)
+    session.info.pop(COMMITTED_VERSIONS_KEY, None)
+    session.info.pop(NOTIFIED_VERSIONS_KEY, None)